@@ -0,0 +1,76 @@
+# GPLv2+
+
+"""
+Wall-clock time of thread, process and fork backends of Model.
+
+For each backend a model is created with one console per chain, which is
+then updated and sampled. Creation time includes starting worker processes
+of the process backend, which each compile the model, and forking workers of
+the fork backend after compiling the model once; sampling time includes
+returning monitored values through shared memory.
+
+Usage::
+
+    python benchmarks/bench_backends.py --chains 4 --nodes 2000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import pyjags
+
+CODE = '''
+model {
+    for (i in 1:N) {
+        y[i] ~ dnorm(mu[g[i]], tau)
+    }
+    for (j in 1:G) {
+        mu[j] ~ dnorm(mu0, tau0)
+    }
+    mu0 ~ dnorm(0, 0.001)
+    tau0 ~ dgamma(0.01, 0.01)
+    tau ~ dgamma(0.01, 0.01)
+}
+'''
+
+
+def run(backend, args, data):
+    start = time.perf_counter()
+    model = pyjags.Model(code=CODE, data=data, chains=args.chains,
+                         threads=args.chains, adapt=0, progress_bar=False,
+                         backend=backend)
+    created = time.perf_counter()
+    model.update(args.iterations)
+    updated = time.perf_counter()
+    model.sample(args.iterations, vars=['mu', 'mu0', 'tau'])
+    sampled = time.perf_counter()
+    return created - start, updated - created, sampled - updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chains', type=int, default=4)
+    parser.add_argument('--nodes', type=int, default=2000)
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    g = rng.integers(1, args.groups + 1, args.nodes)
+    data = dict(N=args.nodes, G=args.groups, g=g,
+                y=rng.normal(g / args.groups, 1.0))
+
+    print('{:>8} {:>10} {:>10} {:>10}'.format(
+        'backend', 'create', 'update', 'sample'))
+    for backend in ('thread', 'process', 'fork'):
+        for _ in range(args.repeat):
+            times = run(backend, args, data)
+            print('{:>8} {:>9.3f}s {:>9.3f}s {:>9.3f}s'.format(
+                backend, *times))
+
+
+if __name__ == '__main__':
+    main()
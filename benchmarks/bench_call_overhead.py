@@ -0,0 +1,83 @@
+# GPLv2+
+
+"""
+Per-call overhead of Model.update and Model.sample with several threads.
+
+The model is trivial, so that time spent in JAGS is negligible and the
+measured time is dominated by dispatching work to the threads driving the
+consoles, as happens with many short calls made by sample_until.
+
+To compare with another installation of pyjags, e.g. a previous release,
+pass its location with --baseline; it is put in front of PYTHONPATH of the
+measuring interpreter.
+
+Usage::
+
+    python benchmarks/bench_call_overhead.py --threads 4 --calls 2000
+    python benchmarks/bench_call_overhead.py --baseline /path/to/site-packages
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def measure(threads, calls):
+    import pyjags
+
+    model = pyjags.Model(code='model { x ~ dnorm(0, 1) }', chains=threads,
+                         threads=threads, adapt=0, progress_bar=False)
+    start = time.perf_counter()
+    for _ in range(calls):
+        model.update(1)
+    updated = time.perf_counter()
+    for _ in range(calls):
+        model.sample(1, vars=['x'])
+    sampled = time.perf_counter()
+    return {
+        'pyjags': os.path.dirname(pyjags.__file__),
+        'update_us': (updated - start) / calls * 1e6,
+        'sample_us': (sampled - updated) / calls * 1e6,
+    }
+
+
+def run(args, pythonpath=None):
+    env = dict(os.environ)
+    if pythonpath:
+        env['PYTHONPATH'] = os.pathsep.join(
+            [pythonpath] + ([env['PYTHONPATH']] if 'PYTHONPATH' in env else []))
+    output = subprocess.check_output(
+        [sys.executable, __file__, '--measure',
+         '--threads', str(args.threads),
+         '--calls', str(args.calls)],
+        env=env)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--baseline', help='location of pyjags to compare with')
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.threads, args.calls)))
+        return
+
+    runs = [('current', None)]
+    if args.baseline:
+        runs.insert(0, ('baseline', args.baseline))
+    for label, pythonpath in runs:
+        result = run(args, pythonpath)
+        print('{label:>8}: update {update_us:8.1f} us/call, '
+              'sample {sample_us:8.1f} us/call [{pyjags}]'.format(
+                  label=label, **result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# GPLv2+
+
+"""
+Write and read throughput and compression ratio of HDF5 sample files saved
+with different codecs, filters and chunk layouts.
+
+The traces are autoregressive chains of a vector variable, with the strong
+autocorrelation and limited precision structure of typical MCMC output.
+Throughput is in MB/s of uncompressed samples; reading one element reads all
+iterations of all chains of a single parameter through the lazy loader.
+
+Usage::
+
+    python benchmarks/bench_compression.py --elements 100 --iterations 10000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from pyjags.io import (open_samples_dictionary_from_file,
+                       load_samples_dictionary_from_file,
+                       save_samples_dictionary_to_file)
+
+CONFIGURATIONS = [
+    ('none', dict(compression=False)),
+    ('gzip', dict(compression='gzip')),
+    ('gzip 1', dict(compression='gzip', compression_level=1)),
+    ('gzip 1 + shuffle', dict(compression='gzip', compression_level=1,
+                              shuffle=True)),
+    ('lzf', dict(compression='lzf')),
+    ('lzf + shuffle', dict(compression='lzf', shuffle=True)),
+    ('lzf + shuffle, element chunks', dict(compression='lzf', shuffle=True,
+                                           chunks='element')),
+    ('gzip 1 + shuffle + scaleoffset 6', dict(compression='gzip',
+                                              compression_level=1,
+                                              shuffle=True, scaleoffset=6)),
+]
+
+
+def traces(elements, iterations, chains, rho=0.9, seed=0):
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(size=(elements, iterations, chains))
+    x = np.empty_like(noise)
+    x[:, 0] = noise[:, 0]
+    for i in range(1, iterations):
+        x[:, i] = rho * x[:, i - 1] + np.sqrt(1 - rho ** 2) * noise[:, i]
+    return {'x': x + rng.normal(size=(elements, 1, 1))}
+
+
+def _time(fn, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--elements', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=10000)
+    parser.add_argument('--chains', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    samples = traces(args.elements, args.iterations, args.chains)
+    megabytes = samples['x'].nbytes / 1e6
+    print('{:.1f} MB of samples'.format(megabytes))
+    print('{:34s} {:>10s} {:>10s} {:>12s} {:>7s}'.format(
+        'configuration', 'write MB/s', 'read MB/s', 'element ms', 'ratio'))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'samples.h5')
+        for name, options in CONFIGURATIONS:
+            write = _time(lambda: save_samples_dictionary_to_file(
+                path, samples, **options), args.repeat)
+            read = _time(lambda: load_samples_dictionary_from_file(path),
+                         args.repeat)
+
+            def read_element():
+                with open_samples_dictionary_from_file(path, ['x']) as s:
+                    s['x'][args.elements // 2]
+
+            element = _time(read_element, args.repeat)
+            ratio = samples['x'].nbytes / os.path.getsize(path)
+            print('{:34s} {:10.1f} {:10.1f} {:12.2f} {:7.2f}'.format(
+                name, megabytes / write, megabytes / read, element * 1e3,
+                ratio))
+
+
+if __name__ == '__main__':
+    main()
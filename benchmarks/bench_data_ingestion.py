@@ -0,0 +1,98 @@
+# GPLv2+
+
+"""
+Time and temporary memory of converting large observation vectors into JAGS
+arrays, as done when compiling a model.
+
+The current path copies every array once, directly into the JAGS array, and
+fills masked values with JAGS_NA in the same pass. The previous path, kept
+here for comparison, first converted masked arrays to doubles, filled them
+into another array and only then copied them into JAGS. Temporary memory is
+the peak of allocations by numpy traced while converting, which doesn't
+include the JAGS arrays themselves.
+
+Usage::
+
+    python benchmarks/bench_data_ingestion.py --size 10000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from pyjags.model import JAGS_NA, DataBundle, dict_to_jags
+
+
+def previous_dict_to_jags(src):
+    dst = {}
+    for k, v in src.items():
+        if np.ma.is_masked(v):
+            v = np.ma.array(data=v, dtype=np.double, ndmin=1,
+                            fill_value=JAGS_NA)
+            v = np.ma.filled(v)
+        else:
+            v = np.atleast_1d(v)
+        if not np.size(v):
+            continue
+        dst[k] = v
+    return dst
+
+
+def measure(convert, data, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        bundle = DataBundle(convert(data))
+        best = min(best, time.perf_counter() - start)
+        del bundle
+    tracemalloc.start()
+    bundle = DataBundle(convert(data))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del bundle
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=10 ** 7)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=args.size)
+    mask = rng.random(args.size) < 0.01
+
+    with tempfile.TemporaryDirectory() as directory:
+        memmap = np.memmap(os.path.join(directory, 'x.dat'), dtype=np.double,
+                           mode='w+', shape=x.shape)
+        memmap[...] = x
+        inputs = [
+            ('float64', x),
+            ('int64', x.astype(np.int64)),
+            ('float64 fortran 2-D', np.asfortranarray(x.reshape(-1, 10))),
+            ('float64 memmap', memmap),
+            ('masked float64', np.ma.masked_array(x, mask)),
+            ('masked int32', np.ma.masked_array(x.astype(np.int32), mask)),
+            ('masked memmap', np.ma.masked_array(memmap, mask)),
+        ]
+        print('{} elements'.format(args.size))
+        print('{:22s} {:>12s} {:>12s} {:>12s} {:>12s}'.format(
+            'input', 'previous s', 'current s', 'previous MB',
+            'current MB'))
+        for name, value in inputs:
+            data = {'y': value}
+            previous = measure(previous_dict_to_jags, data, args.repeat)
+            current = measure(dict_to_jags, data, args.repeat)
+            print('{:22s} {:12.3f} {:12.3f} {:12.1f} {:12.1f}'.format(
+                name, previous[0], current[0], previous[1] / 1e6,
+                current[1] / 1e6))
+        del memmap, inputs, value, data
+
+
+if __name__ == '__main__':
+    main()
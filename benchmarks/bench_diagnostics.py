@@ -0,0 +1,71 @@
+# GPLv2+
+
+"""
+Time of convergence diagnostics of a large vector variable, computed by
+pyjags.diagnostics and through ArviZ.
+
+The ArviZ path is the one criteria used to take: the samples dictionary is
+converted to InferenceData and rank normalised R-hat and bulk effective sample
+size are computed for each element.
+
+Usage::
+
+    python benchmarks/bench_diagnostics.py --elements 10000 --iterations 1000
+"""
+
+import argparse
+import time
+import warnings
+
+import numpy as np
+
+
+def _time(fn, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--elements', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--chains', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    from pyjags import diagnostics
+
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(args.elements, args.iterations, args.chains))
+    samples = {'x': x}
+
+    def numpy_path():
+        return diagnostics.rhat(x), diagnostics.ess_bulk(x)
+
+    def arviz_path():
+        idata = az.from_pyjags(samples)
+        return (az.rhat(idata).x.values, az.ess(idata).x.values)
+
+    numpy_time, (rhat, ess) = _time(numpy_path, args.repeat)
+    print('numpy: {:8.3f} s'.format(numpy_time))
+
+    try:
+        import arviz as az
+    except ImportError:
+        print('arviz: not installed')
+        return
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        arviz_time, (arviz_rhat, arviz_ess) = _time(arviz_path, args.repeat)
+    print('arviz: {:8.3f} s ({:.1f}x, largest relative difference {:.1e})'
+          .format(arviz_time, arviz_time / numpy_time,
+                  max(np.max(np.abs(rhat / arviz_rhat - 1)),
+                      np.max(np.abs(ess / arviz_ess - 1)))))
+
+
+if __name__ == '__main__':
+    main()
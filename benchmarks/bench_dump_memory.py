@@ -0,0 +1,100 @@
+# GPLv2+
+
+"""
+Peak resident memory of Model.sample while dumping monitors.
+
+Each measurement runs in a fresh interpreter, so that the peak resident set
+size reported by the operating system belongs to a single sampling run. The
+peak is reported relative to the size of the returned trace. Monitor values
+are copied once, straight into the returned arrays, so the dump adds a single
+trace to the memory already held by the JAGS monitor.
+
+To compare with another installation of pyjags, e.g. a previous release,
+pass its location with --baseline; it is put in front of PYTHONPATH of the
+measuring interpreter.
+
+Usage::
+
+    python benchmarks/bench_dump_memory.py --nodes 100000 --iterations 200
+    python benchmarks/bench_dump_memory.py --baseline /path/to/site-packages
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+CODE = '''
+model {
+    for (i in 1:N) {
+        x[i] ~ dnorm(mu, 1)
+    }
+    mu ~ dnorm(0, 1)
+}
+'''
+
+
+def measure(nodes, iterations, chains, threads):
+    import resource
+    import pyjags
+
+    model = pyjags.Model(code=CODE, data=dict(N=nodes), chains=chains,
+                         adapt=0, progress_bar=False, threads=threads)
+    model.update(1)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    samples = model.sample(iterations, vars=['x'])
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    trace = samples['x'].nbytes
+    # ru_maxrss is reported in kilobytes on Linux.
+    increase = (after - before) * 1024
+    return {
+        'pyjags': os.path.dirname(pyjags.__file__),
+        'trace_mb': trace / 2**20,
+        'peak_increase_mb': increase / 2**20,
+        'ratio': increase / trace,
+    }
+
+
+def run(args, pythonpath=None):
+    env = dict(os.environ)
+    if pythonpath:
+        env['PYTHONPATH'] = os.pathsep.join(
+            [pythonpath] + ([env['PYTHONPATH']] if 'PYTHONPATH' in env else []))
+    output = subprocess.check_output(
+        [sys.executable, __file__, '--measure',
+         '--nodes', str(args.nodes),
+         '--iterations', str(args.iterations),
+         '--chains', str(args.chains),
+         '--threads', str(args.threads)],
+        env=env)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--nodes', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--chains', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--baseline', help='location of pyjags to compare with')
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.nodes, args.iterations, args.chains,
+                                 args.threads)))
+        return
+
+    runs = [('current', None)]
+    if args.baseline:
+        runs.insert(0, ('baseline', args.baseline))
+    for label, pythonpath in runs:
+        result = run(args, pythonpath)
+        print('{label:>8}: trace {trace_mb:8.1f} MB, '
+              'peak RSS increase {peak_increase_mb:8.1f} MB '
+              '({ratio:.2f} x trace) [{pyjags}]'.format(label=label, **result))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,11 +5,14 @@
 from importlib.metadata import PackageNotFoundError, version as _dist_version
 
 # Public API
-from .model import Model
+from .model import Model, DataBundle, data_bundle
 from .incremental_sampling import (
     EffectiveSampleSizeCriterion,
     RHatDeviationCriterion,
     EffectiveSampleSizeAndRHatCriterion,
+    IncrementalEffectiveSampleSizeCriterion,
+    IncrementalRHatDeviationCriterion,
+    IncrementalEffectiveSampleSizeAndRHatCriterion,
     sample_until,
 )
 from .chain_utilities import (
@@ -17,12 +20,23 @@ from .chain_utilities import (
     extract_final_iteration_from_samples_for_initialization,
     merge_parallel_chains,
     merge_consecutive_chains,
+    SampleBuffer,
 )
 from .dic import dic_samples
 from .io import (
+    HDF5Samples,
+    HDF5SamplesDictionary,
+    NpySampleStore,
+    append_samples_dictionary_to_file,
+    convert_samples_directory_to_file,
+    convert_samples_file_to_directory,
+    load_samples_dictionary_from_directory,
     load_samples_dictionary_from_file,
+    open_samples_dictionary_from_file,
+    save_samples_dictionary_to_directory,
     save_samples_dictionary_to_file,
 )
+from .pool import ModelPool
 from .modules import *  # historically exported
 
 # Version (dist name is "pyjags-jw")
@@ -33,15 +47,31 @@ except PackageNotFoundError:  # editable dev fallback
 
 __all__ = [
     "Model",
+    "DataBundle",
+    "data_bundle",
     "EffectiveSampleSizeCriterion",
     "RHatDeviationCriterion",
     "EffectiveSampleSizeAndRHatCriterion",
+    "IncrementalEffectiveSampleSizeCriterion",
+    "IncrementalRHatDeviationCriterion",
+    "IncrementalEffectiveSampleSizeAndRHatCriterion",
     "sample_until",
     "discard_burn_in_samples",
     "extract_final_iteration_from_samples_for_initialization",
     "merge_parallel_chains",
     "merge_consecutive_chains",
+    "SampleBuffer",
     "dic_samples",
     "load_samples_dictionary_from_file",
     "save_samples_dictionary_to_file",
+    "append_samples_dictionary_to_file",
+    "NpySampleStore",
+    "load_samples_dictionary_from_directory",
+    "open_samples_dictionary_from_file",
+    "save_samples_dictionary_to_directory",
+    "convert_samples_file_to_directory",
+    "convert_samples_directory_to_file",
+    "HDF5Samples",
+    "HDF5SamplesDictionary",
+    "ModelPool",
 ]  # plus everything from modules.py
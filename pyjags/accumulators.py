@@ -0,0 +1,479 @@
+# GPLv2+
+
+"""
+Running statistics of samples updated chunk by chunk.
+
+Accumulators consume samples with shape (dims..., iteration, chain), as
+returned by Model.sample, and keep enough state to compute their statistics
+without keeping the samples themselves. Updating costs time proportional to
+the size of the new chunk.
+"""
+
+from __future__ import annotations
+
+import typing as tp
+
+import numpy as np
+
+from .chain_utilities import as_elements
+
+
+def _merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """Merge counts, means and sums of squared deviations of two groups."""
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = mean_a + delta * np.where(n > 0, n_b / np.maximum(n, 1), 0)
+        m2 = m2_a + m2_b + delta ** 2 * np.where(
+            n > 0, n_a * n_b / np.maximum(n, 1), 0)
+    return n, mean, m2
+
+
+class BatchMeansAccumulator:
+    """Per-chain batch means of a single variable.
+
+    Iterations of each chain are grouped into consecutive batches of equal
+    size, whose means and sums of squared deviations are kept. Whenever the
+    number of batches exceeds max_batches, adjacent batches are merged and the
+    batch size doubles, so that memory stays bounded by max_batches per
+    element and chain. Iterations that don't fill a whole batch are kept as
+    moments of a partial batch.
+
+    The batches provide the per-chain mean and variance, the split R-hat of
+    Gelman et al. computed over halves of the complete batches, and an
+    effective sample size from the batch means estimate of the variance of
+    the mean.
+    """
+
+    def __init__(self, max_batches: int = 64) -> None:
+        if max_batches < 4:
+            raise ValueError('max_batches should be at least 4')
+        self.max_batches = max_batches
+        self.batch_size = 1
+        self.shape: tp.Optional[tp.Tuple[int, ...]] = None
+        self.chains = 0
+        # Complete batches, shape (element, chain, batch).
+        self._means = None
+        self._m2 = None
+        # Partial batch, shape (element, chain).
+        self._partial_count = 0
+        self._partial_mean = None
+        self._partial_m2 = None
+
+    @property
+    def iterations(self) -> int:
+        """Number of iterations accumulated in each chain."""
+        if self._means is None:
+            return 0
+        return self._means.shape[-1] * self.batch_size + self._partial_count
+
+    def update(self, samples: np.ndarray) -> None:
+        """Accumulate samples with shape (dims..., iteration, chain)."""
+        x = as_elements(samples)
+        if self.shape is None:
+            self.shape = samples.shape[:-2]
+            self.chains = samples.shape[-1]
+            empty = np.zeros(x.shape[:2] + (0,))
+            self._means, self._m2 = empty, empty
+            self._partial_mean = np.zeros(x.shape[:2])
+            self._partial_m2 = np.zeros(x.shape[:2])
+        elif samples.shape[:-2] != self.shape or x.shape[1] != self.chains:
+            raise ValueError(
+                'Samples with shape {} are inconsistent with accumulated '
+                'samples of shape {} with {} chains'.format(
+                    samples.shape, self.shape, self.chains))
+
+        while x.shape[-1]:
+            # The batch size may grow with every appended batch.
+            b = self.batch_size
+            if self._partial_count:
+                # Top up the partial batch.
+                take = min(b - self._partial_count, x.shape[-1])
+                head = x[..., :take]
+                head_mean = head.mean(axis=-1)
+                head_m2 = ((head - head_mean[..., None]) ** 2).sum(axis=-1)
+                count, mean, m2 = _merge_moments(
+                    self._partial_count, self._partial_mean, self._partial_m2,
+                    take, head_mean, head_m2)
+                x = x[..., take:]
+                if count < b:
+                    self._set_partial(int(count), mean, m2)
+                else:
+                    self._set_partial(0, np.zeros_like(mean), np.zeros_like(m2))
+                    self._append(mean[..., None], m2[..., None])
+                continue
+            full = min(x.shape[-1] // b, self.max_batches)
+            if not full:
+                mean = x.mean(axis=-1)
+                self._set_partial(x.shape[-1], mean,
+                                  ((x - mean[..., None]) ** 2).sum(axis=-1))
+                break
+            batches = x[..., :full * b].reshape(x.shape[:2] + (full, b))
+            means = batches.mean(axis=-1)
+            m2 = ((batches - means[..., None]) ** 2).sum(axis=-1)
+            x = x[..., full * b:]
+            self._append(means, m2)
+
+    def _set_partial(self, count: int, mean: np.ndarray, m2: np.ndarray) -> None:
+        self._partial_count = count
+        self._partial_mean = mean
+        self._partial_m2 = m2
+
+    def _append(self, means: np.ndarray, m2: np.ndarray) -> None:
+        self._means = np.concatenate([self._means, means], axis=-1)
+        self._m2 = np.concatenate([self._m2, m2], axis=-1)
+        while self._means.shape[-1] > self.max_batches:
+            self._double()
+
+    def _double(self) -> None:
+        """Merge adjacent batches, doubling the batch size."""
+        b = self.batch_size
+        k = self._means.shape[-1]
+        pairs = k // 2
+        _, means, m2 = _merge_moments(
+            b, self._means[..., 0:2 * pairs:2], self._m2[..., 0:2 * pairs:2],
+            b, self._means[..., 1:2 * pairs:2], self._m2[..., 1:2 * pairs:2])
+        if k % 2:
+            # The unpaired batch joins the partial batch, which stays smaller
+            # than the new batch size.
+            count, self._partial_mean, self._partial_m2 = _merge_moments(
+                b, self._means[..., -1], self._m2[..., -1],
+                self._partial_count, self._partial_mean, self._partial_m2)
+            self._partial_count = int(count)
+        self._means, self._m2 = means, m2
+        self.batch_size = 2 * b
+
+    def _reshape(self, values: np.ndarray) -> np.ndarray:
+        return values.reshape(self.shape + values.shape[1:], order='F')
+
+    def _chain_moments(self):
+        b = self.batch_size
+        k = self._means.shape[-1]
+        n = k * b + self._partial_count
+        mean = (b * self._means.sum(axis=-1)
+                + self._partial_count * self._partial_mean) / n
+        m2 = (self._m2.sum(axis=-1) + self._partial_m2
+              + b * ((self._means - mean[..., None]) ** 2).sum(axis=-1)
+              + self._partial_count * (self._partial_mean - mean) ** 2)
+        return n, mean, m2
+
+    def mean(self) -> np.ndarray:
+        """Per-chain means with shape (dims..., chain)."""
+        _, mean, _ = self._chain_moments()
+        return self._reshape(mean)
+
+    def var(self) -> np.ndarray:
+        """Per-chain sample variances with shape (dims..., chain)."""
+        n, _, m2 = self._chain_moments()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._reshape(m2 / (n - 1))
+
+    def rhat(self) -> np.ndarray:
+        """Split R-hat with shape (dims...); NaN until there are 4 batches."""
+        k = self._means.shape[-1] // 2
+        if k < 2:
+            return np.full(self.shape, np.nan)
+        b = self.batch_size
+        halves = []
+        for part in (slice(0, k), slice(k, 2 * k)):
+            means = self._means[..., part]
+            mean = means.mean(axis=-1)
+            m2 = (self._m2[..., part].sum(axis=-1)
+                  + b * ((means - mean[..., None]) ** 2).sum(axis=-1))
+            halves.append((mean, m2))
+        n = k * b
+        mean = np.concatenate([h[0] for h in halves], axis=-1)
+        var = np.concatenate([h[1] for h in halves], axis=-1) / (n - 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            w = var.mean(axis=-1)
+            between = n * mean.var(axis=-1, ddof=1)
+            var_plus = (n - 1) / n * w + between / n
+            return self._reshape(np.sqrt(var_plus / w))
+
+    def ess(self) -> np.ndarray:
+        """Batch means effective sample size with shape (dims...).
+
+        NaN until every chain has at least two complete batches.
+        """
+        k = self._means.shape[-1]
+        if k < 2:
+            return np.full(self.shape, np.nan)
+        b = self.batch_size
+        n, mean, m2 = self._chain_moments()
+        chains = self.chains
+        # Variance of the mean of a batch, estimated from the spread of batch
+        # means around the means of their chains.
+        deviations = ((self._means - self._means.mean(axis=-1)[..., None])
+                      ** 2).sum(axis=(-1, -2))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            batch_var = b * deviations / (chains * (k - 1))
+            var = m2.sum(axis=-1) / (chains * (n - 1))
+            return self._reshape(chains * n * var / batch_var)
+
+
+class MomentsAccumulator:
+    """Per-chain means and variances of a single variable.
+
+    Counts, means and sums of squared deviations of each element and chain
+    are updated chunk by chunk with the pairwise form of Welford's algorithm,
+    which is numerically stable. Accumulators of the same variable, e.g. of
+    different chains, can be merged.
+    """
+
+    def __init__(self) -> None:
+        self.shape: tp.Optional[tp.Tuple[int, ...]] = None
+        self.chains = 0
+        self.iterations = 0
+        # Shape (element, chain).
+        self._mean = None
+        self._m2 = None
+
+    def update(self, samples: np.ndarray) -> None:
+        """Accumulate samples with shape (dims..., iteration, chain)."""
+        x = as_elements(samples)
+        if self.shape is None:
+            self.shape = samples.shape[:-2]
+            self.chains = samples.shape[-1]
+            self._mean = np.zeros(x.shape[:2])
+            self._m2 = np.zeros(x.shape[:2])
+        elif samples.shape[:-2] != self.shape or x.shape[1] != self.chains:
+            raise ValueError(
+                'Samples with shape {} are inconsistent with accumulated '
+                'samples of shape {} with {} chains'.format(
+                    samples.shape, self.shape, self.chains))
+        if not x.shape[-1]:
+            return
+        mean = x.mean(axis=-1)
+        m2 = ((x - mean[..., None]) ** 2).sum(axis=-1)
+        n, self._mean, self._m2 = _merge_moments(
+            self.iterations, self._mean, self._m2, x.shape[-1], mean, m2)
+        self.iterations = int(n)
+
+    def merge(self, other: 'MomentsAccumulator') -> None:
+        """Add the chains accumulated by other, with the same iterations."""
+        if other.shape is None:
+            return
+        if self.shape is None:
+            self.shape, self.iterations = other.shape, other.iterations
+            self.chains = 0
+            self._mean = np.zeros(other._mean.shape[:1] + (0,))
+            self._m2 = np.zeros(other._m2.shape[:1] + (0,))
+        elif other.shape != self.shape or other.iterations != self.iterations:
+            raise ValueError('Only accumulators of the same variable with the '
+                             'same number of iterations can be merged')
+        self._mean = np.concatenate([self._mean, other._mean], axis=-1)
+        self._m2 = np.concatenate([self._m2, other._m2], axis=-1)
+        self.chains += other.chains
+
+    def _reshape(self, values: np.ndarray) -> np.ndarray:
+        return values.reshape(self.shape + values.shape[1:], order='F')
+
+    def _pooled(self):
+        n, mean, m2 = 0, 0.0, 0.0
+        for chain in range(self.chains):
+            n, mean, m2 = _merge_moments(n, mean, m2, self.iterations,
+                                         self._mean[:, chain],
+                                         self._m2[:, chain])
+        return n, mean, m2
+
+    def chain_mean(self) -> np.ndarray:
+        """Per-chain means with shape (dims..., chain)."""
+        return self._reshape(self._mean)
+
+    def chain_var(self) -> np.ndarray:
+        """Per-chain sample variances with shape (dims..., chain)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._reshape(self._m2 / (self.iterations - 1))
+
+    def mean(self) -> np.ndarray:
+        """Means of all chains with shape (dims...)."""
+        _, mean, _ = self._pooled()
+        return self._reshape(mean)
+
+    def var(self) -> np.ndarray:
+        """Sample variances of all chains with shape (dims...)."""
+        n, _, m2 = self._pooled()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._reshape(m2 / (n - 1))
+
+
+class CovarianceAccumulator:
+    """Covariance matrix of a few scalar quantities, pooling all chains.
+
+    Samples are given as an array with shape (quantity, iteration, chain).
+    The mean vector and the matrix of sums of products of deviations are
+    updated chunk by chunk, and accumulators can be merged.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self._mean = None
+        self._comoment = None
+
+    def update(self, samples: np.ndarray) -> None:
+        """Accumulate samples with shape (quantity, iteration, chain)."""
+        x = np.ma.filled(np.ma.asarray(samples, dtype=np.double), np.nan)
+        if x.ndim != 3:
+            raise ValueError('Samples must have shape (quantity, iteration, '
+                             'chain), got shape {}'.format(x.shape))
+        x = x.reshape((x.shape[0], -1))
+        if not x.shape[1]:
+            return
+        mean = x.mean(axis=-1)
+        deviations = x - mean[:, None]
+        self._merge(x.shape[1], mean, deviations @ deviations.T)
+
+    def merge(self, other: 'CovarianceAccumulator') -> None:
+        """Add samples accumulated by other."""
+        if other.count:
+            self._merge(other.count, other._mean, other._comoment)
+
+    def _merge(self, count, mean, comoment) -> None:
+        if not self.count:
+            self.count, self._mean, self._comoment = count, mean, comoment
+            return
+        if mean.shape != self._mean.shape:
+            raise ValueError('Number of quantities {} is inconsistent with '
+                             'accumulated {}'.format(mean.shape[0],
+                                                     self._mean.shape[0]))
+        n = self.count + count
+        delta = mean - self._mean
+        self._comoment = (self._comoment + comoment
+                          + np.outer(delta, delta) * self.count * count / n)
+        self._mean = self._mean + delta * count / n
+        self.count = n
+
+    def mean(self) -> np.ndarray:
+        """Means with shape (quantity,)."""
+        return self._mean
+
+    def cov(self) -> np.ndarray:
+        """Sample covariance matrix with shape (quantity, quantity)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._comoment / (self.count - 1)
+
+
+class QuantileAccumulator:
+    """Mergeable quantile sketch of each element of a variable, pooling all
+    chains.
+
+    This is the compactor sketch of Karnin, Lang and Liberty (2016), "Optimal
+    Quantile Approximation in Streams". Samples enter the lowest of a stack of
+    levels, whose items weigh twice those of the level below. A full level is
+    sorted and every other item is promoted to the level above, alternating
+    between odd and even items. Capacities of levels shrink geometrically
+    from k at the top, so memory is at most about 3k values per element
+    whatever the number of iterations, and the rank error of quantiles is of
+    the order of 1/k. Minima and maxima, the quantiles 0 and 1, are kept
+    exactly.
+
+    All elements see the same number of samples, so they share the shape of
+    the levels and are compacted together. Elements with masked or NaN
+    samples have NaN quantiles.
+    """
+
+    def __init__(self, k: int = 200) -> None:
+        if k < 8:
+            raise ValueError('k should be at least 8')
+        self.k = k
+        self.shape: tp.Optional[tp.Tuple[int, ...]] = None
+        # Items of level h have shape (element, n_h) and weigh 2 ** h.
+        self._levels: tp.List[np.ndarray] = []
+        # Which of each pair of sorted items is promoted next, per level.
+        self._offsets: tp.List[int] = []
+        self._min = None
+        self._max = None
+
+    @property
+    def count(self) -> int:
+        """Number of samples of each element summarised by the sketch."""
+        return sum(level.shape[1] << h for h, level in enumerate(self._levels))
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self._levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def update(self, samples: np.ndarray) -> None:
+        """Accumulate samples with shape (dims..., iteration, chain)."""
+        x = as_elements(samples)
+        if self.shape is None:
+            self.shape = samples.shape[:-2]
+        elif samples.shape[:-2] != self.shape:
+            raise ValueError(
+                'Samples with shape {} are inconsistent with accumulated '
+                'samples of shape {}'.format(samples.shape, self.shape))
+        x = x.reshape((x.shape[0], -1))
+        if x.shape[1]:
+            self._extend_range(x.min(axis=-1), x.max(axis=-1))
+        self._add(0, x)
+        self._compress()
+
+    def merge(self, other: 'QuantileAccumulator') -> None:
+        """Add samples accumulated by other."""
+        if other.shape is None:
+            return
+        if self.shape is None:
+            self.shape = other.shape
+        elif other.shape != self.shape:
+            raise ValueError('Only accumulators of the same variable can be '
+                             'merged')
+        if other._min is not None:
+            self._extend_range(other._min, other._max)
+        for h, level in enumerate(other._levels):
+            self._add(h, level)
+        self._compress()
+
+    def _extend_range(self, minimum: np.ndarray, maximum: np.ndarray) -> None:
+        if self._min is None:
+            self._min, self._max = minimum, maximum
+        else:
+            self._min = np.minimum(self._min, minimum)
+            self._max = np.maximum(self._max, maximum)
+
+    def _add(self, level: int, items: np.ndarray) -> None:
+        while len(self._levels) <= level:
+            self._levels.append(np.empty((items.shape[0], 0)))
+            self._offsets.append(0)
+        self._levels[level] = np.concatenate([self._levels[level], items],
+                                             axis=-1)
+
+    def _compress(self) -> None:
+        h = 0
+        while h < len(self._levels):
+            items = self._levels[h]
+            if items.shape[1] >= self._capacity(h):
+                items = np.sort(items, axis=-1)
+                # An odd item out stays at this level.
+                even = items.shape[1] - items.shape[1] % 2
+                offset = self._offsets[h]
+                self._offsets[h] ^= 1
+                self._levels[h] = items[:, even:]
+                self._add(h + 1, items[:, offset:even:2])
+            h += 1
+
+    def quantile(self, q: tp.Union[float, tp.Sequence[float]]) -> np.ndarray:
+        """Approximate quantiles with shape (dims...) for a single q, or
+        (dims..., quantile) for a sequence."""
+        scalar = np.ndim(q) == 0
+        q = np.atleast_1d(np.asarray(q, dtype=np.double))
+        if not self.count:
+            raise ValueError('No samples accumulated')
+        items = np.concatenate(self._levels, axis=-1)
+        weights = np.concatenate([np.full(level.shape[1], 2.0 ** h)
+                                  for h, level in enumerate(self._levels)])
+        order = np.argsort(items, axis=-1)
+        items = np.take_along_axis(items, order, axis=-1)
+        weights = weights[order]
+        # Items stand for ranks around the middle of their weight.
+        ranks = np.cumsum(weights, axis=-1) - weights / 2
+        targets = q[None, :] * self.count
+        index = np.empty((items.shape[0], q.size), dtype=np.intp)
+        for i in range(q.size):
+            index[:, i] = np.argmin(np.abs(ranks - targets[:, i:i + 1]),
+                                    axis=-1)
+        result = np.take_along_axis(items, index, axis=-1)
+        result[:, q <= 0] = self._min[:, None]
+        result[:, q >= 1] = self._max[:, None]
+        result[np.isnan(items).any(axis=-1)] = np.nan
+        result = result.reshape(self.shape + (q.size,), order='F')
+        return result[..., 0] if scalar else result
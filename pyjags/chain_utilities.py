@@ -41,6 +41,31 @@ def get_chain_length(samples: tp.Dict[str, np.ndarray]) -> int:
     return next(iter(chain_lengths))
 
 
+def as_elements(samples: np.ndarray) -> np.ndarray:
+    """
+    This function flattens the elements of the samples of a single variable,
+    so that statistics of all elements can be computed at once
+
+    Parameters
+    ----------
+    samples: a Numpy array, possibly masked, with shape
+             (parameter_dimension..., chain_length, number_of_chains)
+
+    Returns
+    -------
+    a Numpy array of doubles with shape
+    (number_of_elements, number_of_chains, chain_length), in which elements
+    are in Fortran order and masked samples are NaN
+    """
+    samples = np.ma.filled(np.ma.asarray(samples, dtype=np.double), np.nan)
+    if samples.ndim < 2:
+        raise ValueError('Samples must have iteration and chain axes, '
+                         'got shape {}'.format(samples.shape))
+    iterations, chains = samples.shape[-2:]
+    samples = samples.reshape((-1, iterations, chains), order='F')
+    return np.swapaxes(samples, 1, 2)
+
+
 def discard_burn_in_samples(
         samples: tp.Dict[str, np.ndarray],
         burn_in: int) -> tp.Dict[str, np.ndarray]:
@@ -157,7 +182,8 @@ def _verify_and_get_variable_names_from_sequence_of_samples(
 
 
 def merge_consecutive_chains(
-        sequence_of_samples: tp.Sequence[tp.Dict[str, np.ndarray]]) \
+        sequence_of_samples: tp.Sequence[tp.Dict[str, np.ndarray]],
+        out: tp.Optional[tp.Dict[str, np.ndarray]] = None) \
         -> tp.Dict[str, np.ndarray]:
     """
     This function concatenates the chains in sample dictionaries sequentially
@@ -169,6 +195,9 @@ def merge_consecutive_chains(
     ----------
     sequence_of_samples: a sequence of sample dictionaries
 
+    out: an optional dictionary mapping variable names to preallocated Numpy
+         arrays of the merged shape, into which the merged samples are written
+
     Returns
     -------
     a single sample dictionary merged along chain iterations
@@ -206,13 +235,15 @@ def merge_consecutive_chains(
                              'samples.')
 
         merged_samples[variable_name] = \
-            np.concatenate(sequence_of_numpy_arrays, axis=1)
+            np.concatenate(sequence_of_numpy_arrays, axis=1,
+                           out=None if out is None else out.get(variable_name))
 
     return merged_samples
 
 
 def merge_parallel_chains(
-        sequence_of_samples: tp.Sequence[tp.Dict[str, np.ndarray]]) \
+        sequence_of_samples: tp.Sequence[tp.Dict[str, np.ndarray]],
+        out: tp.Optional[tp.Dict[str, np.ndarray]] = None) \
         -> tp.Dict[str, np.ndarray]:
     """
     This function concatenates sample dictionaries across chains
@@ -224,6 +255,9 @@ def merge_parallel_chains(
     ----------
     sequence_of_samples: a sequence of sample dictionaries
 
+    out: an optional dictionary mapping variable names to preallocated Numpy
+         arrays of the merged shape, into which the merged samples are written
+
     Returns
     -------
     a single sample dictionary merged across chains
@@ -258,6 +292,128 @@ def merge_parallel_chains(
                              'samples.')
 
         merged_samples[variable_name] = \
-            np.concatenate(sequence_of_numpy_arrays, axis=2)
+            np.concatenate(sequence_of_numpy_arrays, axis=2,
+                           out=None if out is None else out.get(variable_name))
 
     return merged_samples
+
+
+class SampleBuffer:
+    """
+    This class accumulates consecutive sample dictionaries (i.e. continues the
+    chains) like merge_consecutive_chains, but in amortised time proportional
+    to the size of the appended samples. Each variable is kept in an array
+    with spare capacity along the iteration axis, which doubles whenever it is
+    exhausted, so that earlier samples are not copied on every append.
+    """
+
+    def __init__(self,
+                 samples: tp.Optional[tp.Dict[str, np.ndarray]] = None):
+        """
+        Parameters
+        ----------
+        samples: an optional sample dictionary to start with
+        """
+        self._data: tp.Dict[str, np.ndarray] = {}
+        self._masks: tp.Dict[str, np.ndarray] = {}
+        self._lengths: tp.Dict[str, int] = {}
+        if samples is not None:
+            self.append(samples)
+
+    def append(self, samples: tp.Dict[str, np.ndarray]) -> None:
+        """
+        This function appends the iterations of a sample dictionary to the
+        chains in the buffer.
+
+        Variables may be left out, e.g. when they are no longer monitored, in
+        which case their chains become shorter than those of other variables.
+
+        Parameters
+        ----------
+        samples: a dictionary mapping variable names to Numpy arrays with shape
+                 (parameter_dimension, chain_length, number_of_chains)
+        """
+        if self._data and not set(samples.keys()) <= set(self._data.keys()):
+            raise ValueError('Samples must not contain variables missing from '
+                             'the first sample dictionary.')
+
+        for variable_name, value in samples.items():
+            self._append_variable(variable_name, value)
+
+    def _append_variable(self, variable_name: str, value: np.ndarray) -> None:
+        length = self._lengths.get(variable_name, 0)
+        chain_length = value.shape[-2]
+        data = self._data.get(variable_name)
+
+        if data is not None:
+            if data.shape[:-2] != value.shape[:-2]:
+                raise ValueError(f'The dimension of {variable_name} is '
+                                 f'inconsistent between samples.')
+            if data.shape[-1] != value.shape[-1]:
+                raise ValueError('The number of chains is inconsistent across '
+                                 'samples.')
+
+        if data is None or length + chain_length > data.shape[-2]:
+            capacity = max(length + chain_length,
+                           2 * (0 if data is None else data.shape[-2]))
+            data = self._grow(data, value, length, capacity)
+            self._data[variable_name] = data
+            mask = self._masks.get(variable_name)
+            if mask is not None:
+                self._masks[variable_name] = self._grow(
+                    mask, mask, length, capacity)
+
+        data[..., length:length + chain_length, :] = np.ma.getdata(value)
+
+        mask = np.ma.getmaskarray(value) if np.ma.is_masked(value) else None
+        if mask is not None and variable_name not in self._masks:
+            # First masked values, everything before them is present.
+            self._masks[variable_name] = np.zeros(data.shape, dtype=bool,
+                                                  order='F')
+        if variable_name in self._masks:
+            self._masks[variable_name][..., length:length + chain_length, :] = \
+                False if mask is None else mask
+
+        self._lengths[variable_name] = length + chain_length
+
+    @staticmethod
+    def _grow(array: tp.Optional[np.ndarray],
+              like: np.ndarray,
+              length: int,
+              capacity: int) -> np.ndarray:
+        shape = like.shape[:-2] + (capacity, like.shape[-1])
+        dtype = np.result_type(np.ma.getdata(like).dtype,
+                               array.dtype if array is not None else like.dtype)
+        grown = np.empty(shape, dtype=dtype, order='F')
+        if array is not None:
+            grown[..., :length, :] = array[..., :length, :]
+        return grown
+
+    def get_chain_length(self) -> int:
+        """
+        This function returns the number of iterations in the buffer, in the
+        same way as get_chain_length does for a sample dictionary.
+        """
+        if not self._lengths:
+            raise ValueError('The samples object must not be empty')
+        lengths = set(self._lengths.values())
+        if len(lengths) > 1:
+            raise ValueError(
+                'The chain lengths are not consistent across variables.')
+        return next(iter(lengths))
+
+    @property
+    def samples(self) -> tp.Dict[str, np.ndarray]:
+        """
+        A sample dictionary of views of the buffered samples. The views are
+        not invalidated by later appends, but don't include their samples.
+        """
+        result = {}
+        for variable_name, data in self._data.items():
+            length = self._lengths[variable_name]
+            value = data[..., :length, :]
+            mask = self._masks.get(variable_name)
+            if mask is not None:
+                value = np.ma.MaskedArray(value, mask=mask[..., :length, :])
+            result[variable_name] = value
+        return result
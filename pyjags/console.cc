@@ -17,13 +17,26 @@
 #include <pybind11/stl.h>
 
 #include <Console.h>
+#include <compiler/ParseTree.h>
+#include <compiler/parser_extra.h>
+#include <model/BUGSModel.h>
 #include <model/Model.h>
+#include <model/Monitor.h>
+#include <model/MonitorControl.h>
+#include <model/NodeArray.h>
+#include <model/SymTab.h>
 #include <rng/RNG.h>
 #include <rng/RNGFactory.h>
+#include <sarray/SimpleRange.h>
 #include <util/nainf.h>
 #include <version.h>
 
+#include <algorithm>
+#include <atomic>
+#include <cctype>
 #include <cstring>
+#include <memory>
+#include <mutex>
 #include <sstream>
 
 namespace py = pybind11;
@@ -65,8 +78,79 @@ public:
 // Exception object used to report errors. Created during module initialization.
 py::object JagsError;
 
-// Converts numpy array to JAGS SArray.
+// The JAGS parser keeps its state in global variables, so models are parsed
+// one at a time.
+std::mutex parser_mutex;
+
+// Copies src into dst, writing JAGS_NA where mask is set, in a single pass
+// that also casts src to doubles. Arrays may have any memory order.
+void copy_masked(PyArrayObject *dst, PyArrayObject *src, PyArrayObject *mask) {
+  PyArrayObject *ops[3] = {dst, src, mask};
+  npy_uint32 op_flags[3] = {NPY_ITER_WRITEONLY, NPY_ITER_READONLY,
+                            NPY_ITER_READONLY};
+  PyArray_Descr *dtypes[3] = {PyArray_DescrFromType(NPY_DOUBLE),
+                              PyArray_DescrFromType(NPY_DOUBLE),
+                              PyArray_DescrFromType(NPY_BOOL)};
+  NpyIter *iter = NpyIter_MultiNew(
+      3, ops,
+      NPY_ITER_EXTERNAL_LOOP | NPY_ITER_BUFFERED | NPY_ITER_GROWINNER |
+          NPY_ITER_ZEROSIZE_OK,
+      NPY_KEEPORDER, NPY_UNSAFE_CASTING, op_flags, dtypes);
+  for (auto dtype : dtypes) {
+    Py_DECREF(dtype);
+  }
+  if (!iter) {
+    throw py::error_already_set();
+  }
+  std::unique_ptr<NpyIter, int (*)(NpyIter *)> holder(iter,
+                                                       &NpyIter_Deallocate);
+  if (NpyIter_GetIterSize(iter) == 0) {
+    return;
+  }
+  NpyIter_IterNextFunc *next = NpyIter_GetIterNext(iter, NULL);
+  if (!next) {
+    throw py::error_already_set();
+  }
+  char **data = NpyIter_GetDataPtrArray(iter);
+  const npy_intp *strides = NpyIter_GetInnerStrideArray(iter);
+  const npy_intp *size = NpyIter_GetInnerLoopSizePtr(iter);
+  const bool needs_api = NpyIter_IterationNeedsAPI(iter);
+  bool more = true;
+  {
+    std::unique_ptr<py::gil_scoped_release> release;
+    if (!needs_api) {
+      release.reset(new py::gil_scoped_release());
+    }
+    do {
+      char *d = data[0], *s = data[1], *m = data[2];
+      for (npy_intp n = *size; n > 0;
+           --n, d += strides[0], s += strides[1], m += strides[2]) {
+        *(double *)d = *(npy_bool *)m ? JAGS_NA : *(double *)s;
+      }
+      more = next(iter);
+    } while (more);
+  }
+  if (PyErr_Occurred()) {
+    throw py::error_already_set();
+  }
+}
+
+// Converts numpy array to JAGS SArray, copying values only once, whatever
+// their memory order and numeric type. Masked values of numpy masked arrays
+// become JAGS_NA in the same pass.
 SArray to_jags(py::object src) {
+  static const py::object &masked_array_type = *new py::object(
+      py::module::import("numpy.ma").attr("MaskedArray"));
+  py::object mask = py::none();
+  if (py::isinstance(src, masked_array_type)) {
+    mask = src.attr("_mask");
+    src = src.attr("_data");
+    if (!py::isinstance<py::array>(mask)) {
+      // nomask, no value is masked.
+      mask = py::none();
+    }
+  }
+
   // Ensure we have a source numpy array.
   const py::object src_array = py::reinterpret_steal<py::object>(
       PyArray_FromAny(src.ptr(), NULL, 1, 0, 0, 0));
@@ -89,28 +173,245 @@ SArray to_jags(py::object src) {
     throw py::error_already_set();
   }
   PyArrayObject *dst_numpy = (PyArrayObject *)dst_array.ptr();
-  if (PyArray_CopyInto(dst_numpy, src_numpy) != 0) {
+  if (!mask.is_none()) {
+    copy_masked(dst_numpy, src_numpy, (PyArrayObject *)mask.ptr());
+  } else if (PyArray_CopyInto(dst_numpy, src_numpy) != 0) {
     throw py::error_already_set();
   }
   return dst;
 }
 
-// Converts JAGS SArray to numpy array.
-py::array to_python(const SArray &sarray) {
+// Dictionary of arrays as exchanged with JAGS.
+using SArrayMap = std::map<std::string, SArray>;
+
+// Shared ownership of a dictionary dumped from JAGS. Stored in capsules used
+// as base objects of numpy arrays viewing its values.
+using SArrayMapOwner = std::shared_ptr<const SArrayMap>;
+
+// Converts JAGS SArray to numpy array without copying its values. The array is
+// a view over sarray data kept alive by a capsule sharing ownership of the
+// dictionary containing it.
+py::array to_python(const SArray &sarray, const SArrayMapOwner &owner,
+                    bool writeable = true) {
   std::vector<npy_intp> dims{sarray.dim(false).begin(),
                              sarray.dim(false).end()};
   double *data = const_cast<double *>(sarray.value().data());
 
-  // Creat a view over sarray data. Its elements are in fortran order.
+  // Create a view over sarray data. Its elements are in fortran order. A
+  // dictionary dumped from JAGS is not accessible from anywhere else, so the
+  // view can be writeable.
   py::object view = py::reinterpret_steal<py::object>(
       PyArray_New(&PyArray_Type, dims.size(), dims.data(), NPY_DOUBLE, NULL,
-                  data, 0, NPY_ARRAY_F_CONTIGUOUS, NULL));
+                  data, 0,
+                  NPY_ARRAY_F_CONTIGUOUS | (writeable ? NPY_ARRAY_WRITEABLE : 0),
+                  NULL));
   if (!view) {
     throw py::error_already_set();
   }
 
-  return py::reinterpret_steal<py::object>(
-      PyArray_NewCopy((PyArrayObject *)view.ptr(), NPY_ANYORDER));
+  std::unique_ptr<SArrayMapOwner> holder{new SArrayMapOwner(owner)};
+  py::capsule base(holder.get(), [](void *p) {
+    delete static_cast<SArrayMapOwner *>(p);
+  });
+  holder.release();
+
+  // Steals the reference to base, also on failure.
+  if (PyArray_SetBaseObject((PyArrayObject *)view.ptr(),
+                            base.release().ptr()) != 0) {
+    throw py::error_already_set();
+  }
+  return view;
+}
+
+// Formats array shape as a Python tuple for use in error messages.
+std::string format_shape(int ndim, const npy_intp *dims) {
+  std::ostringstream result;
+  result << "(";
+  for (int i = 0; i < ndim; ++i) {
+    result << (i ? ", " : "") << dims[i];
+  }
+  result << (ndim == 1 ? ",)" : ")");
+  return result.str();
+}
+
+// Node of a monitor, either a whole node array or a range of its elements
+// given in BUGS notation, e.g. theta[1:100,3], with an index or an inclusive
+// range of indices, starting from 1, in every dimension.
+struct MonitorNode {
+  std::string name;
+  std::vector<int> lower;
+  std::vector<int> upper;
+
+  explicit MonitorNode(const std::string &expression) {
+    std::string node;
+    for (char c : expression) {
+      if (!std::isspace(static_cast<unsigned char>(c))) {
+        node.push_back(c);
+      }
+    }
+    const auto bracket = node.find('[');
+    name = node.substr(0, bracket);
+    if (bracket == std::string::npos) {
+      return;
+    }
+    std::istringstream indices(node.substr(bracket + 1));
+    char separator = ',';
+    while (separator == ',') {
+      int first, last;
+      if (!(indices >> first)) {
+        throw py::value_error("Invalid index in monitored node " +
+                              expression + ".");
+      }
+      last = first;
+      if (indices.peek() == ':' && !(indices.ignore() >> last)) {
+        throw py::value_error("Invalid index range in monitored node " +
+                              expression + ".");
+      }
+      if (first < 1 || last < first) {
+        throw py::value_error("Invalid index range in monitored node " +
+                              expression + ".");
+      }
+      lower.push_back(first);
+      upper.push_back(last);
+      if (!(indices >> separator)) {
+        separator = 0;
+      }
+    }
+    if (separator != ']' || indices.peek() != EOF) {
+      throw py::value_error("Monitored node " + expression +
+                            " should be a name optionally followed by "
+                            "indices in brackets.");
+    }
+  }
+
+  SimpleRange range() const {
+    return lower.empty() ? SimpleRange() : SimpleRange(lower, upper);
+  }
+
+  // Name of the monitor created by JAGS for the node, the name of the node
+  // array followed by the range printed without whitespace.
+  std::string monitorName() const {
+    std::ostringstream result;
+    result << name;
+    for (std::size_t i = 0; i < lower.size(); ++i) {
+      result << (i ? "," : "[") << lower[i];
+      if (upper[i] != lower[i]) {
+        result << ":" << upper[i];
+      }
+    }
+    result << (lower.empty() ? "" : "]");
+    return result.str();
+  }
+};
+
+// Wraps array of values dumped from JAGS, known to contain JAGS_NA, in a numpy
+// masked array masking those values. Masks are built only for such arrays.
+py::object mask_na(const py::object &array) {
+  static const py::object &masked_equal = *new py::object(
+      py::module::import("numpy.ma").attr("masked_equal"));
+  return masked_equal(array, JAGS_NA, py::arg("copy") = false);
+}
+
+// Converts values stored by JAGS monitor to numpy array. Values are copied
+// directly from the monitor, without intermediate SArray used by
+// Console::dumpMonitors. Resulting shape follows Monitor::dump, i.e., dimension
+// of the monitored node (flattened when requested), followed by iterations and
+// chains unless those are pooled by the monitor.
+//
+// When out is not None, values are written into it instead and out is
+// returned. It must be a numpy array of the resulting shape. Arrays of doubles
+// in fortran order are written directly, others through a temporary array.
+//
+// Values are checked for JAGS_NA while they are copied, and the result is a
+// masked array only if some of them are missing.
+py::object to_python(const Monitor &monitor, bool flat, unsigned int nchain,
+                     py::object out) {
+  const unsigned int chains = monitor.poolChains() ? 1 : nchain;
+  const std::vector<unsigned int> node_dims = monitor.dim();
+  npy_intp length = 1;
+  for (auto d : node_dims) {
+    length *= d;
+  }
+  const npy_intp chain_size = monitor.value(0).size();
+  const npy_intp iterations = length ? chain_size / length : 0;
+
+  std::vector<npy_intp> dims;
+  if (flat) {
+    dims.push_back(length);
+  } else {
+    dims.insert(dims.end(), node_dims.begin(), node_dims.end());
+  }
+  if (!monitor.poolIterations()) {
+    dims.push_back(iterations);
+  }
+  if (!monitor.poolChains()) {
+    dims.push_back(chains);
+  }
+
+  PyArrayObject *out_numpy = nullptr;
+  if (!out.is_none()) {
+    if (!PyArray_Check(out.ptr())) {
+      throw py::type_error("Output for monitor " + monitor.name() +
+                           " must be a numpy array.");
+    }
+    out_numpy = (PyArrayObject *)out.ptr();
+    if (PyArray_NDIM(out_numpy) != (int)dims.size() ||
+        !std::equal(dims.begin(), dims.end(), PyArray_DIMS(out_numpy))) {
+      throw py::value_error(
+          "Output for monitor " + monitor.name() + " has shape " +
+          format_shape(PyArray_NDIM(out_numpy), PyArray_DIMS(out_numpy)) +
+          ", but monitor has shape " +
+          format_shape(dims.size(), dims.data()) + ".");
+    }
+    if (PyArray_ISFARRAY(out_numpy) && PyArray_TYPE(out_numpy) == NPY_DOUBLE &&
+        PyArray_ISNOTSWAPPED(out_numpy)) {
+      // Values can be written directly.
+      out_numpy = nullptr;
+    }
+  }
+
+  // Allocate a new array in fortran order, unless writing to out directly.
+  // Chains are its last dimension, so values from each chain form a contiguous
+  // block.
+  py::object array = out;
+  if (out.is_none() || out_numpy) {
+    array = py::reinterpret_steal<py::object>(
+        PyArray_New(&PyArray_Type, dims.size(), dims.data(), NPY_DOUBLE, NULL,
+                    NULL, 0, NPY_ARRAY_F_CONTIGUOUS, NULL));
+    if (!array) {
+      throw py::error_already_set();
+    }
+  }
+  for (unsigned int chain = 0; chain < chains; ++chain) {
+    if ((npy_intp)monitor.value(chain).size() != chain_size) {
+      PyErr_Format(JagsError.ptr(),
+                   "Inconsistent number of values between chains in monitor: "
+                   "%s",
+                   monitor.name().c_str());
+      throw py::error_already_set();
+    }
+  }
+  double *data = (double *)PyArray_DATA((PyArrayObject *)array.ptr());
+  bool has_na = false;
+  {
+    py::gil_scoped_release release;
+    for (unsigned int chain = 0; chain < chains; ++chain) {
+      const std::vector<double> &value = monitor.value(chain);
+      double *dst = data + chain * chain_size;
+      for (npy_intp i = 0; i < chain_size; ++i) {
+        const double v = value[i];
+        dst[i] = v;
+        has_na |= v == JAGS_NA;
+      }
+    }
+  }
+  if (out_numpy) {
+    if (PyArray_CopyInto(out_numpy, (PyArrayObject *)array.ptr()) != 0) {
+      throw py::error_already_set();
+    }
+    array = out;
+  }
+  return has_na ? mask_na(array) : array;
 }
 
 // Converts Python dictionary to JAGS map.
@@ -124,20 +425,117 @@ std::map<std::string, SArray> to_jags(py::dict dictionary) {
   return result;
 }
 
-// Converts JAGS map to Python dictionary.
-py::dict to_python(const std::map<std::string, SArray> &map) {
+// Converts JAGS map to Python dictionary. Takes ownership of the map, whose
+// values become shared by the returned arrays instead of being copied.
+// Arrays containing JAGS_NA become masked arrays.
+py::dict to_python(std::unique_ptr<SArrayMap> map) {
+  const SArrayMapOwner owner{std::move(map)};
   py::dict result;
-  for (const auto &item : map) {
-    result[item.first.c_str()] = to_python(item.second);
+  for (const auto &item : *owner) {
+    const std::vector<double> &value = item.second.value();
+    py::object array = to_python(item.second, owner);
+    if (std::find(value.begin(), value.end(), JAGS_NA) != value.end()) {
+      array = mask_na(array);
+    }
+    result[item.first.c_str()] = array;
   }
   return result;
 }
 
-// Thin wrapper around Console class from JAGS.
+// Immutable dictionary of arrays converted to JAGS format once, which can be
+// passed to several consoles without converting it again. Values are exposed
+// as read-only numpy views.
+class DataBundle {
+  SArrayMapOwner data_;
+
+public:
+  // Number of times bundles were copied to compile a console, to check that
+  // they are shared where possible.
+  static std::atomic<unsigned long> copies;
+
+  explicit DataBundle(const py::dict &data)
+      : data_(std::make_shared<const SArrayMap>(to_jags(data))) {}
+
+  const SArrayMap &map() const {
+    return *data_;
+  }
+
+  std::vector<std::string> keys() const {
+    std::vector<std::string> result;
+    for (const auto &item : *data_) {
+      result.push_back(item.first);
+    }
+    return result;
+  }
+
+  py::array get(const std::string &name) const {
+    const auto it = data_->find(name);
+    if (it == data_->end()) {
+      throw py::key_error(name);
+    }
+    return to_python(it->second, data_, false);
+  }
+
+  bool contains(const std::string &name) const {
+    return data_->count(name) != 0;
+  }
+
+  size_t size() const {
+    return data_->size();
+  }
+
+  py::dict to_dict() const {
+    py::dict result;
+    for (const auto &item : *data_) {
+      result[item.first.c_str()] = to_python(item.second, data_, false);
+    }
+    return result;
+  }
+};
+
+std::atomic<unsigned long> DataBundle::copies{0};
+
+// Whether the model in file has a data block. JAGS keeps the parse tree of a
+// model to itself, so the model is parsed once more. The caller must hold the
+// parser mutex.
+bool parse_data_block(FILE *file) {
+  std::rewind(file);
+  std::vector<ParseTree *> *variables = nullptr;
+  ParseTree *data = nullptr;
+  ParseTree *relations = nullptr;
+  std::string message;
+  const bool has_data_block =
+      parse_bugs(file, variables, data, relations, message) == 0 && data;
+  if (variables) {
+    for (ParseTree *tree : *variables) {
+      delete tree;
+    }
+    delete variables;
+  }
+  delete data;
+  delete relations;
+  return has_data_block;
+}
+
+// Thin wrapper around Console class from JAGS. Long running operations release
+// the GIL, but a single console must not be used by several threads at once.
 class JagsConsole {
   std::stringstream out_stream_;
   std::stringstream err_stream_;
   Console console_;
+  // Whether the checked model has a data block.
+  bool has_data_block_ = false;
+
+  // Monitors set through this console, so that they can be recreated after
+  // their contents have been dumped, with the node expressions they were set
+  // with.
+  struct MonitorSpec {
+    std::string name;
+    MonitorNode node;
+    unsigned int thin;
+    std::string type;
+  };
+  std::vector<MonitorSpec> monitors_;
 
   JagsConsole(const JagsConsole &) = delete;
   JagsConsole &operator=(const JagsConsole &) = delete;
@@ -165,16 +563,48 @@ public:
       PyErr_SetFromErrnoWithFilename(JagsError.ptr(), path.c_str());
       throw py::error_already_set();
     }
-    invoke([&] { return console_.checkModel(fh.file()); });
+    invoke([&] {
+      py::gil_scoped_release release;
+      std::lock_guard<std::mutex> lock(parser_mutex);
+      if (!console_.checkModel(fh.file())) {
+        return false;
+      }
+      has_data_block_ = parse_data_block(fh.file());
+      return true;
+    });
   }
 
   void compile(const py::dict &data, unsigned int chains, bool generate_data) {
     auto jags_data = to_jags(data);
-    invoke([&] { return console_.compile(jags_data, chains, generate_data); });
+    invoke([&] {
+      py::gil_scoped_release release;
+      return console_.compile(jags_data, chains, generate_data);
+    });
+  }
+
+  // Compiles the model with data shared with other consoles. JAGS writes into
+  // the data table only values generated by the data block, so the table is
+  // copied only for models with a data block that generate data.
+  void compile(const DataBundle &data, unsigned int chains,
+               bool generate_data) {
+    invoke([&] {
+      py::gil_scoped_release release;
+      if (generate_data && has_data_block_) {
+        ++DataBundle::copies;
+        SArrayMap jags_data = data.map();
+        return console_.compile(jags_data, chains, generate_data);
+      }
+      return console_.compile(const_cast<SArrayMap &>(data.map()), chains,
+                              generate_data);
+    });
   }
 
   void setParameters(const py::dict &parameters, unsigned int chain) {
-    invoke([&] { return console_.setParameters(to_jags(parameters), chain); });
+    const auto jags_parameters = to_jags(parameters);
+    invoke([&] {
+      py::gil_scoped_release release;
+      return console_.setParameters(jags_parameters, chain);
+    });
   }
 
   void setRNGname(std::string const &name, unsigned int chain) {
@@ -182,7 +612,10 @@ public:
   }
 
   void initialize() {
-    invoke([&] { return console_.initialize(); });
+    invoke([&] {
+      py::gil_scoped_release release;
+      return console_.initialize();
+    });
   }
 
   void update(unsigned int iterations) {
@@ -192,27 +625,74 @@ public:
     });
   }
 
+  // JAGS discards the whole model when asked to monitor a range out of
+  // bounds of its node array, so ranges are checked beforehand. Unknown node
+  // arrays are left for JAGS to report.
+  void checkRange(const MonitorNode &node) {
+    BUGSModel *model = console_.model();
+    if (!model || node.lower.empty()) {
+      return;
+    }
+    const NodeArray *array = model->symtab().getVariable(node.name);
+    if (!array) {
+      return;
+    }
+    const std::vector<int> &first = array->range().first();
+    const std::vector<int> &last = array->range().last();
+    bool valid = first.size() == node.lower.size();
+    for (std::size_t i = 0; valid && i < first.size(); ++i) {
+      valid = first[i] <= node.lower[i] && node.upper[i] <= last[i];
+    }
+    if (!valid) {
+      std::ostringstream message;
+      message << "Monitored node " << node.monitorName()
+              << " is out of bounds of node array " << node.name
+              << " with dimensions (";
+      for (std::size_t i = 0; i < last.size(); ++i) {
+        message << (i ? ", " : "") << last[i];
+      }
+      message << (last.size() == 1 ? ",)." : ").");
+      throw py::value_error(message.str());
+    }
+  }
+
   void setMonitor(const std::string &name, unsigned int thin,
                   const std::string &type) {
-    invoke([&] { return console_.setMonitor(name, Range(), thin, type); });
+    const MonitorNode node(name);
+    checkRange(node);
+    invoke([&] {
+      return console_.setMonitor(node.name, node.range(), thin, type);
+    });
+    monitors_.push_back(MonitorSpec{name, node, thin, type});
   }
 
   void setMonitors(const std::vector<std::string> names, unsigned int thin,
                    const std::string &type) {
     for(auto&& name: names) {
-        invoke([&] { return console_.setMonitor(name, Range(), thin, type); });
+        setMonitor(name, thin, type);
     }
   }
 
   void clearMonitor(const std::string &name, const std::string &type) {
-    invoke([&] { return console_.clearMonitor(name, Range(), type); });
+    const MonitorNode node(name);
+    checkRange(node);
+    invoke([&] { return console_.clearMonitor(node.name, node.range(), type); });
+    monitors_.erase(std::remove_if(monitors_.begin(), monitors_.end(),
+                                   [&](const MonitorSpec &spec) {
+                                     return spec.name == name &&
+                                            spec.type == type;
+                                   }),
+                    monitors_.end());
   }
 
   py::dict dumpState(DumpType type, unsigned int chain) {
-    std::map<std::string, SArray> data;
+    std::unique_ptr<SArrayMap> data{new SArrayMap()};
     std::string rng_name;
-    invoke([&] { return console_.dumpState(data, rng_name, type, chain); });
-    py::dict result = to_python(data);
+    invoke([&] {
+      py::gil_scoped_release release;
+      return console_.dumpState(*data, rng_name, type, chain);
+    });
+    py::dict result = to_python(std::move(data));
     if (!rng_name.empty()) {
       result[".RNG.name"] = py::cast(rng_name);
     }
@@ -231,25 +711,80 @@ public:
     return console_.nchain();
   }
 
-  py::dict dumpMonitors(const std::string &type, bool flat) {
-    std::map<std::string, SArray> data;
-    invoke([&] { return console_.dumpMonitors(data, type, flat); });
-    return to_python(data);
+  // Dumps the contents of monitors of given type, keyed by node expressions
+  // they were set with. Values of monitors found in the out mapping are
+  // written into arrays provided there.
+  py::dict dumpMonitors(const std::string &type, bool flat,
+                        const py::object &out) {
+    const auto *model = console_.model();
+    if (!model) {
+      PyErr_SetString(JagsError.ptr(), "Can't dump monitors. No model!");
+      throw py::error_already_set();
+    }
+    py::dict result;
+    for (const MonitorControl &control : model->monitors()) {
+      const Monitor *monitor = control.monitor();
+      if (monitor->type() == type) {
+        std::string key = monitor->name();
+        for (const MonitorSpec &spec : monitors_) {
+          if (spec.type == type && spec.node.monitorName() == key) {
+            key = spec.name;
+            break;
+          }
+        }
+        const py::str name(key);
+        py::object target =
+            out.is_none() ? py::none() : out.attr("get")(name, py::none());
+        result[name] = to_python(*monitor, flat, console_.nchain(), target);
+      }
+    }
+    return result;
+  }
+
+  // Dumps the contents of monitors and then resets them, by clearing and
+  // setting them again, so that they only hold iterations performed after
+  // this call. Thinning is relative to the iteration at which a monitor was
+  // set, so consecutive drains line up with a single dump of the whole run
+  // only when they are a multiple of the thinning interval apart.
+  py::dict drainMonitors(const std::string &type, bool flat,
+                         const py::object &out) {
+    py::dict result = dumpMonitors(type, flat, out);
+    for (const MonitorSpec &spec : monitors_) {
+      if (spec.type == type) {
+        invoke([&] {
+          return console_.clearMonitor(spec.node.name, spec.node.range(), type);
+        });
+        invoke([&] {
+          return console_.setMonitor(spec.node.name, spec.node.range(),
+                                     spec.thin, type);
+        });
+      }
+    }
+    return result;
   }
 
   std::vector<std::vector<std::string>> dumpSamplers() {
     std::vector<std::vector<std::string>> samplers;
-    invoke([&] { return console_.dumpSamplers(samplers); });
+    invoke([&] {
+      py::gil_scoped_release release;
+      return console_.dumpSamplers(samplers);
+    });
     return samplers;
   }
 
   void adaptOff() {
-    invoke([&] { return console_.adaptOff(); });
+    invoke([&] {
+      py::gil_scoped_release release;
+      return console_.adaptOff();
+    });
   }
 
   bool checkAdaptation() {
     bool status = false;
-    invoke([&] { return console_.checkAdaptation(status); });
+    invoke([&] {
+      py::gil_scoped_release release;
+      return console_.checkAdaptation(status);
+    });
     return status;
   }
 
@@ -258,7 +793,11 @@ public:
   }
 
   void clearModel() {
-    console_.clearModel();
+    {
+      py::gil_scoped_release release;
+      console_.clearModel();
+    }
+    monitors_.clear();
   }
 
   static void loadModule(const std::string &name) {
@@ -382,13 +921,63 @@ PYBIND11_MODULE(console, module) {
       .value("RNG_FACTORY", RNG_FACTORY)
       .export_values();
 
+  py::class_<DataBundle>(module, "DataBundle",
+                         "Immutable data converted to JAGS format once, which "
+                         "can be used to compile several consoles.")
+      .def(py::init<const py::dict &>(), py::arg("data"),
+           "Converts a dictionary of arrays, as returned by dict_to_jags.")
+      .def("keys", &DataBundle::keys, "Returns names of variables.")
+      .def("__getitem__", &DataBundle::get, py::arg("name"),
+           "Returns a read-only view of values of a variable.")
+      .def("get",
+           [](const DataBundle &bundle, const std::string &name,
+              const py::object &default_) -> py::object {
+             if (!bundle.contains(name)) {
+               return default_;
+             }
+             return bundle.get(name);
+           },
+           py::arg("name"), py::arg("default") = py::none(),
+           "Returns a read-only view of values of a variable, or default.")
+      .def("values",
+           [](const DataBundle &bundle) {
+             return bundle.to_dict().attr("values")();
+           },
+           "Returns read-only views of values of variables.")
+      .def("items",
+           [](const DataBundle &bundle) {
+             return bundle.to_dict().attr("items")();
+           },
+           "Returns names of variables with read-only views of their values.")
+      .def("__contains__", &DataBundle::contains, py::arg("name"))
+      .def("__len__", &DataBundle::size)
+      .def_property_readonly_static(
+          "_copies",
+          [](const py::object &) { return DataBundle::copies.load(); },
+          "Number of times bundles were copied to compile a console.")
+      .def("__iter__",
+           [](const DataBundle &bundle) {
+             return py::iter(py::cast(bundle.keys()));
+           })
+      .def(py::pickle(
+          [](const DataBundle &bundle) { return bundle.to_dict(); },
+          [](const py::dict &data) { return DataBundle(data); }));
+
   py::class_<JagsConsole>(module, "Console",
                           "Low-level wrapper around JAGS Console class.")
       .def(py::init<>())
       .def("checkModel", &JagsConsole::checkModel, py::arg("path"),
            "Load the model from a file and checks its syntactic correctness.")
-      .def("compile", &JagsConsole::compile, py::arg("data"), py::arg("chains"),
-           py::arg("generate_data"), "Compiles the model.")
+      .def("compile",
+           py::overload_cast<const DataBundle &, unsigned int, bool>(
+               &JagsConsole::compile),
+           py::arg("data"), py::arg("chains"), py::arg("generate_data"),
+           "Compiles the model.")
+      .def("compile",
+           py::overload_cast<const py::dict &, unsigned int, bool>(
+               &JagsConsole::compile),
+           py::arg("data"), py::arg("chains"), py::arg("generate_data"),
+           "Compiles the model.")
       .def("setParameters", &JagsConsole::setParameters, py::arg("parameters"),
            py::arg("chain"),
            "Sets the parameters (unobserved variables) of the model.")
@@ -399,7 +988,8 @@ PYBIND11_MODULE(console, module) {
            "Updates the Markov chain generated by the model.")
       .def("setMonitor", &JagsConsole::setMonitor, py::arg("name"),
            py::arg("thin"), py::arg("type"),
-           "Sets a monitor for the given node array.")
+           "Sets a monitor for the given node array, or a range of its "
+           "elements in BUGS notation, e.g. theta[1:100,3].")
       .def("setMonitors", &JagsConsole::setMonitors, py::arg("names"),
            py::arg("thin"), py::arg("type"),
            "Sets multiple monitors for the given node array.")
@@ -414,7 +1004,11 @@ PYBIND11_MODULE(console, module) {
       .def("nchain", &JagsConsole::nchain,
            "Returns the number of chains in the model.")
       .def("dumpMonitors", &JagsConsole::dumpMonitors, py::arg("type"),
-           py::arg("flat"), "Dumps the contents of monitors.")
+           py::arg("flat"), py::arg("out") = py::none(),
+           "Dumps the contents of monitors, optionally into given arrays.")
+      .def("drainMonitors", &JagsConsole::drainMonitors, py::arg("type"),
+           py::arg("flat"), py::arg("out") = py::none(),
+           "Dumps the contents of monitors and resets them afterwards.")
       .def("dumpSamplers", &JagsConsole::dumpSamplers,
            "Dumps the names of the samplers, and the corresponding sampled "
            "nodes vectors")
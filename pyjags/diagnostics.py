@@ -0,0 +1,296 @@
+# GPLv2+
+
+"""
+Convergence diagnostics of samples computed directly with NumPy.
+
+Functions take samples of a single variable with shape
+(dims..., iteration, chain), as returned by Model.sample, and return a
+statistic for each element of the variable with shape (dims...). Elements are
+processed together in batches, with autocovariances of all chains computed by
+FFT, instead of one at a time.
+
+The estimators are those of Vehtari et al. (2021), "Rank-normalization,
+folding, and localization: An improved R-hat for assessing convergence of
+MCMC", and agree with the ones of ArviZ. Elements with masked or NaN samples,
+and samples with fewer than four iterations, have NaN statistics.
+"""
+
+from __future__ import annotations
+
+import typing as tp
+
+import numpy as np
+
+from .chain_utilities import as_elements
+
+# Elements are processed in blocks of at most this many samples, which bounds
+# the memory used by ranks and FFTs of large variables.
+_BLOCK_SAMPLES = 1 << 22
+
+# Wichura (1988), Algorithm AS241, coefficients in decreasing powers.
+_PPF_CENTRAL = (
+    np.array([2.5090809287301226727e+3, 3.3430575583588128105e+4,
+              6.7265770927008700853e+4, 4.5921953931549871457e+4,
+              1.3731693765509461125e+4, 1.9715909503065514427e+3,
+              1.3314166789178437745e+2, 3.3871328727963666080e+0]),
+    np.array([5.2264952788528545610e+3, 2.8729085735721942674e+4,
+              3.9307895800092710610e+4, 2.1213794301586595867e+4,
+              5.3941960214247511077e+3, 6.8718700749205790830e+2,
+              4.2313330701600911252e+1, 1.0]))
+_PPF_INTERMEDIATE = (
+    np.array([7.7454501427834140764e-4, 2.2723844989269184583e-2,
+              2.4178072517745061177e-1, 1.2704582524523683826e+0,
+              3.6478483247632045926e+0, 5.7694972214606914055e+0,
+              4.6303378461565452959e+0, 1.4234371107496835773e+0]),
+    np.array([1.0507500716444168432e-9, 5.4759380849953449460e-4,
+              1.5198666563616457197e-2, 1.4810397642748007459e-1,
+              6.8976733498510000455e-1, 1.6763848301838038494e+0,
+              2.0531916266377588219e+0, 1.0]))
+_PPF_TAIL = (
+    np.array([2.0103343992922881327e-7, 2.7115555687434875782e-5,
+              1.2426609473880784386e-3, 2.6532189526576123093e-2,
+              2.9656057182850489123e-1, 1.7848265399172913358e+0,
+              5.4637849111641143699e+0, 6.6579046435011037772e+0]),
+    np.array([2.0442631033899397856e-15, 1.4215117583164458887e-7,
+              1.8463183175100546818e-5, 7.8686913114561325910e-4,
+              1.4875361290850614853e-2, 1.3692988092273580531e-1,
+              5.9983220655588793769e-1, 1.0]))
+
+
+def _normal_ppf(p: np.ndarray) -> np.ndarray:
+    """Quantiles of the standard normal distribution at probabilities p."""
+    q = p - 0.5
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = 0.180625 - q * q
+        central = (q * np.polyval(_PPF_CENTRAL[0], r)
+                   / np.polyval(_PPF_CENTRAL[1], r))
+        r = np.sqrt(-np.log(np.minimum(p, 1.0 - p)))
+        tail = np.where(
+            r <= 5.0,
+            np.polyval(_PPF_INTERMEDIATE[0], r - 1.6)
+            / np.polyval(_PPF_INTERMEDIATE[1], r - 1.6),
+            np.polyval(_PPF_TAIL[0], r - 5.0)
+            / np.polyval(_PPF_TAIL[1], r - 5.0))
+    return np.where(np.abs(q) <= 0.425, central, np.copysign(tail, q))
+
+
+def _z_scale(x: np.ndarray) -> np.ndarray:
+    """Normal scores of average ranks of all samples of each element."""
+    shape = x.shape
+    elements = shape[0]
+    size = shape[-2] * shape[-1]
+    x = x.reshape(elements, size)
+    order = np.argsort(x, axis=-1)
+    ordered = np.take_along_axis(x, order, axis=-1)
+    # Runs of equal values share the average of their ranks. Each row starts
+    # a new run, so that runs can be found in the flattened array.
+    starts = np.ones(x.shape, dtype=bool)
+    starts[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    starts = starts.ravel()
+    first = np.flatnonzero(starts)
+    last = np.append(first[1:], starts.size) - 1
+    run = np.cumsum(starts) - 1
+    # Twice the 0-based average rank, which indexes a table of scores of all
+    # possible ranks with Blom's fractional offset of 3/8.
+    twice = (first + last)[run].reshape(x.shape) \
+        - (2 * size * np.arange(elements))[:, None]
+    scores = _normal_ppf((np.arange(2 * size - 1) / 2.0 + 0.625)
+                         / (size + 0.25))
+    z = np.empty(x.shape)
+    np.put_along_axis(z, order, scores[twice], axis=-1)
+    return z.reshape(shape)
+
+
+def _split_chains(x: np.ndarray) -> np.ndarray:
+    """Split each chain in halves, dropping the middle of odd chains."""
+    half = x.shape[-1] // 2
+    return np.concatenate([x[..., :half], x[..., x.shape[-1] - half:]],
+                          axis=-2)
+
+
+def _autocovariance(x: np.ndarray) -> np.ndarray:
+    """Autocovariances along the last axis, computed by FFT."""
+    n = x.shape[-1]
+    size = 1 << int(2 * n - 1).bit_length()
+    x = x - x.mean(axis=-1, keepdims=True)
+    transform = np.fft.rfft(x, n=size, axis=-1)
+    transform *= np.conjugate(transform)
+    return np.fft.irfft(transform, n=size, axis=-1)[..., :n] / n
+
+
+def _rhat(x: np.ndarray) -> np.ndarray:
+    """Potential scale reduction of chains of each element."""
+    draws = x.shape[-1]
+    between = draws * x.mean(axis=-1).var(axis=-1, ddof=1)
+    within = x.var(axis=-1, ddof=1).mean(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.sqrt((between / within + draws - 1) / draws)
+
+
+def _ess(x: np.ndarray) -> np.ndarray:
+    """Effective sample size of chains of each element.
+
+    Autocorrelations are summed over Geyer's initial monotone sequence of
+    positive sums of pairs of consecutive lags.
+    """
+    x = x.astype(np.double, copy=False)
+    elements, chains, draws = x.shape
+    acov = _autocovariance(x)
+    mean_var = acov[..., 0].mean(axis=-1) * draws / (draws - 1)
+    var_plus = mean_var * (draws - 1) / draws
+    if chains > 1:
+        var_plus = var_plus + x.mean(axis=-1).var(axis=-1, ddof=1)
+    pairs = max((draws - 1) // 2 - 1, 0) + 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rho = 1.0 - ((mean_var[:, None] - acov[..., :2 * pairs].mean(axis=-2))
+                     / var_plus[:, None])
+    rho[:, 0] = 1.0
+    sums = rho.reshape(elements, pairs, 2).sum(axis=-1)
+
+    # The sequence ends with the first pair that doesn't have a positive sum,
+    # which is itself kept only when its sum is zero.
+    positive = sums > 0
+    last = np.where(positive.all(axis=-1), pairs - 1,
+                    np.argmin(positive, axis=-1))
+    last = np.minimum(last, pairs - 1)
+    monotone = np.cumsum(np.minimum.accumulate(sums, axis=-1), axis=-1)
+    before = np.where(
+        last > 0,
+        np.take_along_axis(monotone, np.maximum(last - 1, 0)[:, None],
+                           axis=-1)[:, 0],
+        0.0)
+    even = np.take_along_axis(rho, 2 * last[:, None], axis=-1)[:, 0]
+    kept = (last > 0) & (np.take_along_axis(sums, last[:, None],
+                                            axis=-1)[:, 0] >= 0)
+    tau = -1.0 + 2.0 * before + np.where((even > 0) | kept, even, 0.0)
+
+    size = chains * draws
+    tau = np.maximum(tau, 1.0 / np.log10(size))
+    ess = size / tau
+    ess[np.isnan(rho).any(axis=-1)] = np.nan
+    constant = x.max(axis=(-1, -2)) - x.min(axis=(-1, -2)) \
+        < np.finfo(np.double).resolution
+    ess[constant] = size
+    return ess
+
+
+def _apply(statistic: tp.Callable[[np.ndarray], np.ndarray],
+           samples: np.ndarray,
+           minimum_chains: int = 1) -> np.ndarray:
+    """Apply statistic to blocks of elements of samples.
+
+    The statistic receives arrays with shape (element, chain, iteration).
+    """
+    samples = np.ma.asarray(samples)
+    shape = samples.shape[:-2]
+    x = as_elements(samples)
+    elements, chains, draws = x.shape
+    if draws < 4 or chains < minimum_chains:
+        return np.full(shape, np.nan)
+    result = np.empty(elements)
+    block = max(_BLOCK_SAMPLES // (chains * draws), 1)
+    for start in range(0, elements, block):
+        values = x[start:start + block]
+        result[start:start + block] = statistic(values)
+    result[np.isnan(x).any(axis=(-1, -2))] = np.nan
+    return result.reshape(shape, order='F')
+
+
+def _rank_rhat(x: np.ndarray) -> np.ndarray:
+    x = _split_chains(x)
+    bulk = _rhat(_z_scale(x))
+    folded = np.abs(x - np.median(x, axis=(-1, -2), keepdims=True))
+    return np.maximum(bulk, _rhat(_z_scale(folded)))
+
+
+def rhat(samples: np.ndarray) -> np.ndarray:
+    """
+    This function computes the rank normalised split R-hat of each element of
+    a variable, the larger of the R-hat of normal scores of the samples and of
+    their distances from the median.
+
+    Parameters
+    ----------
+    samples: a Numpy array with shape (dims..., iteration, chain)
+
+    Returns
+    -------
+    a Numpy array with shape (dims...), NaN with fewer than two chains
+    """
+    return _apply(_rank_rhat, samples, minimum_chains=2)
+
+
+def ess_bulk(samples: np.ndarray) -> np.ndarray:
+    """
+    This function computes the bulk effective sample size of each element of a
+    variable, that of normal scores of the ranks of the samples in split
+    chains.
+
+    Parameters
+    ----------
+    samples: a Numpy array with shape (dims..., iteration, chain)
+
+    Returns
+    -------
+    a Numpy array with shape (dims...)
+    """
+    return _apply(lambda x: _ess(_z_scale(_split_chains(x))), samples)
+
+
+def ess_tail(samples: np.ndarray, prob: float = 0.05) -> np.ndarray:
+    """
+    This function computes the tail effective sample size of each element of
+    a variable, the smaller of the effective sample sizes of the indicators of
+    samples below the prob and 1 - prob quantiles.
+
+    Parameters
+    ----------
+    samples: a Numpy array with shape (dims..., iteration, chain)
+    prob: the probability of the lower quantile
+
+    Returns
+    -------
+    a Numpy array with shape (dims...)
+    """
+    def tail(x):
+        quantiles = np.quantile(x, [prob, 1.0 - prob], axis=(-1, -2))
+        return np.minimum(
+            *(_ess(_split_chains(x <= q[:, None, None])) for q in quantiles))
+
+    return _apply(tail, samples)
+
+
+def ess_mean(samples: np.ndarray) -> np.ndarray:
+    """
+    This function computes the effective sample size for the mean of each
+    element of a variable, that of the samples in split chains.
+
+    Parameters
+    ----------
+    samples: a Numpy array with shape (dims..., iteration, chain)
+
+    Returns
+    -------
+    a Numpy array with shape (dims...)
+    """
+    return _apply(lambda x: _ess(_split_chains(x)), samples)
+
+
+def mcse_mean(samples: np.ndarray) -> np.ndarray:
+    """
+    This function computes the Monte Carlo standard error of the mean of each
+    element of a variable.
+
+    Parameters
+    ----------
+    samples: a Numpy array with shape (dims..., iteration, chain)
+
+    Returns
+    -------
+    a Numpy array with shape (dims...)
+    """
+    def mcse(x):
+        sd = x.reshape(x.shape[0], -1).std(axis=-1, ddof=1)
+        return sd / np.sqrt(_ess(_split_chains(x)))
+
+    return _apply(mcse, samples)
@@ -10,24 +10,72 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 # GNU General Public License for more details.
 
-import arviz as az
+import time
+
 import numpy as np
 import typing as tp
 
 from .chain_utilities import (
-    merge_consecutive_chains,
+    SampleBuffer,
     get_chain_length)
 
+from . import diagnostics
+from .accumulators import BatchMeansAccumulator
+from .io import NpySampleStore
 from .model import Model
+from .workers import WorkerPool
+
+
+def _minimum(values: tp.Iterable[np.ndarray], default: float) -> float:
+    values = np.concatenate([np.ravel(value) for value in values])
+    values = values[~np.isnan(values)]
+    return float(values.min()) if values.size else default
+
+
+def _maximum(values: tp.Iterable[np.ndarray], default: float) -> float:
+    return -_minimum((-value for value in values), -default)
+
+
+def _variable_ess(samples: tp.Dict[str, np.ndarray],
+                  variable_names: tp.Optional[tp.List[str]]) \
+        -> tp.Dict[str, float]:
+    """Smallest bulk ESS of elements of each variable, NaN if undefined."""
+    if variable_names is None:
+        variable_names = samples.keys()
+    else:
+        # Variables retired by sample_until are no longer evaluated.
+        variable_names = [name for name in variable_names if name in samples]
+    return {name: _minimum([diagnostics.ess_bulk(samples[name])], np.nan)
+            for name in variable_names}
+
+
+def _variable_rhat_deviation(samples: tp.Dict[str, np.ndarray],
+                             variable_names: tp.Optional[tp.List[str]]) \
+        -> tp.Dict[str, float]:
+    """Largest rhat deviation of elements of each variable, NaN if undefined."""
+    if variable_names is None:
+        variable_names = samples.keys()
+    else:
+        # Variables retired by sample_until are no longer evaluated.
+        variable_names = [name for name in variable_names if name in samples]
+    return {name: _maximum([np.abs(diagnostics.rhat(samples[name]) - 1.0)],
+                           np.nan)
+            for name in variable_names}
 
 
 class EffectiveSampleSizeCriterion:
+    # Values found by the latest call, overall and for each variable, used
+    # by sample_until to size chunks and retire converged variables.
+    last_minimum_ess: tp.Optional[float] = None
+    last_convergence: tp.Optional[tp.Dict[str, bool]] = None
+
     def __init__(self,
                  minimum_ess: int,
                  variable_names: tp.Optional[tp.List[str]] = None):
         """
         This class implements a minimum effective sample size criterion to be
-        used with sample_until.
+        used with sample_until. The bulk effective sample size of every element
+        of the variables must reach the minimum.
 
         Parameters
         ----------
@@ -48,12 +96,11 @@ class EffectiveSampleSizeCriterion:
     def __call__(self,
                  samples: tp.Dict[str, np.ndarray],
                  verbose: bool) -> bool:
-        idata = az.from_pyjags(samples)
-        ess = az.ess(idata, var_names=self.variable_names)
-
-        minimum_ess = min(value['data']
-                          for key, value
-                          in ess.to_dict()['data_vars'].items())
+        ess = _variable_ess(samples, self.variable_names)
+        minimum_ess = _minimum(ess.values(), 0.0)
+        self.last_minimum_ess = minimum_ess
+        self.last_convergence = {name: value >= self.minimum_ess
+                                 for name, value in ess.items()}
 
         if verbose:
             print(f'minimum ess = {minimum_ess}')
@@ -62,12 +109,16 @@ class EffectiveSampleSizeCriterion:
 
 
 class RHatDeviationCriterion:
+    last_maximum_rhat_deviation: tp.Optional[float] = None
+    last_convergence: tp.Optional[tp.Dict[str, bool]] = None
+
     def __init__(self,
                  maximum_rhat_deviation: float,
                  variable_names: tp.Optional[tp.List[str]] = None):
         """
         This class implements a maximum rhat deviation criterion to be used with
-        sample_until.
+        sample_until. The rank normalised split rhat of every element of the
+        variables is considered.
 
         Parameters
         ----------
@@ -88,12 +139,12 @@ class RHatDeviationCriterion:
     def __call__(self,
                  samples: tp.Dict[str, np.ndarray],
                  verbose: bool) -> bool:
-        idata = az.from_pyjags(samples)
-        rhat = az.rhat(idata, var_names=self.variable_names)
-
-        maximum_rhat_deviation = max(abs(value['data'] - 1.0)
-                                     for key, value
-                                     in rhat.to_dict()['data_vars'].items())
+        deviation = _variable_rhat_deviation(samples, self.variable_names)
+        maximum_rhat_deviation = _maximum(deviation.values(), np.inf)
+        self.last_maximum_rhat_deviation = maximum_rhat_deviation
+        self.last_convergence = {
+            name: value <= self.maximum_rhat_deviation
+            for name, value in deviation.items()}
 
         if verbose:
             print(f'maximum rhat deviation = {maximum_rhat_deviation}')
@@ -102,6 +153,10 @@ class RHatDeviationCriterion:
 
 
 class EffectiveSampleSizeAndRHatCriterion:
+    last_minimum_ess: tp.Optional[float] = None
+    last_maximum_rhat_deviation: tp.Optional[float] = None
+    last_convergence: tp.Optional[tp.Dict[str, bool]] = None
+
     def __init__(self,
                  minimum_ess: int,
                  maximum_rhat_deviation: float,
@@ -135,18 +190,209 @@ class EffectiveSampleSizeAndRHatCriterion:
     def __call__(self,
                  samples: tp.Dict[str, np.ndarray],
                  verbose: bool) -> bool:
-        idata = az.from_pyjags(samples)
-        ess = az.ess(idata, var_names=self.variable_names)
+        ess = _variable_ess(samples, self.variable_names)
+        minimum_ess = _minimum(ess.values(), 0.0)
+        self.last_minimum_ess = minimum_ess
+        deviation = _variable_rhat_deviation(samples, self.variable_names)
+        maximum_rhat_deviation = _maximum(deviation.values(), np.inf)
+        self.last_maximum_rhat_deviation = maximum_rhat_deviation
+        self.last_convergence = {
+            name: ess[name] >= self.minimum_ess
+            and deviation[name] <= self.maximum_rhat_deviation
+            for name in ess}
+        if verbose:
+            print(f'minimum ess = {minimum_ess}')
+            print(f'maximum rhat deviation = {maximum_rhat_deviation}')
+
+        return minimum_ess >= self.minimum_ess and \
+               maximum_rhat_deviation <= self.maximum_rhat_deviation
+
+
+class _IncrementalCriterion:
+    """
+    Base of criteria that accumulate running statistics of samples. Such
+    criteria have the incremental attribute set, and sample_until calls them
+    with newly drawn samples only, instead of all samples drawn so far.
+    """
+    incremental = True
+
+    def __init__(self,
+                 variable_names: tp.Optional[tp.List[str]],
+                 max_batches: int):
+        self._variable_names = variable_names
+        self._max_batches = max_batches
+        self._accumulators: tp.Dict[str, BatchMeansAccumulator] = {}
+
+    @property
+    def variable_names(self) -> tp.Optional[tp.List[str]]:
+        return self._variable_names
+
+    @property
+    def accumulators(self) -> tp.Dict[str, BatchMeansAccumulator]:
+        return self._accumulators
+
+    def reset(self):
+        """Forget samples accumulated so far."""
+        self._accumulators = {}
+
+    def _update(self, samples: tp.Dict[str, np.ndarray]):
+        names = self.variable_names
+        if names is None:
+            names = samples.keys()
+        for name in names:
+            if name not in samples and name in self._accumulators:
+                # No longer monitored by sample_until.
+                continue
+            if name not in self._accumulators:
+                self._accumulators[name] = \
+                    BatchMeansAccumulator(self._max_batches)
+            self._accumulators[name].update(samples[name])
+
+    def _current_variable_ess(self) -> tp.Dict[str, float]:
+        return {name: _minimum([a.ess()], np.nan)
+                for name, a in self._accumulators.items()}
+
+    def _current_variable_rhat_deviation(self) -> tp.Dict[str, float]:
+        return {name: _maximum([np.abs(a.rhat() - 1.0)], np.nan)
+                for name, a in self._accumulators.items()}
+
+
+class IncrementalEffectiveSampleSizeCriterion(_IncrementalCriterion):
+    last_minimum_ess: tp.Optional[float] = None
+    last_convergence: tp.Optional[tp.Dict[str, bool]] = None
+
+    def __init__(self,
+                 minimum_ess: int,
+                 variable_names: tp.Optional[tp.List[str]] = None,
+                 max_batches: int = 64):
+        """
+        This class implements a minimum effective sample size criterion to be
+        used with sample_until. The effective sample size is estimated with
+        batch means accumulated across calls, so that each call only
+        processes newly drawn samples.
+
+        Parameters
+        ----------
+        minimum_ess: the minimum effective sample size required
+        variable_names: the names of the variables to consider
+        max_batches: the maximum number of batch means kept per chain
+        """
+        super().__init__(variable_names, max_batches)
+        self._minimum_ess = minimum_ess
+
+    @property
+    def minimum_ess(self) -> int:
+        return self._minimum_ess
+
+    def __call__(self,
+                 samples: tp.Dict[str, np.ndarray],
+                 verbose: bool) -> bool:
+        self._update(samples)
+        ess = self._current_variable_ess()
+        minimum_ess = _minimum(ess.values(), 0.0)
+        self.last_minimum_ess = minimum_ess
+        self.last_convergence = {name: value >= self.minimum_ess
+                                 for name, value in ess.items()}
+
+        if verbose:
+            print(f'minimum ess = {minimum_ess}')
+
+        return minimum_ess >= self.minimum_ess
+
+
+class IncrementalRHatDeviationCriterion(_IncrementalCriterion):
+    last_maximum_rhat_deviation: tp.Optional[float] = None
+    last_convergence: tp.Optional[tp.Dict[str, bool]] = None
+
+    def __init__(self,
+                 maximum_rhat_deviation: float,
+                 variable_names: tp.Optional[tp.List[str]] = None,
+                 max_batches: int = 64):
+        """
+        This class implements a maximum rhat deviation criterion to be used with
+        sample_until. Split rhat is computed from batch means accumulated across
+        calls, so that each call only processes newly drawn samples.
+
+        Parameters
+        ----------
+        maximum_rhat_deviation: the maximum allowed deviation of rhat from 1
+        variable_names: the names of the variables to consider
+        max_batches: the maximum number of batch means kept per chain
+        """
+        super().__init__(variable_names, max_batches)
+        self._maximum_rhat_deviation = maximum_rhat_deviation
+
+    @property
+    def maximum_rhat_deviation(self) -> float:
+        return self._maximum_rhat_deviation
+
+    def __call__(self,
+                 samples: tp.Dict[str, np.ndarray],
+                 verbose: bool) -> bool:
+        self._update(samples)
+        deviation = self._current_variable_rhat_deviation()
+        maximum_rhat_deviation = _maximum(deviation.values(), np.inf)
+        self.last_maximum_rhat_deviation = maximum_rhat_deviation
+        self.last_convergence = {
+            name: value <= self.maximum_rhat_deviation
+            for name, value in deviation.items()}
+
+        if verbose:
+            print(f'maximum rhat deviation = {maximum_rhat_deviation}')
+
+        return maximum_rhat_deviation <= self.maximum_rhat_deviation
+
+
+class IncrementalEffectiveSampleSizeAndRHatCriterion(_IncrementalCriterion):
+    last_minimum_ess: tp.Optional[float] = None
+    last_maximum_rhat_deviation: tp.Optional[float] = None
+    last_convergence: tp.Optional[tp.Dict[str, bool]] = None
+
+    def __init__(self,
+                 minimum_ess: int,
+                 maximum_rhat_deviation: float,
+                 variable_names: tp.Optional[tp.List[str]] = None,
+                 max_batches: int = 64):
+        """
+        This class implements a combined minimum effective sample size and
+        maximum rhat deviation criterion to be used with sample_until. Both are
+        computed from batch means accumulated across calls, so that each call
+        only processes newly drawn samples.
+
+        Parameters
+        ----------
+        minimum_ess: the minimum effective sample size required
+        maximum_rhat_deviation: the maximum allowed deviation of rhat from 1
+        variable_names: the names of the variables to consider
+        max_batches: the maximum number of batch means kept per chain
+        """
+        super().__init__(variable_names, max_batches)
+        self._minimum_ess = minimum_ess
+        self._maximum_rhat_deviation = maximum_rhat_deviation
+
+    @property
+    def minimum_ess(self) -> int:
+        return self._minimum_ess
 
-        minimum_ess = min(value['data']
-                          for key, value
-                          in ess.to_dict()['data_vars'].items())
+    @property
+    def maximum_rhat_deviation(self) -> float:
+        return self._maximum_rhat_deviation
 
-        rhat = az.rhat(idata, var_names=self.variable_names)
+    def __call__(self,
+                 samples: tp.Dict[str, np.ndarray],
+                 verbose: bool) -> bool:
+        self._update(samples)
+        ess = self._current_variable_ess()
+        minimum_ess = _minimum(ess.values(), 0.0)
+        self.last_minimum_ess = minimum_ess
+        deviation = self._current_variable_rhat_deviation()
+        maximum_rhat_deviation = _maximum(deviation.values(), np.inf)
+        self.last_maximum_rhat_deviation = maximum_rhat_deviation
+        self.last_convergence = {
+            name: ess[name] >= self.minimum_ess
+            and deviation[name] <= self.maximum_rhat_deviation
+            for name in ess}
 
-        maximum_rhat_deviation = max(abs(value['data'] - 1.0)
-                                     for key, value
-                                     in rhat.to_dict()['data_vars'].items())
         if verbose:
             print(f'minimum ess = {minimum_ess}')
             print(f'maximum rhat deviation = {maximum_rhat_deviation}')
@@ -158,6 +404,62 @@ class EffectiveSampleSizeAndRHatCriterion:
 IterationFunctionType = tp.Callable[[tp.Dict[str, np.ndarray], bool, int], None]
 
 
+def _predict_iterations_left(criterion, iterations: int) \
+        -> tp.Optional[float]:
+    """
+    Predict the number of iterations left until a criterion is met from the
+    values found by its latest call on samples of the given number of
+    iterations. The effective sample size is assumed to grow in proportion to
+    the number of iterations and the deviation of rhat from 1 to decrease in
+    inverse proportion. Returns None for criteria without such values.
+    """
+    predictions = []
+    ess = getattr(criterion, 'last_minimum_ess', None)
+    if ess is not None:
+        if ess <= 0:
+            return None
+        predictions.append(iterations * (criterion.minimum_ess / ess - 1))
+    deviation = getattr(criterion, 'last_maximum_rhat_deviation', None)
+    if deviation is not None:
+        if not np.isfinite(deviation) or criterion.maximum_rhat_deviation <= 0:
+            return None
+        predictions.append(
+            iterations * (deviation / criterion.maximum_rhat_deviation - 1))
+    return max(predictions) if predictions else None
+
+
+def _pipelined_samples(model: Model,
+                       iterations: int,
+                       chunk_size: int,
+                       vars: tp.Sequence[str],
+                       thin: int,
+                       monitor_type: str) \
+        -> tp.Iterator[tp.Dict[str, np.ndarray]]:
+    """
+    Yield chunks of samples like Model.sample_iter, while the next chunk is
+    being drawn in a background thread. Closing the generator waits for the
+    chunk being drawn and discards it.
+    """
+    chunks = model.sample_iter(iterations, chunk_size, vars, thin,
+                               monitor_type)
+    pool = WorkerPool(1)
+    future = None
+    try:
+        future = pool.submit(0, next, chunks, None)
+        while True:
+            samples = future.result()
+            if samples is None:
+                return
+            future = pool.submit(0, next, chunks, None)
+            yield samples
+    finally:
+        if future is not None:
+            # The model must not be used before the chunk is drawn.
+            future.exception()
+        pool.shutdown()
+        chunks.close()
+
+
 def sample_until(model: Model,
                  criterion: tp.Callable[[tp.Dict[str, np.ndarray], bool], bool],
                  previous_samples: tp.Optional[tp.Dict[str, np.ndarray]] = None,
@@ -167,7 +469,14 @@ def sample_until(model: Model,
                  thin: int = 1,
                  monitor_type: str = "trace",
                  verbose: bool = False,
-                 iteration_function: tp.Optional[IterationFunctionType] = None) \
+                 iteration_function: tp.Optional[IterationFunctionType] = None,
+                 store: tp.Union[str, NpySampleStore, None] = None,
+                 pipeline: bool = False,
+                 keep_surplus: bool = True,
+                 adaptive: bool = False,
+                 time_budget: tp.Optional[float] = None,
+                 retire_converged: bool = False,
+                 retired_thin: tp.Optional[int] = None) \
         -> tp.Dict[str, np.ndarray]:
     """
     This function progressively samples from a model until a criterion is met.
@@ -175,11 +484,15 @@ def sample_until(model: Model,
     Parameters
     ----------
     model: a PyJAGS model
-    criterion: a function evaluating a samples dictionary and returning a bool
+    criterion: a function evaluating a samples dictionary and returning a bool;
+               criteria with a true incremental attribute are given only
+               samples drawn since the previous call
     previous_samples: an existing sample dictionary to incorporate
-    chunk_size: the number of iterations to sample each step
+    chunk_size: the number of iterations to sample each step, or the first
+                step when adaptive
     max_iterations: the maximum number of iterations to sample
-    vars: a list of variables to monitor
+    vars: a list of variables to monitor, which may be ranges of their
+          elements in BUGS notation as in Model.sample
     thin: a positive integer specifying thinning interval
     monitor_type
     verbose: whether to output step information
@@ -189,6 +502,37 @@ def sample_until(model: Model,
                         2. boolean indicating whether the criterion has been met
                         3. integer of iterations so far
                         returning None
+    store: a directory or an NpySampleStore to which samples are appended on
+           disk as they are drawn; previous_samples, when given, are stored
+           first and the returned samples are memory maps of the store;
+           without a store samples are collected in a SampleBuffer and the
+           returned arrays are views of it
+    pipeline: whether to draw the next chunk in the background while the
+              criterion and iteration_function evaluate the previous ones;
+              chunk_size is then rounded up to a multiple of thin, and the
+              model must not be used elsewhere until sample_until returns
+    keep_surplus: with pipeline, whether the chunk drawn while the criterion
+                  was being met is appended to the returned samples (and
+                  passed to iteration_function) or discarded; the model
+                  advances past it either way
+    adaptive: whether to size each step after the first from the iterations
+              predicted to be left until the criterion is met, using the
+              effective sample size and rhat deviation found by its latest
+              call, while keeping the time spent evaluating the criterion to
+              a tenth of the time spent sampling; steps are at most as long as
+              all previous ones together, or chunk_size when larger
+    time_budget: a number of seconds after which sampling stops; steps are
+                 shortened to end within it according to the measured time
+                 per iteration
+    retire_converged: whether to stop monitoring variables that the criterion
+                      reports as converged in its last_convergence
+                      attribute; retired variables keep that verdict and are
+                      no longer given to the criterion, and have fewer
+                      iterations than other variables in the returned samples
+    retired_thin: a thinning interval with which retired variables are still
+                  monitored, instead of not being monitored at all; the
+                  returned samples of a retired variable are then spaced by
+                  thin up to its retirement and by retired_thin after it
 
     Returns
     -------
@@ -198,45 +542,148 @@ def sample_until(model: Model,
     if chunk_size > max_iterations:
         raise ValueError('chunk_size must be less than or equal to '
                          'max_iterations')
+    if pipeline and (adaptive or time_budget is not None or retire_converged):
+        raise ValueError('Steps of a pipeline are drawn ahead of time and '
+                         'cannot be adaptive, limited by time_budget or '
+                         'retire variables.')
+    started = time.perf_counter()
 
     # if previous_samples is not None:
     #     print(f'chain_length at the beginning of sample_until = '
     #           f'{get_chain_length(previous_samples)}')
 
+    # Incremental criteria are given only samples they haven't seen yet.
+    incremental = getattr(criterion, 'incremental', False)
+
     if previous_samples is not None and criterion(previous_samples, verbose):
         return previous_samples
 
+    if store is not None:
+        if not isinstance(store, NpySampleStore):
+            store = NpySampleStore(store)
+        if previous_samples is not None:
+            store.append(previous_samples)
+    else:
+        # Chunks are appended in place rather than concatenated with all
+        # samples drawn so far.
+        buffer = SampleBuffer(previous_samples)
+
+    chunks = None
+    if pipeline:
+        # Chunks of sample_iter keep the thinning phase of monitors aligned.
+        chunk_size = -(-chunk_size // thin) * thin
+        chunks = _pipelined_samples(model, max_iterations, chunk_size, vars,
+                                    thin, monitor_type)
+
+    if retire_converged:
+        vars = list(model.variables if vars is None else vars)
+    retired = set()
+
+    def draw(iterations):
+        if chunks is None:
+            monitored, thinning = vars, thin
+            if retired and retired_thin is None:
+                monitored = [name for name in vars if name not in retired]
+            elif retired:
+                thinning = {name: retired_thin if name in retired else thin
+                            for name in vars}
+            return model.sample(iterations=iterations,
+                                vars=monitored,
+                                thin=thinning,
+                                monitor_type=monitor_type,
+                                store=store)
+        samples = next(chunks)
+        if store is None:
+            return samples
+        store.append(samples)
+        return store.load()
+
+    def merge(new_samples):
+        """Return all samples drawn so far and the new ones."""
+        if store is not None:
+            # Samples in the store already include previous ones.
+            offsets = {} if previous_samples is None else \
+                {k: v.shape[-2] for k, v in previous_samples.items()}
+            return new_samples, \
+                {k: v[..., offsets.get(k, 0):, :]
+                 for k, v in new_samples.items()}
+        buffer.append(new_samples)
+        return buffer.samples, new_samples
+
     iterations_left = max_iterations
-    while True:
-        iterations = min(iterations_left, chunk_size)
-
-        new_samples = model.sample(iterations=iterations,
-                                   vars=vars,
-                                   thin=thin,
-                                   monitor_type=monitor_type)
-
-        if previous_samples is None:
-            previous_samples = new_samples
-        else:
-            previous_samples = \
-                merge_consecutive_chains((previous_samples, new_samples))
-            # print(f'chain_length at the after merging in sample_until = '
-            #       f'{get_chain_length(previous_samples)}')
-
-        iterations_left -= iterations
-
-        criterion_satisfied = criterion(previous_samples, verbose)
-
-        if iteration_function is not None:
-            iteration_function(previous_samples,
-                               criterion_satisfied,
-                               max_iterations - iterations_left)
-
-        if criterion_satisfied:
-            break
-        elif iterations_left <= 1:
-            print('maximum number of iterations reached without '
-                  'satisfying the criterion')
-            break
+    # Iterations in previous samples count towards the criterion, not towards
+    # max_iterations.
+    total_iterations = 0 if previous_samples is None else \
+        get_chain_length(previous_samples) * thin
+    sampling_seconds = 0.0
+    try:
+        while True:
+            iterations = min(iterations_left, chunk_size)
+
+            if time_budget is not None and sampling_seconds:
+                seconds_per_iteration = \
+                    sampling_seconds / (max_iterations - iterations_left)
+                remaining = time_budget - (time.perf_counter() - started)
+                iterations = min(iterations,
+                                 int(remaining / seconds_per_iteration))
+                if iterations < 1:
+                    print('time budget exhausted without satisfying the '
+                          'criterion')
+                    break
+
+            sampling_started = time.perf_counter()
+            previous_samples, new_samples = merge(draw(iterations))
+            evaluation_started = time.perf_counter()
+            sampling_seconds += evaluation_started - sampling_started
+
+            iterations_left -= iterations
+            total_iterations += iterations
+
+            evaluated = new_samples if incremental else previous_samples
+            if retired:
+                evaluated = {name: value for name, value in evaluated.items()
+                             if name not in retired}
+            criterion_satisfied = criterion(evaluated, verbose)
+            evaluation_seconds = time.perf_counter() - evaluation_started
+
+            if iteration_function is not None:
+                iteration_function(previous_samples,
+                                   criterion_satisfied,
+                                   max_iterations - iterations_left)
+
+            if criterion_satisfied:
+                if chunks is not None and keep_surplus and iterations_left:
+                    iterations = min(iterations_left, chunk_size)
+                    previous_samples, _ = merge(draw(iterations))
+                    iterations_left -= iterations
+                    if iteration_function is not None:
+                        iteration_function(previous_samples,
+                                           criterion_satisfied,
+                                           max_iterations - iterations_left)
+                break
+            elif iterations_left <= 1:
+                print('maximum number of iterations reached without '
+                      'satisfying the criterion')
+                break
+
+            if retire_converged:
+                convergence = getattr(criterion, 'last_convergence', None)
+                retired.update(name for name, converged
+                               in (convergence or {}).items() if converged)
+
+            if adaptive:
+                seconds_per_iteration = \
+                    sampling_seconds / (max_iterations - iterations_left)
+                predicted = _predict_iterations_left(criterion,
+                                                     total_iterations)
+                size = chunk_size if predicted is None else 1.1 * predicted
+                if seconds_per_iteration > 0:
+                    size = max(size, 10 * evaluation_seconds
+                               / seconds_per_iteration)
+                size = min(size, max(chunk_size, total_iterations))
+                chunk_size = max(int(np.ceil(size / thin)) * thin, thin)
+    finally:
+        if chunks is not None:
+            chunks.close()
 
     return previous_samples
@@ -1,23 +1,183 @@
 # GPLv2+
 
 from __future__ import annotations
+import json
+import os
 import typing as tp
+import urllib.parse
 import numpy as np
 import h5py
 
 
-def _save_array(grp: "h5py.Group", name: str, arr: np.ndarray, compression: bool) -> None:
-    """Save ndarray or masked array into the HDF5 group."""
+# Target size of HDF5 chunks, which span consecutive iterations of a chain.
+_HDF5_CHUNK_BYTES = 1 << 16
+
+
+def _chunk_shape(shape: tp.Tuple[int, ...], itemsize: int) -> tp.Tuple[int, ...]:
+    """Chunk shape of samples with shape (dims..., iteration, chain)."""
+    dims = [max(d, 1) for d in shape[:-2]]
+    while int(np.prod(dims)) * itemsize > _HDF5_CHUNK_BYTES and max(dims) > 1:
+        i = int(np.argmax(dims))
+        dims[i] = -(-dims[i] // 2)
+    iterations = max(1, _HDF5_CHUNK_BYTES // (int(np.prod(dims)) * itemsize))
+    return tuple(dims) + (iterations, 1)
+
+
+_COMPRESSION_CODECS = ("gzip", "lzf")
+
+
+def _hdf5_filters(compression: tp.Union[bool, str, None] = True,
+                  compression_level: tp.Optional[int] = None,
+                  shuffle: bool = False,
+                  scaleoffset: tp.Optional[int] = None) -> tp.Dict[str, tp.Any]:
+    """Keyword arguments of h5py create_dataset selecting filters.
+
+    compression is a codec name, True for gzip or False for none.
+    scaleoffset is the number of decimal digits kept by the lossy scale-offset
+    filter, which applies only to floating point datasets.
+    """
+    if compression is True:
+        compression = "gzip"
+    elif compression is False:
+        compression = None
+    if compression is not None and compression not in _COMPRESSION_CODECS:
+        raise ValueError(f"Unsupported compression {compression!r}, expected "
+                         f"one of {_COMPRESSION_CODECS}")
+    if compression_level is not None:
+        if compression != "gzip":
+            raise ValueError("A compression level can only be set for gzip")
+        if not 0 <= compression_level <= 9:
+            raise ValueError(f"gzip compression level must be between 0 and "
+                             f"9, got {compression_level}")
+    if scaleoffset is not None and scaleoffset < 0:
+        raise ValueError(f"scaleoffset must be non-negative, got "
+                         f"{scaleoffset}")
+    return {"compression": compression,
+            "compression_opts": compression_level,
+            "shuffle": bool(shuffle),
+            "scaleoffset": scaleoffset}
+
+
+def _element_chunk_shape(shape: tp.Tuple[int, ...],
+                         itemsize: int) -> tp.Tuple[int, ...]:
+    """Chunk shape holding iterations of a single element of a chain."""
+    iterations = max(1, _HDF5_CHUNK_BYTES // itemsize)
+    return (1,) * (len(shape) - 2) + (iterations, 1)
+
+
+Chunks = tp.Union[None, str, tp.Dict[str, tp.Tuple[int, ...]]]
+
+
+def _dataset_chunks(name: str, shape: tp.Tuple[int, ...], itemsize: int,
+                    chunks: Chunks) -> tp.Tuple[int, ...]:
+    """Chunk shape of the samples of variable name."""
+    if chunks is None:
+        return _chunk_shape(shape, itemsize)
+    if chunks == "element":
+        return _element_chunk_shape(shape, itemsize)
+    if isinstance(chunks, str):
+        raise ValueError(f"Unsupported chunk layout {chunks!r}")
+    if name not in chunks:
+        return _chunk_shape(shape, itemsize)
+    chunk = tuple(int(c) for c in chunks[name])
+    if len(chunk) != len(shape) or min(chunk, default=1) < 1:
+        raise ValueError(f"Invalid chunk shape {chunk} for samples of {name} "
+                         f"with shape {shape}")
+    return chunk
+
+
+def _create_dataset(grp: "h5py.Group", name: str, arr: np.ndarray,
+                    filters: tp.Dict[str, tp.Any],
+                    chunks: tp.Tuple[int, ...]) -> "h5py.Dataset":
+    """Create a dataset that can grow along iteration and chain axes, or one
+    of fixed shape for arrays without them."""
+    filters = dict(filters)
+    if arr.dtype.kind != "f":
+        filters["scaleoffset"] = None
+    if arr.ndim < 2:
+        # Scalar datasets support no filters.
+        return grp.create_dataset(name, data=arr,
+                                  **(filters if arr.ndim else {}))
+    return grp.create_dataset(name, data=arr,
+                              maxshape=arr.shape[:-2] + (None, None),
+                              chunks=chunks, **filters)
+
+
+def _save_array(grp: "h5py.Group", name: str, arr: np.ndarray,
+                filters: tp.Dict[str, tp.Any], chunks: Chunks = None) -> None:
+    """Save ndarray or masked array into the HDF5 group.
+
+    Arrays without iteration and chain axes are saved as they are, in
+    datasets of fixed shape.
+    """
+    data = np.asarray(np.ma.getdata(arr))
+    chunk = None
+    if data.ndim >= 2:
+        chunk = _dataset_chunks(name, data.shape, data.dtype.itemsize, chunks)
     if np.ma.isMaskedArray(arr):
         sub = grp.create_group(name)
         sub.attrs["__masked__"] = True
-        sub.create_dataset("data", data=np.asarray(arr.data),
-                           compression=("gzip" if compression else None))
-        sub.create_dataset("mask", data=np.asarray(arr.mask, dtype=bool),
-                           compression=("gzip" if compression else None))
+        _create_dataset(sub, "data", data, filters, chunk)
+        _create_dataset(sub, "mask", np.ma.getmaskarray(arr), filters, chunk)
+    else:
+        _create_dataset(grp, name, data, filters, chunk)
+
+
+def _extend_dataset(ds: "h5py.Dataset", block: np.ndarray, axis: int) -> None:
+    """Write block after the end of dataset along axis."""
+    if ds.maxshape[axis] is not None:
+        raise ValueError(f"Dataset {ds.name} can't be extended, it was saved "
+                         f"by an older version of pyjags")
+    expected = list(ds.shape)
+    expected[axis] = block.shape[axis]
+    if list(block.shape) != expected:
+        raise ValueError(f"Samples with shape {block.shape} can't be appended "
+                         f"to {ds.name} with shape {ds.shape}")
+    start = ds.shape[axis]
+    shape = list(ds.shape)
+    shape[axis] += block.shape[axis]
+    ds.resize(shape)
+    index = [slice(None)] * ds.ndim
+    index[axis] = slice(start, None)
+    ds[tuple(index)] = block
+
+
+def _append_array(grp: "h5py.Group", name: str, arr: np.ndarray,
+                  axis: int, filters: tp.Dict[str, tp.Any],
+                  chunks: Chunks = None) -> None:
+    """Append ndarray or masked array to the one saved in the HDF5 group.
+
+    Filters and chunks apply to variables that aren't saved yet, saved ones
+    keep those they were created with.
+    """
+    if np.ndim(arr) < 2:
+        raise ValueError(f"Samples of {name} must have iteration and chain "
+                         f"axes, got shape {np.shape(arr)}")
+    if name not in grp:
+        _save_array(grp, name, arr, filters, chunks)
+        return
+    data = np.asarray(np.ma.getdata(arr))
+    obj = grp[name]
+    if not isinstance(obj, h5py.Group) and np.ma.is_masked(arr):
+        # First masked values, mark everything saved so far as present.
+        grp.move(name, name + ".data")
+        sub = grp.create_group(name)
+        sub.attrs["__masked__"] = True
+        grp.move(name + ".data", name + "/data")
+        existing = sub["data"]
+        sub.create_dataset("mask", shape=existing.shape, dtype=bool,
+                           maxshape=existing.maxshape,
+                           chunks=existing.chunks, fillvalue=False,
+                           compression=existing.compression,
+                           compression_opts=existing.compression_opts,
+                           shuffle=existing.shuffle)
+        obj = sub
+    if isinstance(obj, h5py.Group):
+        mask = np.broadcast_to(np.ma.getmaskarray(arr), data.shape)
+        _extend_dataset(obj["data"], data, axis)
+        _extend_dataset(obj["mask"], mask, axis)
     else:
-        grp.create_dataset(name, data=np.asarray(arr),
-                           compression=("gzip" if compression else None))
+        _extend_dataset(obj, data, axis)
 
 
 def _load_array(obj: "h5py.Group | h5py.Dataset") -> np.ndarray:
@@ -32,22 +192,545 @@ def _load_array(obj: "h5py.Group | h5py.Dataset") -> np.ndarray:
         raise TypeError(f"Unsupported HDF5 object type: {type(obj)!r}")
 
 
+Chains = tp.Union[None, int, slice, tp.Sequence[int]]
+
+
+def _chain_selection(chains: Chains, count: int) -> tp.Tuple[tp.Any, tp.Any]:
+    """Split a selection of chains into an HDF5 index and a NumPy index.
+
+    HDF5 reads lists of indices only in increasing order, so any other list is
+    read sorted without repetitions and rearranged afterwards.
+    """
+    if chains is None:
+        return slice(None), None
+    if isinstance(chains, slice):
+        return chains, None
+    if isinstance(chains, (int, np.integer)):
+        chains = [chains]
+    indices = np.asarray(chains, dtype=int)
+    if indices.ndim != 1:
+        raise ValueError(f"Chains must be an integer, a slice or a sequence "
+                         f"of integers, got {chains!r}")
+    if np.any((indices < -count) | (indices >= count)):
+        raise IndexError(f"Chains {list(indices)} out of range for "
+                         f"{count} chains")
+    indices = indices % count
+    unique, inverse = np.unique(indices, return_inverse=True)
+    if np.array_equal(unique, indices):
+        return list(unique), None
+    return list(unique), inverse
+
+
+class HDF5Samples:
+    """Samples of a variable read lazily from an HDF5 file.
+
+    Indexing reads only the selected elements, as with h5py datasets, and
+    returns a Numpy array, or a masked array for variables saved with masked
+    values. The samples are read completely when converted with np.asarray.
+    """
+
+    def __init__(self, obj: "h5py.Group | h5py.Dataset") -> None:
+        if isinstance(obj, h5py.Group) and obj.attrs.get("__masked__", False):
+            self._data = obj["data"]
+            self._mask = obj["mask"]
+        elif isinstance(obj, h5py.Dataset):
+            self._data = obj
+            self._mask = None
+        else:
+            raise TypeError(f"Unsupported HDF5 object type: {type(obj)!r}")
+
+    @property
+    def shape(self) -> tp.Tuple[int, ...]:
+        return self._data.shape
+
+    @property
+    def ndim(self) -> int:
+        return self._data.ndim
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._data.dtype
+
+    @property
+    def masked(self) -> bool:
+        return self._mask is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __getitem__(self, index) -> np.ndarray:
+        data = self._data[index]
+        if self._mask is None:
+            return data
+        return np.ma.MaskedArray(data=data,
+                                 mask=np.asarray(self._mask[index], dtype=bool))
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return np.asarray(self[()], dtype=dtype)
+
+    def __repr__(self) -> str:
+        return (f"<HDF5Samples {self._data.name!r} shape={self.shape} "
+                f"dtype={self.dtype}{' masked' if self.masked else ''}>")
+
+    def select(self,
+               iterations: tp.Optional[slice] = None,
+               chains: Chains = None,
+               thin: int = 1) -> np.ndarray:
+        """
+        Read a range of iterations of some chains.
+
+        Parameters
+        ----------
+        iterations: a slice of iterations, all iterations if None
+        chains: an index, a slice or a sequence of indices of chains, all
+                chains if None
+        thin: a stride applied on top of the step of iterations
+
+        Returns
+        -------
+        samples with shape (dims..., iteration, chain), the chain axis is
+        kept when chains is a single index
+        """
+        if self.ndim < 2:
+            raise ValueError(f"Samples of {self._data.name} must have "
+                             f"iteration and chain axes, got shape "
+                             f"{self.shape}")
+        if thin < 1:
+            raise ValueError(f"thin must be positive, got {thin}")
+        if iterations is None:
+            iterations = slice(None)
+        start, stop, step = iterations.indices(self.shape[-2])
+        if step < 1:
+            raise ValueError("Iterations can only be selected in increasing "
+                             "order")
+        stored, order = _chain_selection(chains, self.shape[-1])
+        out = self[..., slice(start, stop, step * thin), stored]
+        if order is not None:
+            out = out[..., order]
+        return out
+
+
+class HDF5SamplesDictionary(tp.Mapping[str, HDF5Samples]):
+    """Read-only mapping of variables of an HDF5 samples file.
+
+    Variables are HDF5Samples, read when indexed or selected. The file stays
+    open until close is called, or the end of a with block.
+    """
+
+    def __init__(self, filename: str,
+                 variable_names: tp.Optional[tp.Iterable[str]] = None) -> None:
+        self._file = h5py.File(filename, mode="r")
+        try:
+            if variable_names is None:
+                variable_names = list(self._file.keys())
+            self._variables = {}
+            for name in variable_names:
+                if name not in self._file:
+                    raise KeyError(f"Variable {name!r} is not saved in "
+                                   f"{filename}")
+                self._variables[name] = HDF5Samples(self._file[name])
+        except BaseException:
+            self._file.close()
+            raise
+
+    def __getitem__(self, name: str) -> HDF5Samples:
+        return self._variables[name]
+
+    def __iter__(self) -> tp.Iterator[str]:
+        return iter(self._variables)
+
+    def __len__(self) -> int:
+        return len(self._variables)
+
+    def select(self,
+               iterations: tp.Optional[slice] = None,
+               chains: Chains = None,
+               thin: int = 1) -> tp.Dict[str, np.ndarray]:
+        """Read a range of iterations of some chains of every variable, as
+        with HDF5Samples.select."""
+        return {name: samples.select(iterations, chains, thin)
+                for name, samples in self._variables.items()}
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "HDF5SamplesDictionary":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def open_samples_dictionary_from_file(
+    filename: str,
+    variable_names: tp.Optional[tp.Iterable[str]] = None,
+) -> HDF5SamplesDictionary:
+    """Open an HDF5 samples file for lazy reading.
+
+    Only variable_names are opened if given. Nothing is read until variables
+    are indexed or selected, so parts of files larger than memory can be
+    loaded.
+    """
+    return HDF5SamplesDictionary(filename, variable_names)
+
+
 def save_samples_dictionary_to_file(
     filename: str,
     samples: tp.Dict[str, np.ndarray],
-    compression: bool = True,
+    compression: tp.Union[bool, str] = True,
+    compression_level: tp.Optional[int] = None,
+    shuffle: bool = False,
+    scaleoffset: tp.Optional[int] = None,
+    chunks: Chunks = None,
 ) -> None:
-    """Save a dict[str, ndarray] to HDF5."""
+    """Save a dict[str, ndarray] to HDF5.
+
+    compression is "gzip" (or True), "lzf" or False, with compression_level
+    from 0 to 9 for gzip. shuffle adds the byte shuffle filter in front of
+    compression, which helps compressing floating point samples.
+    scaleoffset keeps only that many decimal digits of floating point
+    samples, which is lossy. chunks is None for chunks of about 64 KiB of
+    consecutive iterations of all elements of a variable, "element" for
+    chunks of a single element, which are fastest to read one parameter at a
+    time, or a dict of explicit chunk shapes of some variables.
+    """
+    filters = _hdf5_filters(compression, compression_level, shuffle,
+                            scaleoffset)
     with h5py.File(filename, mode="w") as h5:
         h5.attrs["__format__"] = "pyjags-jw:samples:1"
         for name, arr in samples.items():
-            _save_array(h5, name, arr, compression=compression)
+            _save_array(h5, name, arr, filters, chunks)
 
 
-def load_samples_dictionary_from_file(filename: str) -> tp.Dict[str, np.ndarray]:
-    """Load a dict[str, ndarray] from HDF5."""
-    out: dict[str, np.ndarray] = {}
+def append_samples_dictionary_to_file(
+    filename: str,
+    samples: tp.Dict[str, np.ndarray],
+    parallel: bool = False,
+    compression: tp.Union[bool, str] = True,
+    compression_level: tp.Optional[int] = None,
+    shuffle: bool = False,
+    scaleoffset: tp.Optional[int] = None,
+    chunks: Chunks = None,
+) -> None:
+    """Append a dict[str, ndarray] to HDF5 without rewriting saved samples.
+
+    Samples continue the saved chains, as with merge_consecutive_chains, or
+    with parallel are new chains of the same length, as with
+    merge_parallel_chains. Variables that aren't saved yet are added, and a
+    missing file is created. Datasets are resizable along iteration and chain
+    axes and chunked along the iteration axis. Compression and chunks, as
+    with save_samples_dictionary_to_file, apply to added variables.
+    """
+    filters = _hdf5_filters(compression, compression_level, shuffle,
+                            scaleoffset)
+    axis = -1 if parallel else -2
+    with h5py.File(filename, mode="a") as h5:
+        if "__format__" not in h5.attrs:
+            h5.attrs["__format__"] = "pyjags-jw:samples:1"
+        for name, arr in samples.items():
+            _append_array(h5, name, arr, axis, filters, chunks)
+
+
+def load_samples_dictionary_from_file(
+    filename: str,
+    variable_names: tp.Optional[tp.Iterable[str]] = None,
+    iterations: tp.Optional[slice] = None,
+    chains: Chains = None,
+    thin: int = 1,
+) -> tp.Dict[str, np.ndarray]:
+    """Load a dict[str, ndarray] from HDF5.
+
+    Only variable_names are loaded if given, and only the selected iterations
+    and chains, as with HDF5Samples.select, are read from disk.
+    """
+    if variable_names is None and iterations is None and chains is None \
+            and thin == 1:
+        out: dict[str, np.ndarray] = {}
+        with h5py.File(filename, mode="r") as h5:
+            for name, obj in h5.items():
+                out[name] = _load_array(obj)  # type: ignore[arg-type]
+        return out
+    with open_samples_dictionary_from_file(filename, variable_names) as h5:
+        return h5.select(iterations, chains, thin)
+
+
+_CHECKPOINT_FORMAT = "pyjags-jw:checkpoint:1"
+
+
+def _save_checkpoint(filename: str,
+                     parameters: tp.List[tp.Dict[str, tp.Any]],
+                     attrs: tp.Dict[str, tp.Any]) -> None:
+    """Save parameters of each chain and attributes of a model to HDF5.
+
+    Strings, such as names of random number generators, are saved as
+    attributes of the group of a chain, and arrays as its datasets.
+    """
+    with h5py.File(filename, mode="w") as h5:
+        h5.attrs["__format__"] = _CHECKPOINT_FORMAT
+        h5.attrs["chains"] = len(parameters)
+        for key, value in attrs.items():
+            h5.attrs[key] = value
+        for chain, values in enumerate(parameters, 1):
+            grp = h5.create_group(f"chain_{chain}")
+            for name, value in values.items():
+                if isinstance(value, str):
+                    grp.attrs[name] = value
+                elif np.ma.isMaskedArray(value):
+                    sub = grp.create_group(name)
+                    sub.attrs["__masked__"] = True
+                    sub.create_dataset("data", data=np.ma.getdata(value))
+                    sub.create_dataset("mask", data=np.ma.getmaskarray(value))
+                else:
+                    grp.create_dataset(name, data=np.asarray(value))
+
+
+def _load_checkpoint(filename: str) -> tp.Tuple[
+        tp.List[tp.Dict[str, tp.Any]], tp.Dict[str, tp.Any]]:
+    """Load parameters of each chain and attributes saved by _save_checkpoint."""
     with h5py.File(filename, mode="r") as h5:
-        for name, obj in h5.items():
-            out[name] = _load_array(obj)  # type: ignore[arg-type]
+        if h5.attrs.get("__format__") != _CHECKPOINT_FORMAT:
+            raise ValueError(f"Unsupported checkpoint format: "
+                             f"{h5.attrs.get('__format__')!r}")
+        attrs = {k: v for k, v in h5.attrs.items() if k != "__format__"}
+        parameters = []
+        for chain in range(1, int(attrs.pop("chains")) + 1):
+            grp = h5[f"chain_{chain}"]
+            values: tp.Dict[str, tp.Any] = dict(grp.attrs.items())
+            for name, obj in grp.items():
+                values[name] = _load_array(obj)
+            parameters.append(values)
+    return parameters, attrs
+
+
+# Directory of .npy files, one per variable, described by a JSON manifest.
+_NPY_FORMAT = "pyjags-jw:samples-npy:1"
+_NPY_MANIFEST = "manifest.json"
+# Digits reserved in .npy headers for the length of the growing axis.
+_NPY_GROWTH_DIGITS = 21
+# Size of blocks of iterations copied at a time by converters.
+_CONVERT_BLOCK_BYTES = 1 << 26
+
+
+def _npy_file_name(name: str) -> str:
+    """Escape a variable name for use as a file name on every platform."""
+    return urllib.parse.quote(name, safe="")
+
+
+def _npy_header(dtype: np.dtype, shape: tp.Tuple[int, ...]) -> bytes:
+    """Build a .npy 1.0 header for an array in fortran order.
+
+    The header is padded as if the last axis had the maximum number of
+    digits, so that it can be rewritten in place when the array grows.
+    """
+    def header_dict(shape):
+        return "{'descr': %r, 'fortran_order': True, 'shape': %r, }" % (
+            np.lib.format.dtype_to_descr(dtype), tuple(shape))
+
+    reserved = len(header_dict(shape[:-1] + (10 ** _NPY_GROWTH_DIGITS - 1,)))
+    preamble = len(np.lib.format.MAGIC_PREFIX) + 2 + 2
+    total = -(-(preamble + reserved + 1) // 64) * 64
+    header = header_dict(shape)
+    header = header + " " * (total - preamble - len(header) - 1) + "\n"
+    return (np.lib.format.MAGIC_PREFIX + bytes([1, 0])
+            + len(header).to_bytes(2, "little") + header.encode("latin1"))
+
+
+def _npy_append(path: str, block: np.ndarray, previous: int) -> None:
+    """Append block along its last axis to a .npy file in fortran order.
+
+    previous is the length of the last axis already stored in the file.
+    """
+    block = np.asfortranarray(block)
+    shape = block.shape[:-1] + (previous + block.shape[-1],)
+    header = _npy_header(block.dtype, shape)
+    mode = "r+b" if previous else "wb"
+    with open(path, mode) as fh:
+        fh.write(header)
+        fh.seek(0, 2)
+        # Transpose of an array in fortran order is in C order, whose
+        # elements are written in memory order.
+        block.T.tofile(fh)
+
+
+class NpySampleStore:
+    """Disk-backed samples dictionary growing along the iteration axis.
+
+    Every variable is kept in an uncompressed .npy file in fortran order with
+    chains before iterations, so that appending iterations only appends bytes
+    to the file. Masked values are kept in a separate boolean .npy file of the
+    same layout. Samples are read back through memory maps with the usual
+    (dims..., iteration, chain) shape.
+    """
+
+    def __init__(self, path: str, mode: str = "w") -> None:
+        """Open a store in directory path.
+
+        Mode "w" starts a new store, removing variables of an existing one,
+        and mode "a" continues appending to an existing store.
+        """
+        if mode not in ("w", "a"):
+            raise ValueError(f"Invalid mode: {mode!r}")
+        self.path = os.fspath(path)
+        self._variables: dict[str, dict] = {}
+        manifest = os.path.join(self.path, _NPY_MANIFEST)
+        if os.path.exists(manifest):
+            variables = _read_npy_manifest(self.path)
+            if mode == "a":
+                self._variables = variables
+            else:
+                for entry in variables.values():
+                    for key in ("data", "mask"):
+                        if entry.get(key):
+                            os.remove(os.path.join(self.path, entry[key]))
+                os.remove(manifest)
+        os.makedirs(self.path, exist_ok=True)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._variables
+
+    def append(self, samples: tp.Dict[str, np.ndarray]) -> None:
+        """Append samples with shape (dims..., iteration, chain)."""
+        for name, arr in samples.items():
+            self._append_array(name, arr)
+        self._write_manifest()
+
+    def _append_array(self, name: str, arr: np.ndarray) -> None:
+        data = np.asarray(np.ma.getdata(arr), dtype=np.double)
+        if data.ndim < 2:
+            raise ValueError(f"Samples of {name} must have iteration and "
+                             f"chain axes, got shape {data.shape}")
+        mask = np.ma.getmask(arr)
+        entry = self._variables.get(name)
+        if entry is None:
+            entry = {"data": _npy_file_name(name) + ".data.npy", "mask": None,
+                     "shape": list(data.shape[:-2]),
+                     "chains": data.shape[-1], "iterations": 0}
+        elif (list(data.shape[:-2]) != entry["shape"]
+              or data.shape[-1] != entry["chains"]):
+            raise ValueError(
+                f"Samples of {name} with shape {data.shape} can't be "
+                f"appended to samples of shape "
+                f"{tuple(entry['shape'])} with {entry['chains']} chains")
+        previous = entry["iterations"]
+
+        if mask is not np.ma.nomask and np.any(mask) and not entry["mask"]:
+            # First masked values, mark everything stored so far as present.
+            entry["mask"] = _npy_file_name(name) + ".mask.npy"
+            present = np.zeros(data.shape[:-2] + (data.shape[-1], previous),
+                               dtype=bool, order="F")
+            if previous:
+                _npy_append(os.path.join(self.path, entry["mask"]), present, 0)
+        if entry["mask"]:
+            block = np.broadcast_to(mask, data.shape)
+            _npy_append(os.path.join(self.path, entry["mask"]),
+                        np.swapaxes(block, -1, -2), previous)
+        _npy_append(os.path.join(self.path, entry["data"]),
+                    np.swapaxes(data, -1, -2), previous)
+
+        entry["iterations"] = previous + data.shape[-2]
+        self._variables[name] = entry
+
+    def _write_manifest(self) -> None:
+        manifest = {"__format__": _NPY_FORMAT, "variables": self._variables}
+        tmp = os.path.join(self.path, _NPY_MANIFEST + ".tmp")
+        with open(tmp, "w") as fh:
+            json.dump(manifest, fh, indent=1)
+        os.replace(tmp, os.path.join(self.path, _NPY_MANIFEST))
+
+    def load(self, mmap_mode: tp.Optional[str] = "r") -> tp.Dict[str, np.ndarray]:
+        """Return stored samples, memory mapped unless mmap_mode is None."""
+        return load_samples_dictionary_from_directory(self.path, mmap_mode)
+
+
+def _read_npy_manifest(path: str) -> tp.Dict[str, dict]:
+    with open(os.path.join(path, _NPY_MANIFEST)) as fh:
+        manifest = json.load(fh)
+    if manifest.get("__format__") != _NPY_FORMAT:
+        raise ValueError(f"Unsupported sample directory format: "
+                         f"{manifest.get('__format__')!r}")
+    return manifest["variables"]
+
+
+def load_samples_dictionary_from_directory(
+    path: str,
+    mmap_mode: tp.Optional[str] = "r",
+) -> tp.Dict[str, np.ndarray]:
+    """Load a dict[str, ndarray] from a directory of .npy files.
+
+    Arrays are memory mapped unless mmap_mode is None.
+    """
+    out: dict[str, np.ndarray] = {}
+    for name, entry in _read_npy_manifest(path).items():
+        data = np.load(os.path.join(path, entry["data"]), mmap_mode=mmap_mode)
+        data = np.swapaxes(data, -1, -2)
+        if entry.get("mask"):
+            mask = np.load(os.path.join(path, entry["mask"]),
+                           mmap_mode=mmap_mode)
+            data = np.ma.MaskedArray(data=data,
+                                     mask=np.swapaxes(mask, -1, -2))
+        out[name] = data
     return out
+
+
+def save_samples_dictionary_to_directory(
+    path: str,
+    samples: tp.Dict[str, np.ndarray],
+) -> None:
+    """Save a dict[str, ndarray] to a directory of .npy files.
+
+    Samples are saved as double precision, with a separate mask file for
+    variables with masked values, and can be memory mapped by
+    load_samples_dictionary_from_directory. Variables of a previous directory
+    at path are removed.
+    """
+    NpySampleStore(path, mode="w").append(samples)
+
+
+def _iteration_blocks(samples: tp.Any) -> tp.Iterator[np.ndarray]:
+    """Read samples in blocks of consecutive iterations of all chains."""
+    shape = samples.shape
+    if len(shape) < 2:
+        raise ValueError(f"Samples must have iteration and chain axes, got "
+                         f"shape {shape}")
+    per_iteration = int(np.prod(shape[:-2] + shape[-1:])) \
+        * np.dtype(samples.dtype).itemsize
+    step = max(1, _CONVERT_BLOCK_BYTES // max(per_iteration, 1))
+    for start in range(0, max(shape[-2], 1), step):
+        yield samples[..., start:start + step, :]
+
+
+def convert_samples_file_to_directory(filename: str, path: str) -> None:
+    """Convert an HDF5 samples file to a directory of .npy files.
+
+    Samples are copied in blocks of iterations, so files larger than memory
+    can be converted.
+    """
+    store = NpySampleStore(path, mode="w")
+    with open_samples_dictionary_from_file(filename) as samples:
+        for name, variable in samples.items():
+            for block in _iteration_blocks(variable):
+                store.append({name: block})
+
+
+def convert_samples_directory_to_file(
+    path: str,
+    filename: str,
+    compression: tp.Union[bool, str] = True,
+    compression_level: tp.Optional[int] = None,
+    shuffle: bool = False,
+    scaleoffset: tp.Optional[int] = None,
+    chunks: Chunks = None,
+) -> None:
+    """Convert a directory of .npy files to an HDF5 samples file.
+
+    Samples are copied from memory maps in blocks of iterations, and saved
+    with compression and chunks as with save_samples_dictionary_to_file.
+    """
+    filters = _hdf5_filters(compression, compression_level, shuffle,
+                            scaleoffset)
+    samples = load_samples_dictionary_from_directory(path)
+    with h5py.File(filename, mode="w") as h5:
+        h5.attrs["__format__"] = "pyjags-jw:samples:1"
+        for name, variable in samples.items():
+            for block in _iteration_blocks(variable):
+                _append_array(h5, name, block, -2, filters, chunks)
@@ -10,17 +10,26 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 # GNU General Public License for more details.
 
-__all__ = ['Model']
+__all__ = ['Model', 'DataBundle', 'data_bundle']
 
 import collections
+import collections.abc
 import contextlib
 import numpy as np
 import sys
 import tempfile
 
-from .console import Console, DUMP_ALL, DUMP_DATA, DUMP_PARAMETERS
+from .accumulators import (BatchMeansAccumulator, CovarianceAccumulator,
+                           MomentsAccumulator, QuantileAccumulator)
+from .console import (Console, DataBundle, DUMP_ALL, DUMP_DATA,
+                      DUMP_PARAMETERS)
+from .io import NpySampleStore, _load_checkpoint, _save_checkpoint
 from .modules import load_module
 from .progressbar import const_time_partition, progress_bar_factory
+from .workers import WorkerPool
+
+# DataBundle provides the read-only mapping protocol.
+collections.abc.Mapping.register(DataBundle)
 
 # Special value indicating missing data in JAGS.
 JAGS_NA = -sys.float_info.max*(1-1e-15)
@@ -32,16 +41,19 @@ def dict_to_jags(src):
 
      * Returned arrays have at least one dimension.
      * Empty arrays are removed from the dictionary.
-     * Masked values are replaced with JAGS_NA.
+     * Arrays with masked values are kept as masked arrays, whose masked
+       values are replaced with JAGS_NA while copying them into JAGS.
+
+    Arrays are not copied here. Numeric arrays of any type and memory order,
+    including memory maps and masked arrays, are copied once, directly into
+    JAGS arrays.
     """
     dst = {}
     for k, v in src.items():
         if np.ma.is_masked(v):
-            v = np.ma.array(data=v, dtype=np.double, ndmin=1,
-                            fill_value=JAGS_NA)
-            v = np.ma.filled(v)
+            v = np.ma.atleast_1d(v)
         else:
-            v = np.atleast_1d(v)
+            v = np.atleast_1d(np.ma.getdata(v))
         if not np.size(v):
             continue
         dst[k] = v
@@ -53,9 +65,15 @@ def dict_from_jags(src):
     format suitable for use with Python.
 
      * Arrays containing JAGS_NA values are converted to numpy MaskedArray.
+
+    Consoles already return masked arrays for values containing JAGS_NA,
+    found while copying them, which are kept as they are.
     """
     dst = {}
     for k, v in src.items():
+        if np.ma.isMaskedArray(v):
+            dst[k] = v
+            continue
         mask = v == JAGS_NA
         # Don't mask if it not necessary
         if np.any(mask):
@@ -64,6 +82,34 @@ def dict_from_jags(src):
     return dst
 
 
+def data_bundle(data):
+    """Convert data to JAGS format once, for use in several models.
+
+    Returns an immutable DataBundle, which can be passed as data to Model.
+    Consoles of all those models are compiled from the same converted arrays,
+    without converting or copying them again. They are copied for each
+    console only when the model has a data block and is compiled with
+    generate_data, since JAGS writes values generated by the data block into
+    them.
+    """
+    return DataBundle(dict_to_jags(data))
+
+
+def thinning_of(thin, name):
+    """Return thinning interval of variable given one for all of them or a
+    mapping of variable names to intervals, where the default is 1."""
+    if isinstance(thin, collections.abc.Mapping):
+        return thin.get(name, 1)
+    return thin
+
+
+def _element_name(name, index, shape):
+    """BUGS name of an element given its reversed zero-based index."""
+    if shape == (1,):
+        return name
+    return '{}[{}]'.format(name, ','.join(str(i + 1) for i in index[::-1]))
+
+
 def check_locale_compatibility():
     """Checks that current locale is compatible with JAGS."""
     import locale
@@ -98,7 +144,8 @@ def model_path(file=None, code=None, encoding='utf-8'):
 
 class MultiConsole:
 
-    def __init__(self, chains, chains_per_thread):
+    def __init__(self, chains, chains_per_thread, console_factory=Console,
+                 threads=None, affinity=None):
         # Multiple consoles that emulate a single JAGS console.
         self.consoles = []
         self.chains_per_console = []
@@ -108,7 +155,7 @@ class MultiConsole:
 
         outer_chain = 1
         while chains > 0:
-            console = Console()
+            console = console_factory()
             console_chains = min(chains_per_thread, chains)
 
             self.consoles.append(console)
@@ -120,14 +167,26 @@ class MultiConsole:
 
             chains -= chains_per_thread
 
+        # Long-lived threads calling consoles concurrently. Each console is
+        # always called from the same thread.
+        self.pool = WorkerPool(min(threads or len(self.consoles),
+                                   len(self.consoles)), affinity)
+
+    def for_each(self, f):
+        # Calls f(console, chains) for each console concurrently. Console
+        # methods release the GIL while JAGS is working.
+        fs = [self.pool.submit(i, f, console, chains)
+              for i, (console, chains) in enumerate(
+                  zip(self.consoles, self.chains_per_console))]
+        return [f.result() for f in fs]
+
     def checkModel(self, path):
-        for c in self.consoles:
-            c.checkModel(path)
+        self.for_each(lambda console, chains: console.checkModel(path))
 
     def compile(self, data, chains, generate_data):
         assert(chains == len(self.chains))
-        for console, chains in zip(self.consoles, self.chains_per_console):
-            console.compile(data, chains, generate_data)
+        self.for_each(
+            lambda console, chains: console.compile(data, chains, generate_data))
 
     def setRNGname(self, name, chain):
         console, chain = self.chains[chain]
@@ -149,14 +208,52 @@ class MultiConsole:
         for c in self.consoles:
             c.clearMonitor(name, type)
 
-    def dumpMonitors(self, type, flat):
-        ds = [c.dumpMonitors(type, flat) for c in self.consoles]
-        return {k: np.concatenate([d[k] for d in ds], axis=-1)
-                for k in set(k for d in ds for k in d.keys())}
+    def dumpMonitors(self, type, flat, out=None):
+        return self._gather_monitors(
+            lambda console, out: console.dumpMonitors(type, flat, out), out)
+
+    def drainMonitors(self, type, flat, out=None):
+        return self._gather_monitors(
+            lambda console, out: console.drainMonitors(type, flat, out), out)
+
+    def _gather_monitors(self, dump, out):
+        # Copy samples into the result one console at a time, so that at most
+        # a single console dump is alive next to the result. Consoles write
+        # directly into views of output arrays over their chains.
+        out = out or {}
+        result = {}
+        # Monitors with missing values in any console, masked once gathered.
+        masked = set()
+        pooled = collections.defaultdict(list)
+        first_chain = 0
+        for console, chains in zip(self.consoles, self.chains_per_console):
+            last_chain = first_chain + chains
+            console_out = {k: v[..., first_chain:last_chain] if np.ndim(v) else v
+                           for k, v in out.items()}
+            for k, v in dump(console, console_out).items():
+                if np.ma.isMaskedArray(v):
+                    masked.add(k)
+                    v = v.data
+                if not v.ndim or v.shape[-1] != chains:
+                    # Monitor pools chains together.
+                    pooled[k].append(v)
+                    continue
+                if k in console_out:
+                    result[k] = out[k]
+                    continue
+                if k not in result:
+                    shape = v.shape[:-1] + (len(self.chains),)
+                    result[k] = np.empty(shape, dtype=v.dtype, order='F')
+                result[k][..., first_chain:last_chain] = v
+            first_chain = last_chain
+        for k, vs in pooled.items():
+            result[k] = np.concatenate(vs, axis=-1)
+        for k in masked:
+            result[k] = np.ma.masked_equal(result[k], JAGS_NA, copy=False)
+        return result
 
     def initialize(self):
-        for c in self.consoles:
-            c.initialize()
+        self.for_each(lambda console, chains: console.initialize())
 
     def isAdapting(self):
         return any(c.isAdapting() for c in self.consoles)
@@ -164,6 +261,14 @@ class MultiConsole:
     def checkAdaptation(self):
         return any(c.checkAdaptation() for c in self.consoles)
 
+    def adaptOff(self):
+        for c in self.consoles:
+            if c.isAdapting():
+                c.adaptOff()
+
+    def iter(self):
+        return self.consoles[0].iter()
+
     def variableNames(self):
         return self.consoles[0].variableNames()
 
@@ -172,6 +277,41 @@ class MultiConsole:
         return console.dumpState(type, chain)
 
 
+class ForkMultiConsole(MultiConsole):
+    """MultiConsole whose consoles are worker processes forked from the
+    current process once the model is compiled, so that the model is compiled
+    only once and the compiled model and data are shared copy on write."""
+
+    def __init__(self, chains, chains_per_process, affinity=None):
+        if chains % chains_per_process:
+            raise ValueError(
+                'Number of chains should be a multiple of chains_per_thread '
+                'with the fork backend.')
+        self._chains = chains
+        self._chains_per_process = chains_per_process
+        self._affinity = affinity
+        # Compiled in the current process, then forked into workers.
+        self._template = Console()
+
+    def checkModel(self, path):
+        self._template.checkModel(path)
+
+    def compile(self, data, chains, generate_data):
+        from .process_console import ProcessConsole
+        assert(chains == self._chains)
+        self._template.compile(data, self._chains_per_process, generate_data)
+        MultiConsole.__init__(
+            self, chains, self._chains_per_process,
+            lambda: ProcessConsole.fork(self._template),
+            affinity=self._affinity)
+        self._template = None
+
+    def variableNames(self):
+        if self._template is not None:
+            return self._template.variableNames()
+        return super().variableNames()
+
+
 class Model:
     """High level representation of JAGS model.
 
@@ -211,7 +351,8 @@ class Model:
     def __init__(self, code=None, data=None, init=None, chains=4, adapt=1000,
                  file=None, encoding='utf-8', generate_data=True,
                  progress_bar=True, refresh_seconds=None,
-                 threads=1, chains_per_thread=1):
+                 threads=1, chains_per_thread=1, backend='thread',
+                 affinity=None):
         """
         Create a JAGS model and run adaptation steps.
 
@@ -244,6 +385,9 @@ class Model:
 
             The numpy.ma.MaskedArray can be used to provide data where some of
             observations are missing.
+
+            A DataBundle returned by data_bundle can be used instead, to share
+            data converted once between several models.
         generate_data : bool, optional
             If true, data block in the model is used to generate data.
         chains : int, 4 by default
@@ -260,6 +404,27 @@ class Model:
         chains_per_thread: int, 1 by default
             A positive integer specifying a maximum number of chains sampled in
             a single thread. Takes effect only when using more than one thread.
+        backend: str, 'thread' by default
+            Either 'thread' to run all consoles in the current process,
+            'process' to run each console in a separate worker process with
+            its own JAGS runtime, or 'fork', only on Linux, to compile the
+            model once in the current process and fork a worker process for
+            each chains_per_thread chains, driven by a thread each. Worker
+            processes load modules loaded in the current process at the time
+            of model creation. Forked workers share the compiled model and
+            data with the current process copy on write, and the number of
+            chains should be a multiple of chains_per_thread. Forking is
+            only safe while no other threads run in the current process,
+            such as those driving consoles of other models with the thread
+            or fork backend, and a RuntimeWarning is issued otherwise; use
+            'process' then. Each forked worker closes the connections to
+            other workers it inherits, so that it exits when the current
+            process does.
+        affinity: bool or sequence, optional
+            Pins threads driving the consoles to CPUs, on platforms supporting
+            it. True pins each thread to a single CPU in turn, while a sequence
+            provides a CPU number or a set of CPU numbers for each of threads.
+            Takes effect only when using more than one thread.
         """
 
         check_locale_compatibility()
@@ -273,12 +438,32 @@ class Model:
         self.progress_bar = progress_bar_factory(progress_bar, refresh_seconds=self.refresh_seconds)
         self.chains = chains
         self.threads = threads
+        # Iterations performed before the model was restored from a checkpoint.
+        self._iteration_offset = 0
         self.use_threads = self.threads > 1 and chains_per_thread < self.chains
 
-        if self.use_threads:
-            self.console = MultiConsole(self.chains, chains_per_thread)
+        if backend == 'thread':
+            console_factory = Console
+        elif backend == 'process':
+            from .process_console import ProcessConsole
+            console_factory = ProcessConsole
+        elif backend == 'fork':
+            if not sys.platform.startswith('linux'):
+                raise ValueError('The fork backend is only supported on Linux.')
+            console_factory = Console
+            self.use_threads = chains_per_thread < self.chains
         else:
-            self.console = Console()
+            raise ValueError('Unknown backend: {}'.format(backend))
+
+        if backend == 'fork' and self.use_threads:
+            self.console = ForkMultiConsole(self.chains, chains_per_thread,
+                                            affinity)
+        elif self.use_threads:
+            self.console = MultiConsole(self.chains, chains_per_thread,
+                                        console_factory, self.threads,
+                                        affinity)
+        else:
+            self.console = console_factory()
 
         with model_path(file, code, encoding) as path:
             self.console.checkModel(path)
@@ -292,7 +477,14 @@ class Model:
     def _init_compile(self, data, generate_data):
         if data is None:
             data = {}
-        data = dict_to_jags(data)
+        if not isinstance(data, DataBundle):
+            if isinstance(self.console, MultiConsole):
+                # Converted once, shared by all consoles.
+                data = data_bundle(data)
+            else:
+                # A single console converts data while compiling, without
+                # keeping another converted copy in a bundle.
+                data = dict_to_jags(data)
         unused = set(data.keys()) - set(self.variables)
         if unused:
             raise ValueError(
@@ -336,13 +528,14 @@ class Model:
             self.console.setParameters(data, chain)
 
     def _update(self, iterations, header):
+        with self.progress_bar(self.chains * iterations, header=header) as pb:
+            self._update_with_progress(pb, iterations)
+
+    def _update_with_progress(self, progress, iterations):
         if self.use_threads:
-            method = self._update_parallel
+            self._update_parallel(progress, iterations)
         else:
-            method = self._update_sequential
-
-        with self.progress_bar(self.chains * iterations, header=header) as pb:
-            method(pb, iterations)
+            self._update_sequential(progress, iterations)
 
     def _update_sequential(self, progress, iterations):
         for steps in const_time_partition(iterations, self.refresh_seconds):
@@ -350,38 +543,30 @@ class Model:
             progress.update(self.chains * steps)
 
     def _update_parallel(self, progress, iterations):
-        from concurrent.futures import ALL_COMPLETED, ThreadPoolExecutor, wait
         from threading import Event
 
-        with ThreadPoolExecutor(self.threads) as executor:
-            # Event used to interrupt inner threads (which are
-            # non-interruptable by default).
-            interrupt = Event()
-
-            def update(console, chains):
-                for steps in const_time_partition(iterations, self.refresh_seconds):
-                    if interrupt.is_set():
-                        break
-                    console.update(steps)
-                    progress.update(chains * steps)
-            fs = [executor.submit(update, console, chains)
-                  for console, chains in zip(self.console.consoles,
-                                             self.console.chains_per_console)]
-            try:
-                (done, not_done) = wait(fs, return_when=ALL_COMPLETED)
-                for d in done:
-                    d.result()
-                for d in not_done:
-                    assert(False)
-            except KeyboardInterrupt:
-                interrupt.set()
-                raise
+        # Event used to interrupt inner threads (which are
+        # non-interruptable by default).
+        interrupt = Event()
+
+        def update(console, chains):
+            for steps in const_time_partition(iterations, self.refresh_seconds):
+                if interrupt.is_set():
+                    break
+                console.update(steps)
+                progress.update(chains * steps)
+        try:
+            self.console.for_each(update)
+        except KeyboardInterrupt:
+            interrupt.set()
+            raise
 
     def update(self, iterations):
         """Updates the model for given number of iterations."""
         self._update(iterations, 'updating: ')
 
-    def sample(self, iterations, vars=None, thin=1, monitor_type="trace"):
+    def sample(self, iterations, vars=None, thin=1, monitor_type="trace",
+               out=None, store=None, chunk=1000):
         """
         Creates monitors for given variables, runs the model for provided
         number of iterations and returns monitored samples.
@@ -392,32 +577,241 @@ class Model:
         iterations : int
             A positive integer specifying number of iterations.
         vars : list of str, optional
-            A list of variables to monitor.
-        thin : int, optional
-            A positive integer specifying thinning interval.
+            A list of variables to monitor. A variable may be a range of
+            elements of a node array in BUGS notation, e.g. 'theta[1:100,3]',
+            with an index or an inclusive range of indices in every dimension,
+            so that only those elements are traced. Samples are returned under
+            the same name, with dimensions of single indices dropped, e.g.
+            with shape (100, iterations, chains).
+        thin : int or dict, optional
+            A positive integer specifying thinning interval, or a dictionary
+            mapping variable names to thinning intervals, which are 1 for
+            variables left out.
+        out : dict, optional
+            A dictionary mapping names of monitored variables to numpy arrays,
+            e.g. numpy.memmap, into which their samples are written instead of
+            newly allocated arrays. Arrays must have the shape of returned
+            samples. Writing is fastest for arrays of doubles in fortran order.
+        store : str or NpySampleStore, optional
+            A directory, or a store opened with pyjags.io.NpySampleStore, to
+            which samples are appended on disk as they are drawn, instead of
+            being kept in memory. A directory is started anew, while samples
+            are appended to the existing contents of a store.
+        chunk : int, 1000 by default
+            A number of iterations kept in memory at a time when using store.
         Returns
         -------
         dict
             Sampled values of monitored variables as a dictionary where keys
             are variable names and values are numpy arrays with shape:
             (dim_1, dim_n, iterations, chains). dim_1, ..., dim_n describe the
-            shape of variable in JAGS model.
+            shape of variable in JAGS model. Variables given in out refer to
+            provided arrays, or masked array views of them. With store, values
+            are read-only memory maps of all samples kept in the store.
         """
         if vars is None:
             vars = self.variables
+        if store is not None:
+            if out is not None:
+                raise ValueError('Only one of out and store may be given.')
+            if not isinstance(store, NpySampleStore):
+                store = NpySampleStore(store)
+            for samples in self.sample_iter(iterations, chunk, vars, thin,
+                                            monitor_type):
+                store.append(samples)
+            return store.load()
+        if out is not None:
+            unmonitored = set(out) - set(vars)
+            if unmonitored:
+                raise ValueError(
+                    'Output arrays for variables that are not monitored: '
+                    '{}'.format(','.join(sorted(unmonitored))))
         monitored = []
         try:
             for name in vars:
-                self.console.setMonitor(name, thin, monitor_type)
+                self.console.setMonitor(name, thinning_of(thin, name),
+                                        monitor_type)
                 monitored.append(name)
             self._update(iterations, 'sampling: ')
-            samples = self.console.dumpMonitors(monitor_type, False)
-            samples = dict_from_jags(samples)
+            samples = self.console.dumpMonitors(monitor_type, False, out)
         finally:
             for name in monitored:
                 self.console.clearMonitor(name, monitor_type)
         return samples
 
+    def sample_iter(self, iterations, chunk, vars=None, thin=1,
+                    monitor_type="trace"):
+        """
+        Creates monitors for given variables and runs the model for provided
+        number of iterations, yielding monitored samples in chunks.
+
+        After each chunk of iterations the monitors are dumped and reset, so
+        that memory used by monitors is bounded by the size of a chunk rather
+        than by the total number of iterations. Concatenating the yielded
+        samples along the iteration axis gives the same result as a single
+        call to sample.
+
+        Parameters
+        ----------
+        iterations : int
+            A positive integer specifying total number of iterations.
+        chunk : int
+            A positive integer specifying number of iterations per chunk.
+            It is rounded up to a multiple of thinning intervals. The last
+            chunk may be shorter.
+        vars : list of str, optional
+            A list of variables, or ranges of their elements, to monitor as
+            in sample.
+        thin : int or dict, optional
+            A positive integer specifying thinning interval, or a dictionary
+            of thinning intervals of variables as in sample.
+
+        Yields
+        ------
+        dict
+            Sampled values of monitored variables in the same format as
+            returned by sample, with iterations limited to the chunk.
+        """
+        if chunk < 1:
+            raise ValueError('Chunk size should be a positive integer.')
+        if vars is None:
+            vars = self.variables
+        # Keep the thinning phase of recreated monitors aligned.
+        step = int(np.lcm.reduce([thinning_of(thin, name) for name in vars]
+                                 or [1]))
+        chunk = -(-chunk // step) * step
+        monitored = []
+        try:
+            for name in vars:
+                self.console.setMonitor(name, thinning_of(thin, name),
+                                        monitor_type)
+                monitored.append(name)
+            with self.progress_bar(self.chains * iterations,
+                                   header='sampling: ') as pb:
+                for start in range(0, iterations, chunk):
+                    self._update_with_progress(
+                        pb, min(chunk, iterations - start))
+                    yield self.console.drainMonitors(monitor_type, False)
+        finally:
+            for name in monitored:
+                self.console.clearMonitor(name, monitor_type)
+
+    def summarize(self, iterations, vars=None,
+                  stats=('mean', 'sd', 'quantiles'),
+                  quantiles=(0.025, 0.25, 0.5, 0.75, 0.975), cov=None,
+                  chunk=1000, thin=1, k=200, max_batches=64):
+        """
+        Runs the model for provided number of iterations and returns summary
+        statistics of monitored variables, without keeping their samples.
+
+        Samples are drawn in chunks as with sample_iter and fed into running
+        accumulators of pyjags.accumulators, which pool all chains. Memory is
+        bounded by the size of a chunk and the state of the accumulators,
+        whatever the number of iterations.
+
+        Parameters
+        ----------
+        iterations : int
+            A positive integer specifying number of iterations.
+        vars : list of str, optional
+            A list of variables, or ranges of their elements, to monitor as
+            in sample.
+        stats : list of str, optional
+            Statistics to compute for every variable, among 'mean', 'var',
+            'sd', 'quantiles', 'rhat' and 'ess'. Means and variances are
+            exact. Quantiles are approximated by a mergeable sketch whose rank
+            error decreases proportionally to 1/k. R-hat and effective sample
+            size are batch means estimates as in
+            BatchMeansAccumulator, with at most max_batches batches.
+        quantiles : list of float, optional
+            Probabilities of quantiles, between 0 and 1.
+        cov : list of str, optional
+            Variables, typically scalar, whose elements' joint covariance
+            matrix is computed.
+        chunk : int, 1000 by default
+            A number of iterations kept in memory at a time.
+        thin : int or dict, optional
+            A positive integer specifying thinning interval, or a dictionary
+            of thinning intervals of variables as in sample. Variables in cov
+            must have the same thinning interval.
+
+        Returns
+        -------
+        dict
+            A dictionary mapping names of variables to dictionaries mapping
+            names of statistics to arrays of the shape of the variable in the
+            JAGS model, with an extra trailing axis of quantiles for
+            'quantiles'. Elements with missing values have NaN statistics.
+            With cov, the key '.cov' maps to a dictionary with the 'names' of
+            covariance elements in BUGS notation, e.g. 'beta[2]', their
+            'mean' vector and 'cov' matrix.
+        """
+        if iterations < 1:
+            raise ValueError('Number of iterations should be a positive '
+                             'integer.')
+        stats = list(stats)
+        unknown = set(stats) - {'mean', 'var', 'sd', 'quantiles', 'rhat',
+                                'ess'}
+        if unknown:
+            raise ValueError('Unknown statistics: {}'.format(
+                ', '.join(sorted(unknown))))
+        if vars is None:
+            vars = self.variables
+        cov = list(cov or [])
+        if len({thinning_of(thin, name) for name in cov}) > 1:
+            raise ValueError('Variables in cov must have the same thinning '
+                             'interval.')
+        monitored = list(vars) + [name for name in cov if name not in vars]
+
+        moments = {name: MomentsAccumulator() for name in vars}
+        sketches = {name: QuantileAccumulator(k) for name in vars}
+        batches = {name: BatchMeansAccumulator(max_batches) for name in vars}
+        covariance = CovarianceAccumulator()
+        with_moments = bool({'mean', 'var', 'sd'} & set(stats))
+        with_batches = bool({'rhat', 'ess'} & set(stats))
+        shapes = {}
+        for samples in self.sample_iter(iterations, chunk, monitored, thin):
+            for name in vars:
+                if with_moments:
+                    moments[name].update(samples[name])
+                if 'quantiles' in stats:
+                    sketches[name].update(samples[name])
+                if with_batches:
+                    batches[name].update(samples[name])
+            if cov:
+                shapes = {name: samples[name].shape[:-2] for name in cov}
+                # Missing values are NaN, as concatenating drops masks.
+                covariance.update(np.concatenate(
+                    [np.ma.filled(samples[name], np.nan).reshape(
+                        (-1,) + samples[name].shape[-2:], order='F')
+                     for name in cov]))
+
+        summary = {}
+        for name in vars:
+            summary[name] = result = {}
+            for stat in stats:
+                if stat == 'mean':
+                    result[stat] = moments[name].mean()
+                elif stat == 'var':
+                    result[stat] = moments[name].var()
+                elif stat == 'sd':
+                    result[stat] = np.sqrt(moments[name].var())
+                elif stat == 'quantiles':
+                    result[stat] = sketches[name].quantile(quantiles)
+                elif stat == 'rhat':
+                    result[stat] = batches[name].rhat()
+                else:
+                    result[stat] = batches[name].ess()
+        if cov:
+            summary['.cov'] = {
+                'names': [_element_name(name, index, shapes[name])
+                          for name in cov
+                          for index in np.ndindex(*shapes[name][::-1])],
+                'mean': covariance.mean(),
+                'cov': covariance.cov(),
+            }
+        return summary
+
     def adapt(self, iterations):
         """Run adaptation steps to maximize samplers efficiency.
 
@@ -432,6 +826,63 @@ class Model:
         self._update(iterations, 'adapting: ')
         return self.console.checkAdaptation()
 
+    def checkpoint(self, path):
+        """Save the state of all chains to an HDF5 file, from which sampling
+        can be resumed with Model.restore.
+
+        Saves values of parameters of each chain, including names and states
+        of random number generators, the iteration number and whether the
+        model is still adapting. Data and monitors are not saved.
+        """
+        _save_checkpoint(path, self.parameters,
+                         {'iteration': self.iteration,
+                          'adapting': bool(self.console.isAdapting())})
+
+    @classmethod
+    def restore(cls, path, code=None, data=None, file=None, **kwargs):
+        """
+        Create a model continuing the chains saved by Model.checkpoint,
+        without adaptation or burn-in.
+
+        Parameters
+        ----------
+        path : str
+            Path to the checkpoint file.
+        code, data, file :
+            The code and data of the model that was checkpointed, as passed
+            to the Model constructor.
+        kwargs :
+            Other arguments of the Model constructor, except init, chains and
+            adapt, which are given by the checkpoint.
+
+        Note
+        ----
+        JAGS doesn't expose the state of adaptive samplers, such as step sizes
+        tuned during adaptation. If the checkpointed model was no longer
+        adapting, adaptation is turned off and those samplers continue from
+        their initial tuning. Chains updated only by non-adaptive samplers,
+        e.g. conjugate Gibbs samplers, continue exactly as they would have in
+        the checkpointed model.
+        """
+        for key in ('init', 'chains', 'adapt'):
+            if key in kwargs:
+                raise TypeError(
+                    '{} is given by the checkpoint and cannot be passed to '
+                    'restore'.format(key))
+        parameters, attrs = _load_checkpoint(path)
+        model = cls(code=code, data=data, file=file, init=parameters,
+                    chains=len(parameters), adapt=0, **kwargs)
+        model._iteration_offset = int(attrs['iteration'])
+        if not attrs['adapting'] and model.console.isAdapting():
+            model.console.adaptOff()
+        return model
+
+    @property
+    def iteration(self):
+        """Number of iterations performed, including adaptation and those
+        before the model was restored from a checkpoint."""
+        return self._iteration_offset + self.console.iter()
+
     @property
     def variables(self):
         """Variable names used in the model."""
@@ -446,7 +897,7 @@ class Model:
         parameters
         data
         """
-        return [dict_from_jags(self.console.dumpState(DUMP_ALL, chain))
+        return [self.console.dumpState(DUMP_ALL, chain)
                 for chain in range(1, self.chains + 1)]
 
     @property
@@ -454,7 +905,7 @@ class Model:
         """Values of model parameters for each chain. Includes name of random
         number generator as '.RNG.name' and its state as '.RNG.state'.
         """
-        return [dict_from_jags(self.console.dumpState(DUMP_PARAMETERS, chain))
+        return [self.console.dumpState(DUMP_PARAMETERS, chain)
                 for chain in range(1, self.chains + 1)]
 
     @property
@@ -462,4 +913,4 @@ class Model:
         """Model data. Includes data provided during model construction and
         data generated as part of data block.
         """
-        return dict_from_jags(self.console.dumpState(DUMP_DATA, 1))
+        return self.console.dumpState(DUMP_DATA, 1)
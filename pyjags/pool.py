@@ -0,0 +1,189 @@
+# GPLv2+
+
+"""
+Pool of compiled models reused for repeated fits of the same model and data.
+"""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import hashlib
+import os
+import threading
+import typing as tp
+import weakref
+
+import numpy as np
+
+from .model import Model
+
+__all__ = ['ModelPool']
+
+
+def _resident_bytes() -> tp.Optional[int]:
+    """Resident memory of the current process, where it can be measured."""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _data_bytes(data: tp.Optional[tp.Mapping[str, tp.Any]]) -> int:
+    return sum(np.asarray(np.ma.getdata(v)).nbytes
+               for v in (data or {}).values())
+
+
+def _model_key(code, file, encoding, data, kwargs) -> str:
+    """Digest identifying the code, data and compilation options of a model."""
+    digest = hashlib.sha256()
+    if code is not None:
+        digest.update(code.encode(encoding) if isinstance(code, str) else code)
+    elif file is not None:
+        with open(file, 'rb') as fh:
+            digest.update(fh.read())
+    else:
+        raise ValueError('Either model code or file must be provided.')
+    for name in sorted(data or {}):
+        value = np.ma.asarray(data[name])
+        digest.update(repr((name, value.dtype.str, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value.data).tobytes())
+        digest.update(np.ascontiguousarray(np.ma.getmaskarray(value)).tobytes())
+    digest.update(repr(sorted(kwargs.items())).encode())
+    return digest.hexdigest()
+
+
+class ModelPool:
+    """
+    Pool of compiled models, reused when the same model is fitted again to the
+    same data.
+
+    Models are checked out from the pool for exclusive use and released back
+    when no longer needed. A checked out model whose code, data and
+    compilation options match an idle model in the pool is that model,
+    reinitialized in place with new initial values and random number
+    generators, without compilation or adaptation. Samplers keep the tuning
+    from their first adaptation, and parameters without initial values
+    continue from their last values.
+
+    Idle models are evicted, least recently released first, when there are
+    more than max_models of them or their estimated memory exceeds max_bytes.
+    Memory of a model is estimated by growth of resident memory of the process
+    while it is created, and is at least the size of its data.
+    """
+
+    def __init__(self, max_models: tp.Optional[int] = 8,
+                 max_bytes: tp.Optional[int] = None) -> None:
+        """
+        Parameters
+        ----------
+        max_models: the maximum number of idle models, unbounded if None
+        max_bytes: the maximum estimated memory of idle models, unbounded if
+                   None
+        """
+        if max_models is not None and max_models < 0:
+            raise ValueError('max_models must be non-negative.')
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError('max_bytes must be non-negative.')
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Idle models from least to most recently released, with their keys.
+        self._idle: tp.OrderedDict[Model, str] = collections.OrderedDict()
+        # Keys and estimated memory of models created by the pool, forgotten
+        # when checked out models are dropped instead of released.
+        self._keys: tp.MutableMapping[Model, str] = weakref.WeakKeyDictionary()
+        self._sizes: tp.MutableMapping[Model, int] = \
+            weakref.WeakKeyDictionary()
+
+    def __len__(self) -> int:
+        """Number of idle models."""
+        return len(self._idle)
+
+    @property
+    def resident_bytes(self) -> int:
+        """Estimated memory of idle models."""
+        with self._lock:
+            return sum(self._sizes[m] for m in self._idle)
+
+    def checkout(self, code=None, data=None, init=None, chains=4,
+                 adapt=1000, file=None, encoding='utf-8', **kwargs) -> Model:
+        """
+        Return a model for exclusive use until it is released.
+
+        Arguments are those of the Model constructor. A new model is created
+        when no idle model matches code, data, chains and other options
+        except init and adapt. Otherwise the idle model is reinitialized with
+        init, and adapt is ignored.
+        """
+        key = _model_key(code, file, encoding, data,
+                         dict(kwargs, chains=chains))
+        with self._lock:
+            model = next((m for m, k in reversed(self._idle.items())
+                          if k == key), None)
+            if model is not None:
+                del self._idle[model]
+        if model is not None:
+            try:
+                model._init_parameters(init)
+            except BaseException:
+                self._discard(model)
+                raise
+            return model
+
+        before = _resident_bytes()
+        model = Model(code=code, data=data, init=init, chains=chains,
+                      adapt=adapt, file=file, encoding=encoding, **kwargs)
+        after = _resident_bytes()
+        size = _data_bytes(data)
+        if before is not None and after is not None:
+            size = max(size, after - before)
+        with self._lock:
+            self._keys[model] = key
+            self._sizes[model] = size
+        return model
+
+    def release(self, model: Model) -> None:
+        """Return a checked out model to the pool, evicting idle models over
+        the bounds of the pool."""
+        with self._lock:
+            if model not in self._keys or model in self._idle:
+                raise ValueError('Model is not checked out from this pool.')
+            self._idle[model] = self._keys[model]
+            self._evict()
+
+    @contextlib.contextmanager
+    def model(self, *args, **kwargs) -> tp.Iterator[Model]:
+        """Context manager checking out a model, as with checkout, and
+        releasing it on exit."""
+        model = self.checkout(*args, **kwargs)
+        try:
+            yield model
+        finally:
+            self.release(model)
+
+    def clear(self) -> None:
+        """Evict all idle models."""
+        with self._lock:
+            while self._idle:
+                self._evict_oldest()
+
+    def _evict(self) -> None:
+        while self._idle and (
+                (self.max_models is not None
+                 and len(self._idle) > self.max_models)
+                or (self.max_bytes is not None
+                    and sum(self._sizes[m] for m in self._idle)
+                    > self.max_bytes)):
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        model, _ = self._idle.popitem(last=False)
+        del self._keys[model]
+        del self._sizes[model]
+
+    def _discard(self, model: Model) -> None:
+        with self._lock:
+            self._keys.pop(model, None)
+            self._sizes.pop(model, None)
@@ -0,0 +1,299 @@
+# GPLv2+
+
+"""
+Console running in a separate worker process.
+
+Each ProcessConsole starts its own worker process with its own copy of the
+JAGS runtime, so that consoles don't share global JAGS state, and forwards
+calls to it. On Linux a worker can also be forked from the current process,
+continuing a copy of an already compiled console. Contents of monitors are
+returned through a shared memory file, while everything else is exchanged
+through a pipe.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import threading
+import typing as tp
+import warnings
+import weakref
+
+import numpy as np
+
+from .console import Console, JagsError
+from . import modules
+
+# Value of missing data in JAGS.
+_NA = Console.na()
+
+# Directory for files returning monitors. On Linux it is backed by memory.
+_SHARED_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# Connections of this process to its workers. Forked workers inherit them and
+# close them, so that a worker sees the end of its own connection when this
+# process exits, rather than being kept alive by copies held by itself or
+# its siblings.
+_connections: tp.MutableSet = weakref.WeakSet()
+
+
+def _context():
+    """Return multiprocessing context used to start workers.
+
+    Where available, workers are forked from a server process that has already
+    imported pyjags, instead of starting a new interpreter for each of them.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def _share_arrays(arrays: tp.Dict[str, np.ndarray]):
+    """Copy arrays into a new shared file. Returns its path and layout.
+
+    Masked arrays are copied with their data, which contains JAGS_NA in place
+    of masked values, and are masked again when opened.
+    """
+    layout = []
+    total = 0
+    for name, array in arrays.items():
+        layout.append((name, array.shape, total, np.ma.isMaskedArray(array)))
+        total += array.size
+    if not total:
+        return None, layout
+    fd, path = tempfile.mkstemp(prefix='pyjags-', dir=_SHARED_DIR)
+    os.close(fd)
+    try:
+        shared = np.memmap(path, dtype=np.double, mode='r+', shape=(total,))
+        for (name, shape, offset, _), array in zip(layout, arrays.values()):
+            view = shared[offset:offset + array.size].reshape(shape, order='F')
+            view[...] = np.ma.getdata(array)
+        del shared, view
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, layout
+
+
+def _open_shared_arrays(path, layout) -> tp.Dict[str, np.ndarray]:
+    """Map arrays from a shared file, removing the file afterwards."""
+    if path is None:
+        return {name: np.empty(shape, order='F')
+                for name, shape, _, _ in layout}
+    try:
+        # Copy on write, so that arrays are writeable as usual.
+        shared = np.asarray(np.memmap(path, dtype=np.double, mode='c'))
+    finally:
+        os.unlink(path)
+    result = {}
+    for name, shape, offset, masked in layout:
+        size = int(np.prod(shape))
+        array = shared[offset:offset + size].reshape(shape, order='F')
+        result[name] = _mask_na(array) if masked else array
+    return result
+
+
+def _mask_na(array: np.ndarray) -> np.ndarray:
+    return np.ma.masked_equal(array, _NA, copy=False)
+
+
+def _serve(connection, loaded_modules, modules_dir):
+    """Serve requests of a ProcessConsole in the worker process."""
+    for name in loaded_modules:
+        modules.load_module(name, modules_dir)
+    _serve_console(connection, Console())
+
+
+def _serve_forked(connection, console):
+    """Serve requests of a ProcessConsole in a forked worker process."""
+    for inherited in list(_connections):
+        inherited.close()
+    _connections.clear()
+    _serve_console(connection, console)
+
+
+def _serve_console(connection, console):
+    """Serve requests of a ProcessConsole with console."""
+    # Interrupts are handled by the parent process.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            method, args = connection.recv()
+        except EOFError:
+            break
+        if method is None:
+            break
+        try:
+            if method in ('dumpMonitors', 'drainMonitors'):
+                result = _share_arrays(getattr(console, method)(*args))
+            else:
+                result = getattr(console, method)(*args)
+        except JagsError as e:
+            connection.send(('jags', str(e)))
+        except Exception as e:
+            connection.send(('error', e))
+        else:
+            connection.send(('ok', result))
+
+
+def _shutdown(connection, process):
+    try:
+        connection.send((None, ()))
+    except OSError:
+        pass
+    process.join(timeout=5)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+    connection.close()
+
+
+class ProcessConsole:
+    """Console running in a separate worker process.
+
+    Implements the interface of Console used by Model. Modules loaded in the
+    current process when the console is created are also loaded in the worker.
+    """
+
+    def __init__(self):
+        self._start(_context(), _serve,
+                    (Console.listModules(), modules.get_modules_dir()))
+
+    @classmethod
+    def fork(cls, console):
+        """Return a console in a worker process forked from the current one.
+
+        The worker continues a copy of console, such as an already compiled
+        one, whose memory is shared with the current process until either of
+        them writes to it. Only supported on Linux.
+
+        Forking a process running several threads is unsafe, since the worker
+        inherits locks held by other threads, which it can never acquire. A
+        RuntimeWarning is issued when other threads are running.
+        """
+        if not sys.platform.startswith('linux'):
+            raise ValueError('Forking consoles is only supported on Linux.')
+        if threading.active_count() > 1:
+            warnings.warn(
+                'Forking a worker while other threads are running, which may '
+                'deadlock the worker. Use the process backend instead when '
+                'other models or threads are running.', RuntimeWarning,
+                stacklevel=2)
+        self = cls.__new__(cls)
+        self._start(multiprocessing.get_context('fork'), _serve_forked,
+                    (console,))
+        return self
+
+    def _start(self, context, target, args):
+        self._connection, child = context.Pipe()
+        # Registered before starting, as a forked worker also inherits its
+        # own connection.
+        _connections.add(self._connection)
+        self._process = context.Process(target=target, daemon=True,
+                                        args=(child,) + args)
+        self._process.start()
+        child.close()
+        self._lock = threading.Lock()
+        self._finalizer = weakref.finalize(
+            self, _shutdown, self._connection, self._process)
+
+    def close(self):
+        """Stop the worker process."""
+        self._finalizer()
+
+    def _call(self, method, *args):
+        with self._lock:
+            self._connection.send((method, args))
+            try:
+                status, result = self._connection.recv()
+            except EOFError:
+                raise JagsError('Worker process has exited unexpectedly.')
+        if status == 'jags':
+            raise JagsError(result)
+        elif status == 'error':
+            raise result
+        return result
+
+    def _receive_monitors(self, method, type, flat, out):
+        path, layout = self._call(method, type, flat)
+        result = _open_shared_arrays(path, layout)
+        masked = {name for name, _, _, m in layout if m}
+        for name, target in (out or {}).items():
+            if name not in result:
+                continue
+            if not isinstance(target, np.ndarray):
+                raise TypeError('Output for monitor {} must be a numpy '
+                                'array.'.format(name))
+            if target.shape != result[name].shape:
+                raise ValueError(
+                    'Output for monitor {} has shape {}, but monitor has '
+                    'shape {}.'.format(name, target.shape, result[name].shape))
+            target[...] = np.ma.getdata(result[name])
+            result[name] = _mask_na(target) if name in masked else target
+        return result
+
+    def checkModel(self, path):
+        self._call('checkModel', path)
+
+    def compile(self, data, chains, generate_data):
+        self._call('compile', data, chains, generate_data)
+
+    def setParameters(self, parameters, chain):
+        self._call('setParameters', parameters, chain)
+
+    def setRNGname(self, name, chain):
+        self._call('setRNGname', name, chain)
+
+    def initialize(self):
+        self._call('initialize')
+
+    def update(self, iterations):
+        self._call('update', iterations)
+
+    def setMonitor(self, name, thin, type):
+        self._call('setMonitor', name, thin, type)
+
+    def setMonitors(self, names, thin, type):
+        self._call('setMonitors', names, thin, type)
+
+    def clearMonitor(self, name, type):
+        self._call('clearMonitor', name, type)
+
+    def dumpState(self, type, chain):
+        return self._call('dumpState', type, chain)
+
+    def iter(self):
+        return self._call('iter')
+
+    def variableNames(self):
+        return self._call('variableNames')
+
+    def nchain(self):
+        return self._call('nchain')
+
+    def dumpMonitors(self, type, flat, out=None):
+        return self._receive_monitors('dumpMonitors', type, flat, out)
+
+    def drainMonitors(self, type, flat, out=None):
+        return self._receive_monitors('drainMonitors', type, flat, out)
+
+    def dumpSamplers(self):
+        return self._call('dumpSamplers')
+
+    def adaptOff(self):
+        self._call('adaptOff')
+
+    def checkAdaptation(self):
+        return self._call('checkAdaptation')
+
+    def isAdapting(self):
+        return self._call('isAdapting')
+
+    def clearModel(self):
+        self._call('clearModel')
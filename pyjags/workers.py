@@ -0,0 +1,98 @@
+# GPLv2+
+
+"""
+Long-lived worker threads used to drive consoles of a model in parallel.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import typing as tp
+import weakref
+from concurrent.futures import Future
+
+
+def _resolve_affinity(affinity, workers: int) -> tp.List[tp.Optional[tp.Set[int]]]:
+    """Return a set of CPUs, or None, for each worker."""
+    if affinity is None or affinity is False:
+        return [None] * workers
+    if not hasattr(os, 'sched_setaffinity'):
+        raise ValueError('CPU affinity is not supported on this platform.')
+    if affinity is True:
+        cpus = sorted(os.sched_getaffinity(0))
+        return [{cpus[i % len(cpus)]} for i in range(workers)]
+    affinity = list(affinity)
+    if len(affinity) != workers:
+        raise ValueError(
+            'Length of affinity sequence should equal the number of threads.')
+    return [set(cpus) if isinstance(cpus, tp.Iterable) else {cpus}
+            for cpus in affinity]
+
+
+def _work(tasks: queue.SimpleQueue, cpus: tp.Optional[tp.Set[int]]) -> None:
+    if cpus is not None:
+        # On Linux pid 0 refers to the calling thread.
+        os.sched_setaffinity(0, cpus)
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        future, fn, args = task
+        if not future.set_running_or_notify_cancel():
+            continue
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+
+def _stop(queues: tp.List[queue.SimpleQueue]) -> None:
+    for tasks in queues:
+        tasks.put(None)
+
+
+class WorkerPool:
+    """Fixed set of threads, each running tasks submitted to it in order.
+
+    Unlike an executor, tasks are submitted to a particular worker, so that
+    work on the same console always runs in the same thread, optionally
+    pinned to chosen CPUs.
+    """
+
+    def __init__(self, workers: int, affinity=None) -> None:
+        """
+        Parameters
+        ----------
+        workers: a positive number of threads
+        affinity: None to leave threads unpinned, True to pin each thread to a
+                  single CPU available to the process in turn, or a sequence
+                  with a CPU number or a set of CPU numbers for each thread
+        """
+        if workers < 1:
+            raise ValueError('Number of workers should be positive.')
+        self._queues = [queue.SimpleQueue() for _ in range(workers)]
+        self._threads = [
+            threading.Thread(target=_work, args=(tasks, cpus), daemon=True,
+                             name='pyjags-worker-{}'.format(i))
+            for i, (tasks, cpus) in enumerate(
+                zip(self._queues, _resolve_affinity(affinity, workers)))]
+        for thread in self._threads:
+            thread.start()
+        self._finalizer = weakref.finalize(self, _stop, self._queues)
+
+    def __len__(self) -> int:
+        return len(self._queues)
+
+    def submit(self, worker: int, fn: tp.Callable, *args) -> Future:
+        """Run fn(*args) in worker modulo the number of workers."""
+        future = Future()
+        self._queues[worker % len(self._queues)].put((future, fn, args))
+        return future
+
+    def shutdown(self) -> None:
+        """Stop workers once they finish already submitted tasks."""
+        self._finalizer()
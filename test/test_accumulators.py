@@ -0,0 +1,148 @@
+import numpy as np
+import pytest
+
+from pyjags.accumulators import (BatchMeansAccumulator, CovarianceAccumulator,
+                                 MomentsAccumulator, QuantileAccumulator)
+
+
+def _require_jags():
+    import pyjags
+    try:
+        _ = pyjags.Model
+    except Exception as e:
+        pytest.skip(f"JAGS runtime not available: {e!r}")
+
+
+def _ar1(phi, shape, iterations, chains, seed=0):
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(size=shape + (iterations, chains))
+    x = np.empty_like(noise)
+    x[..., 0, :] = noise[..., 0, :]
+    for t in range(1, iterations):
+        x[..., t, :] = phi * x[..., t - 1, :] + noise[..., t, :]
+    return x
+
+
+def test_chunked_updates_match_single_update():
+    x = _ar1(0.5, (2, 3), 5000, 3)
+    chunked = BatchMeansAccumulator(max_batches=16)
+    start = 0
+    for size in [1, 2, 37, 500, 1460, 3000]:
+        chunked.update(x[..., start:start + size, :])
+        start += size
+    single = BatchMeansAccumulator(max_batches=16)
+    single.update(x)
+
+    assert chunked.iterations == single.iterations == 5000
+    assert chunked.batch_size == single.batch_size
+    np.testing.assert_allclose(chunked.mean(), x.mean(axis=-2))
+    np.testing.assert_allclose(chunked.var(), x.var(axis=-2, ddof=1))
+    np.testing.assert_allclose(chunked.ess(), single.ess())
+    np.testing.assert_allclose(chunked.rhat(), single.rhat())
+    assert chunked.ess().shape == (2, 3)
+
+
+def test_effective_sample_size_of_autocorrelated_chains():
+    phi = 0.8
+    x = _ar1(phi, (4,), 20000, 4)
+    acc = BatchMeansAccumulator()
+    acc.update(x)
+    expected = x.shape[-2] * x.shape[-1] * (1 - phi) / (1 + phi)
+    np.testing.assert_allclose(acc.ess(), expected, rtol=0.3)
+    np.testing.assert_allclose(acc.rhat(), 1.0, atol=0.01)
+
+
+def test_rhat_detects_separated_chains():
+    x = _ar1(0.5, (1,), 2000, 4)
+    x[..., 0] += 5.0
+    acc = BatchMeansAccumulator()
+    acc.update(x)
+    assert acc.rhat()[0] > 1.5
+
+
+def test_inconsistent_samples_raise():
+    acc = BatchMeansAccumulator()
+    acc.update(np.zeros((3, 10, 2)))
+    with pytest.raises(ValueError):
+        acc.update(np.zeros((3, 10, 3)))
+
+
+def test_moments_of_chunks_and_merged_chains():
+    x = _ar1(0.5, (2, 3), 1000, 4)
+    first, second = MomentsAccumulator(), MomentsAccumulator()
+    for start in range(0, 1000, 300):
+        first.update(x[..., start:start + 300, :2])
+        second.update(x[..., start:start + 300, 2:])
+    first.merge(second)
+    assert first.chains == 4 and first.iterations == 1000
+    np.testing.assert_allclose(first.chain_mean(), x.mean(axis=-2))
+    np.testing.assert_allclose(first.chain_var(), x.var(axis=-2, ddof=1))
+    pooled = x.reshape((2, 3, -1))
+    np.testing.assert_allclose(first.mean(), pooled.mean(axis=-1))
+    np.testing.assert_allclose(first.var(), pooled.var(axis=-1, ddof=1))
+
+
+def test_covariance_of_chunks_and_merged_accumulators():
+    rng = np.random.default_rng(0)
+    x = rng.multivariate_normal([0, 1, 2], [[1, 0.5, 0], [0.5, 2, -0.3],
+                                            [0, -0.3, 1]], size=(500, 3))
+    x = np.moveaxis(x, -1, 0)
+    first, second = CovarianceAccumulator(), CovarianceAccumulator()
+    for start in range(0, 500, 70):
+        first.update(x[:, start:start + 70, :2])
+        second.update(x[:, start:start + 70, 2:])
+    first.merge(second)
+    pooled = x.reshape((3, -1))
+    assert first.count == pooled.shape[1]
+    np.testing.assert_allclose(first.mean(), pooled.mean(axis=-1))
+    np.testing.assert_allclose(first.cov(), np.cov(pooled))
+
+
+def test_quantile_sketch_has_bounded_memory_and_rank_error():
+    rng = np.random.default_rng(1)
+    x = rng.normal(size=(2, 5000, 4))
+    x[1] = rng.exponential(size=(5000, 4))
+    first, second = QuantileAccumulator(k=100), QuantileAccumulator(k=100)
+    for start in range(0, 5000, 250):
+        first.update(x[:, start:start + 250, :2])
+        second.update(x[:, start:start + 250, 2:])
+    first.merge(second)
+    assert first.count == 20000
+    assert sum(level.shape[1] for level in first._levels) < 400
+    q = [0.025, 0.5, 0.975]
+    actual = first.quantile(q)
+    assert actual.shape == (2, 3)
+    pooled = np.sort(x.reshape((2, -1)), axis=-1)
+    for i in range(2):
+        ranks = np.searchsorted(pooled[i], actual[i]) / pooled.shape[1]
+        np.testing.assert_allclose(ranks, q, atol=0.03)
+    assert first.quantile(0.5).shape == (2,)
+    np.testing.assert_equal(first.quantile([0, 1]), pooled[:, [0, -1]])
+
+
+def test_quantiles_of_masked_elements_are_nan():
+    x = np.ma.masked_array(np.arange(60.0).reshape((2, 15, 2)))
+    x[1, 3, 0] = np.ma.masked
+    acc = QuantileAccumulator(k=8)
+    acc.update(x)
+    actual = acc.quantile([0.0, 1.0])
+    np.testing.assert_equal(actual[0], [0, 29])
+    assert np.isnan(actual[1]).all()
+
+
+def test_sample_until_with_incremental_criterion():
+    _require_jags()
+    import pyjags
+
+    m = pyjags.Model(code="model { x ~ dnorm(0, 1) }", chains=2, adapt=0,
+                     progress_bar=False)
+    criterion = pyjags.IncrementalEffectiveSampleSizeCriterion(
+        minimum_ess=1000, variable_names=["x"])
+    seen = []
+    s = pyjags.sample_until(m, criterion, chunk_size=200,
+                            max_iterations=10000, vars=["x"],
+                            iteration_function=lambda s, ok, n: seen.append(n))
+    # The criterion has seen every sample exactly once.
+    assert criterion.accumulators["x"].iterations == s["x"].shape[1]
+    assert s["x"].shape[1] == seen[-1]
+    assert s["x"].shape[1] < 10000
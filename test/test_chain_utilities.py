@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from pyjags.chain_utilities import (
+    SampleBuffer, as_elements, merge_consecutive_chains)
+
+
+def _samples(iterations, seed):
+    rng = np.random.default_rng(seed)
+    return {"x": rng.normal(size=(6, iterations, 4)),
+            "y": rng.integers(0, 9, size=(1, iterations, 4))}
+
+
+def test_buffer_matches_merge_consecutive_chains():
+    chunks = [_samples(n, seed) for seed, n in enumerate([5, 1, 17, 3, 64])]
+    buffer = SampleBuffer(chunks[0])
+    views = [buffer.samples]
+    for chunk in chunks[1:]:
+        buffer.append(chunk)
+        views.append(buffer.samples)
+
+    expected = merge_consecutive_chains(chunks)
+    assert buffer.get_chain_length() == 90
+    for k, v in expected.items():
+        np.testing.assert_array_equal(buffer.samples[k], v)
+        assert buffer.samples[k].dtype == v.dtype
+    # Earlier views keep their samples after the buffer grows.
+    np.testing.assert_array_equal(views[0]["x"], chunks[0]["x"])
+    assert views[2]["x"].shape == (6, 23, 4)
+
+
+def test_buffer_masked_values():
+    first = {"x": np.ones((1, 3, 2))}
+    second = {"x": np.ma.masked_array(np.ones((1, 2, 2)), mask=False)}
+    second["x"][0, 1, 0] = np.ma.masked
+    buffer = SampleBuffer(first)
+    buffer.append(second)
+    buffer.append(first)
+
+    x = buffer.samples["x"]
+    assert isinstance(x, np.ma.MaskedArray)
+    assert x.shape == (1, 8, 2)
+    assert x.mask.sum() == 1 and x.mask[0, 4, 0]
+
+
+def test_buffer_inconsistent_samples_raise():
+    buffer = SampleBuffer({"x": np.zeros((1, 3, 2))})
+    with pytest.raises(ValueError):
+        buffer.append({"x": np.zeros((1, 3, 3))})
+    with pytest.raises(ValueError):
+        buffer.append({"x": np.zeros((2, 3, 2))})
+    with pytest.raises(ValueError):
+        buffer.append({"y": np.zeros((1, 3, 2))})
+
+
+def test_buffer_variables_left_out():
+    buffer = SampleBuffer({"x": np.zeros((1, 3, 2)), "y": np.zeros((1, 3, 2))})
+    buffer.append({"x": np.ones((1, 4, 2))})
+    assert buffer.samples["x"].shape == (1, 7, 2)
+    assert buffer.samples["y"].shape == (1, 3, 2)
+    with pytest.raises(ValueError):
+        buffer.get_chain_length()
+
+
+def test_as_elements():
+    samples = np.ma.masked_array(np.arange(24.0).reshape((2, 3, 2, 2)))
+    samples[1, 0, 1, 0] = np.ma.masked
+    x = as_elements(samples)
+    assert x.shape == (6, 2, 2)
+    np.testing.assert_array_equal(x[3], samples[1, 1].data.T)
+    assert np.isnan(x[1, 0, 1])
+    with pytest.raises(ValueError):
+        as_elements(np.zeros(3))
@@ -0,0 +1,64 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from pyjags import diagnostics
+
+
+def _chains(shape, iterations, chains, seed=0):
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(size=shape + (iterations, chains))
+    return np.cumsum(noise, axis=-2) * 0.1 + noise
+
+
+@pytest.mark.parametrize("iterations,chains", [(500, 4), (101, 2), (5, 3)])
+def test_agrees_with_arviz(iterations, chains):
+    az = pytest.importorskip("arviz")
+    x = _chains((3, 2), iterations, chains)
+    x[0, 1] = np.round(x[0, 1])
+    x[1, 0] = 2.0
+    idata = az.from_dict(posterior={"x": np.moveaxis(x, (-1, -2), (0, 1))})
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected = {
+            "rhat": az.rhat(idata).x.values,
+            "ess_bulk": az.ess(idata, method="bulk").x.values,
+            "ess_tail": az.ess(idata, method="tail").x.values,
+            "ess_mean": az.ess(idata, method="mean").x.values,
+            "mcse_mean": az.mcse(idata).x.values,
+        }
+    for name, value in expected.items():
+        np.testing.assert_allclose(getattr(diagnostics, name)(x), value,
+                                   rtol=1e-9, err_msg=name)
+
+
+def test_normal_ppf():
+    from statistics import NormalDist
+    p = np.array([1e-300, 1e-20, 0.01, 0.3, 0.5, 0.7, 0.99, 1 - 1e-16])
+    np.testing.assert_allclose(diagnostics._normal_ppf(p),
+                               [NormalDist().inv_cdf(v) for v in p])
+
+
+def test_invalid_samples():
+    x = _chains((4,), 100, 2)
+    x = np.ma.masked_array(x, mask=False)
+    x[1, 10, 0] = np.ma.masked
+    x[2, 20, 1] = np.nan
+    for statistic in [diagnostics.rhat, diagnostics.ess_bulk,
+                      diagnostics.ess_tail, diagnostics.mcse_mean]:
+        values = statistic(x)
+        assert values.shape == (4,)
+        assert np.isnan(values[1:3]).all()
+        assert np.isfinite(values[[0, 3]]).all()
+
+    assert np.isnan(diagnostics.rhat(_chains((2,), 100, 1))).all()
+    assert np.isnan(diagnostics.ess_bulk(_chains((2,), 3, 2))).all()
+
+
+def test_blocks_of_elements(monkeypatch):
+    x = _chains((7, 3), 50, 2)
+    expected = diagnostics.ess_bulk(x)
+    monkeypatch.setattr(diagnostics, "_BLOCK_SAMPLES", 250)
+    np.testing.assert_array_equal(diagnostics.ess_bulk(x), expected)
@@ -0,0 +1,188 @@
+import tempfile
+
+import numpy as np
+import pytest
+
+
+def _require_jags():
+    import pyjags
+    try:
+        _ = pyjags.Model
+    except Exception as e:
+        pytest.skip(f"JAGS runtime not available: {e!r}")
+
+
+def _model(**kwargs):
+    import pyjags
+    return pyjags.Model(code="model { x ~ dnorm(0, 1) }", chains=2, adapt=0,
+                        progress_bar=False, **kwargs)
+
+
+class _SatisfiedAfter:
+    def __init__(self, calls):
+        self.calls = calls
+        self.lengths = []
+
+    def __call__(self, samples, verbose):
+        self.lengths.append(samples["x"].shape[1])
+        return len(self.lengths) >= self.calls
+
+
+@pytest.mark.parametrize("keep_surplus,expected", [(True, 40), (False, 30)])
+def test_pipelined_sample_until(keep_surplus, expected):
+    _require_jags()
+    import pyjags
+
+    m = _model()
+    criterion = _SatisfiedAfter(3)
+    seen = []
+    s = pyjags.sample_until(m, criterion, chunk_size=10, max_iterations=100,
+                            vars=["x"], pipeline=True,
+                            keep_surplus=keep_surplus,
+                            iteration_function=lambda s, ok, n: seen.append(
+                                (s["x"].shape[1], ok, n)))
+    assert criterion.lengths == [10, 20, 30]
+    assert s["x"].shape == (1, expected, 2)
+    assert seen[-1] == (expected, True, expected)
+    # Monitors are removed once sampling is over.
+    assert m.sample(5, vars=["x"])["x"].shape == (1, 5, 2)
+
+
+def test_pipelined_sample_until_reaches_max_iterations():
+    _require_jags()
+    import pyjags
+
+    m = _model(threads=2)
+    with tempfile.TemporaryDirectory() as directory:
+        s = pyjags.sample_until(m, _SatisfiedAfter(100), chunk_size=7,
+                                max_iterations=30, vars=["x"], thin=2,
+                                pipeline=True, store=directory)
+        # Chunks are rounded up to 8 iterations, the last one has 6.
+        assert s["x"].shape == (1, 15, 2)
+        assert np.all(np.isfinite(s["x"]))
+
+
+def test_pipelined_sample_until_criterion_failure():
+    _require_jags()
+    import pyjags
+
+    def criterion(samples, verbose):
+        raise RuntimeError("criterion failed")
+
+    m = _model()
+    with pytest.raises(RuntimeError):
+        pyjags.sample_until(m, criterion, chunk_size=10, max_iterations=100,
+                            vars=["x"], pipeline=True)
+    assert m.sample(5, vars=["x"])["x"].shape == (1, 5, 2)
+
+
+def test_adaptive_sample_until():
+    _require_jags()
+    import pyjags
+
+    m = _model()
+    criterion = pyjags.EffectiveSampleSizeCriterion(minimum_ess=2000)
+    seen = []
+    s = pyjags.sample_until(m, criterion, chunk_size=100,
+                            max_iterations=100000, vars=["x"], adaptive=True,
+                            iteration_function=lambda s, ok, n: seen.append(n))
+    assert criterion.last_minimum_ess >= 2000
+    assert s["x"].shape[1] == seen[-1]
+    # Steps grow from the first one, and at most double the samples.
+    steps = np.diff([0] + seen)
+    assert steps[0] == 100 and steps.max() > 100
+    assert np.all(steps[1:] <= np.cumsum(steps)[:-1])
+    assert seen[-1] < 100000
+
+    with pytest.raises(ValueError):
+        pyjags.sample_until(m, criterion, vars=["x"], pipeline=True,
+                            adaptive=True)
+
+
+def test_predict_iterations_left():
+    import pyjags
+    from pyjags.incremental_sampling import _predict_iterations_left
+
+    criterion = pyjags.EffectiveSampleSizeAndRHatCriterion(
+        minimum_ess=1000, maximum_rhat_deviation=0.01)
+    assert _predict_iterations_left(criterion, 100) is None
+    criterion.last_minimum_ess = 250
+    criterion.last_maximum_rhat_deviation = 0.02
+    assert _predict_iterations_left(criterion, 100) == pytest.approx(300)
+    criterion.last_maximum_rhat_deviation = 0.1
+    assert _predict_iterations_left(criterion, 100) == pytest.approx(900)
+    assert _predict_iterations_left(lambda s, v: False, 100) is None
+
+
+def test_sample_until_time_budget():
+    _require_jags()
+    import pyjags
+    import time
+
+    def criterion(samples, verbose):
+        return False
+
+    m = _model()
+    started = time.perf_counter()
+    s = pyjags.sample_until(m, criterion, chunk_size=100,
+                            max_iterations=10 ** 9, vars=["x"],
+                            time_budget=0.5)
+    assert time.perf_counter() - started < 5
+    assert 100 <= s["x"].shape[1] < 10 ** 9
+
+
+@pytest.mark.parametrize("retired_thin", [None, 5])
+@pytest.mark.parametrize("incremental", [False, True])
+def test_sample_until_retires_converged_variables(incremental, retired_thin):
+    _require_jags()
+    import pyjags
+
+    # Gibbs sampling mixes slowly along the ridge of a + b = y.
+    m = pyjags.Model(code="""
+        model {
+            fast ~ dnorm(0, 1)
+            a ~ dnorm(0, 1.0E-4)
+            b ~ dnorm(0, 1.0E-4)
+            y ~ dnorm(a + b, 1.0E4)
+        }""", data={"y": 0.0}, chains=2, adapt=0, progress_bar=False)
+    if incremental:
+        criterion = pyjags.IncrementalEffectiveSampleSizeCriterion(1000)
+    else:
+        criterion = pyjags.EffectiveSampleSizeCriterion(1000)
+    s = pyjags.sample_until(m, criterion, chunk_size=1000,
+                            max_iterations=5000, vars=["fast", "a"],
+                            retire_converged=True, retired_thin=retired_thin)
+    assert criterion.last_convergence["a"] is False
+    assert s["a"].shape[1] == 5000
+    if retired_thin is None:
+        assert s["fast"].shape[1] == 1000
+    else:
+        assert s["fast"].shape[1] == 1000 + 4000 // retired_thin
+
+
+class _ConvergedVariable:
+    """Report x as converged and record the variables given each call."""
+
+    def __init__(self, calls):
+        self.calls = calls
+        self.names = []
+
+    def __call__(self, samples, verbose):
+        self.names.append(sorted(samples))
+        self.last_convergence = {name: name == "x" for name in samples}
+        return len(self.names) >= self.calls
+
+
+@pytest.mark.parametrize("retired_thin", [None, 5])
+def test_sample_until_does_not_evaluate_retired_variables(retired_thin):
+    _require_jags()
+    import pyjags
+
+    m = pyjags.Model(code="model { x ~ dnorm(0, 1)\n y ~ dnorm(0, 1) }",
+                     chains=2, adapt=0, progress_bar=False)
+    criterion = _ConvergedVariable(3)
+    s = pyjags.sample_until(m, criterion, chunk_size=100,
+                            max_iterations=1000, vars=["x", "y"],
+                            retire_converged=True, retired_thin=retired_thin)
+    assert criterion.names == [["x", "y"], ["y"], ["y"]]
+    assert s["y"].shape[1] == 300
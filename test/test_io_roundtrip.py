@@ -34,3 +34,299 @@ def test_save_load_roundtrip_hdf5():
     assert s2["theta"].shape == s["theta"].shape
     # values shouldn’t be identical every element (different copy), but close
     assert np.allclose(s2["theta"], s["theta"])
+
+def test_sample_into_npy_store():
+    _require_jags()
+    import pyjags
+    from pyjags.io import NpySampleStore, load_samples_dictionary_from_directory
+
+    model = """
+    model {
+      for (i in 1:3) {
+        x[i] ~ dnorm(mu, 1)
+      }
+      mu ~ dnorm(0, 1)
+    }
+    """
+    init = {".RNG.name": "base::Wichmann-Hill", ".RNG.seed": 7}
+    expected = pyjags.Model(code=model, init=init, chains=2, adapt=100,
+                            progress_bar=False).sample(250, vars=["x", "mu"])
+
+    m = pyjags.Model(code=model, init=init, chains=2, adapt=100,
+                     progress_bar=False)
+    with tempfile.TemporaryDirectory() as td:
+        s = m.sample(100, vars=["x", "mu"], store=td, chunk=30)
+        assert s["x"].shape == (3, 100, 2)
+        assert isinstance(s["x"], np.memmap)
+        # Continue appending to the same store.
+        store = NpySampleStore(td, mode="a")
+        s = m.sample(150, vars=["x", "mu"], store=store, chunk=40)
+        assert s["x"].shape == (3, 250, 2)
+        for k, v in expected.items():
+            np.testing.assert_equal(v, s[k])
+
+        loaded = load_samples_dictionary_from_directory(td, mmap_mode=None)
+        for k, v in expected.items():
+            np.testing.assert_equal(v, loaded[k])
+        del s
+
+
+def test_npy_store_masked_values():
+    from pyjags.io import NpySampleStore
+
+    first = np.arange(12.0).reshape((3, 2, 2), order="F")
+    second = np.ma.masked_array(np.ones((3, 1, 2)),
+                                mask=np.zeros((3, 1, 2), dtype=bool))
+    second.mask[1, 0, 1] = True
+    with tempfile.TemporaryDirectory() as td:
+        store = NpySampleStore(td)
+        store.append({"x": first})
+        store.append({"x": second})
+        with pytest.raises(ValueError):
+            store.append({"x": np.ones((3, 1, 3))})
+        s = store.load()
+        assert s["x"].shape == (3, 3, 2)
+        np.testing.assert_equal(first, s["x"].data[:, :2, :])
+        assert not s["x"].mask[:, :2, :].any()
+        assert s["x"].mask[1, 2, 1]
+        assert s["x"].mask.sum() == 1
+
+        # Starting a new store removes the previous one.
+        store = NpySampleStore(td)
+        store.append({"y": first})
+        assert set(store.load()) == {"y"}
+        assert not os.path.exists(os.path.join(td, "x.data.npy"))
+        del s
+
+
+def test_sample_until_with_store():
+    _require_jags()
+    import pyjags
+
+    m = pyjags.Model(code="model { x ~ dnorm(0, 1) }", chains=2, adapt=0,
+                     progress_bar=False)
+    seen = []
+    with tempfile.TemporaryDirectory() as td:
+        s = pyjags.sample_until(
+            m, lambda samples, verbose: samples["x"].shape[1] >= 30,
+            chunk_size=10, max_iterations=100, vars=["x"], store=td,
+            iteration_function=lambda s, ok, n: seen.append(n))
+        assert s["x"].shape == (1, 30, 2)
+        assert seen == [10, 20, 30]
+        del s
+
+
+def test_append_samples_to_hdf5():
+    import h5py
+    from pyjags.chain_utilities import (merge_consecutive_chains,
+                                        merge_parallel_chains)
+    from pyjags.io import (append_samples_dictionary_to_file,
+                           load_samples_dictionary_from_file,
+                           save_samples_dictionary_to_file)
+
+    rng = np.random.default_rng(0)
+
+    def samples(iterations, chains):
+        return {"x": rng.normal(size=(3, iterations, chains)),
+                "y": rng.normal(size=(1, iterations, chains))}
+
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, "samples.h5")
+        first, second, third = samples(5, 2), samples(7, 2), samples(12, 1)
+        save_samples_dictionary_to_file(path, first)
+        append_samples_dictionary_to_file(path, second)
+        consecutive = merge_consecutive_chains([first, second])
+        loaded = load_samples_dictionary_from_file(path)
+        for k, v in consecutive.items():
+            np.testing.assert_equal(loaded[k], v)
+
+        append_samples_dictionary_to_file(path, third, parallel=True)
+        parallel = merge_parallel_chains([consecutive, third])
+        loaded = load_samples_dictionary_from_file(path)
+        for k, v in parallel.items():
+            np.testing.assert_equal(loaded[k], v)
+
+        with h5py.File(path, "r") as h5:
+            assert h5["x"].maxshape == (3, None, None)
+            assert h5["x"].chunks[-1] == 1
+
+        with pytest.raises(ValueError):
+            append_samples_dictionary_to_file(path, samples(3, 2))
+
+
+def test_append_masked_samples_to_hdf5():
+    from pyjags.io import (append_samples_dictionary_to_file,
+                           load_samples_dictionary_from_file)
+
+    second = np.ma.masked_array(np.ones((2, 3, 2)), mask=False)
+    second[1, 2, 0] = np.ma.masked
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, "samples.h5")
+        append_samples_dictionary_to_file(path, {"x": np.zeros((2, 4, 2))},
+                                          compression=False)
+        append_samples_dictionary_to_file(path, {"x": second})
+        append_samples_dictionary_to_file(path, {"x": np.zeros((2, 1, 2))})
+        x = load_samples_dictionary_from_file(path)["x"]
+        assert isinstance(x, np.ma.MaskedArray)
+        assert x.shape == (2, 8, 2)
+        assert x.mask.sum() == 1 and x.mask[1, 6, 0]
+        np.testing.assert_equal(x.data[:, 4:7, :], 1.0)
+
+
+def test_append_to_fixed_size_hdf5_dataset():
+    import h5py
+    from pyjags.io import append_samples_dictionary_to_file
+
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, "samples.h5")
+        with h5py.File(path, "w") as h5:
+            h5.create_dataset("x", data=np.zeros((1, 3, 2)))
+        with pytest.raises(ValueError):
+            append_samples_dictionary_to_file(path, {"x": np.zeros((1, 3, 2))})
+
+
+
+def test_save_arrays_without_iteration_and_chain_axes():
+    from pyjags.io import (append_samples_dictionary_to_file,
+                           load_samples_dictionary_from_file,
+                           save_samples_dictionary_to_file)
+
+    samples = {"x": np.arange(3.), "n": np.array(4),
+               "m": np.ma.masked_array([1., 2.], mask=[False, True])}
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, "samples.h5")
+        save_samples_dictionary_to_file(path, samples)
+        loaded = load_samples_dictionary_from_file(path)
+        for k, v in samples.items():
+            np.testing.assert_equal(loaded[k], v)
+            assert loaded[k].shape == v.shape
+        assert loaded["m"].mask.tolist() == [False, True]
+        with pytest.raises(ValueError):
+            append_samples_dictionary_to_file(path, {"x": np.arange(3.)})
+
+def test_lazy_hdf5_samples():
+    from pyjags.io import (open_samples_dictionary_from_file,
+                           load_samples_dictionary_from_file,
+                           save_samples_dictionary_to_file)
+
+    x = np.arange(2 * 20 * 3, dtype=float).reshape((2, 20, 3))
+    y = np.ma.masked_array(np.ones((1, 20, 3)), mask=False)
+    y[0, 7, 2] = np.ma.masked
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, "samples.h5")
+        save_samples_dictionary_to_file(path, {"x": x, "y": y})
+
+        with open_samples_dictionary_from_file(path) as s:
+            assert set(s) == {"x", "y"} and len(s) == 2
+            assert s["x"].shape == x.shape and s["x"].dtype == x.dtype
+            assert s["y"].masked and not s["x"].masked
+            np.testing.assert_equal(s["x"][1, 5:9], x[1, 5:9])
+            np.testing.assert_equal(np.asarray(s["x"]), x)
+            np.testing.assert_equal(s["x"].select(slice(2, 15), thin=3),
+                                    x[:, 2:15:3])
+            np.testing.assert_equal(s["x"].select(chains=[2, 0, 2]),
+                                    x[..., [2, 0, 2]])
+            np.testing.assert_equal(s["x"].select(slice(None, None, 2), -1),
+                                    x[:, ::2, [-1]])
+            tail = s["y"].select(slice(5, 10), chains=[1, 2])
+            assert isinstance(tail, np.ma.MaskedArray)
+            assert tail.shape == (1, 5, 2) and tail.mask[0, 2, 1]
+            with pytest.raises(IndexError):
+                s["x"].select(chains=[3])
+            with pytest.raises(ValueError):
+                s["x"].select(slice(None, None, -1))
+
+        loaded = load_samples_dictionary_from_file(
+            path, variable_names=["x"], iterations=slice(10, None), thin=2,
+            chains=slice(0, 2))
+        assert set(loaded) == {"x"}
+        np.testing.assert_equal(loaded["x"], x[:, 10::2, 0:2])
+        with pytest.raises(KeyError):
+            open_samples_dictionary_from_file(path, ["z"])
+
+
+@pytest.mark.parametrize("options", [
+    {"compression": "lzf", "shuffle": True},
+    {"compression": "gzip", "compression_level": 1},
+    {"compression": False, "chunks": "element"},
+    {"scaleoffset": 3, "chunks": {"x": (1, 8, 1)}},
+])
+def test_hdf5_compression_options(options):
+    import h5py
+    from pyjags.io import (append_samples_dictionary_to_file,
+                           load_samples_dictionary_from_file,
+                           save_samples_dictionary_to_file)
+
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(2, 50, 2))
+    y = np.ma.masked_array(rng.normal(size=(1, 50, 2)), mask=False)
+    y[0, 3, 1] = np.ma.masked
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, "samples.h5")
+        save_samples_dictionary_to_file(path, {"x": x, "y": y}, **options)
+        append_samples_dictionary_to_file(path, {"x": x, "y": y}, **options)
+        loaded = load_samples_dictionary_from_file(path)
+        expected = np.concatenate([x, x], axis=-2)
+        if "scaleoffset" in options:
+            np.testing.assert_allclose(loaded["x"], expected, atol=1e-3)
+        else:
+            np.testing.assert_equal(loaded["x"], expected)
+        assert loaded["y"].mask.sum() == 2
+        with h5py.File(path, "r") as h5:
+            x = h5["x"]
+            assert x.compression == (options.get("compression", "gzip")
+                                     or None)
+            assert x.shuffle == options.get("shuffle", False)
+            if options.get("chunks") == "element":
+                assert x.chunks == (1, 8192, 1)
+            elif "chunks" in options:
+                assert x.chunks == (1, 8, 1)
+
+
+def test_hdf5_invalid_compression_options():
+    from pyjags.io import save_samples_dictionary_to_file
+
+    x = {"x": np.zeros((1, 4, 2))}
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, "samples.h5")
+        for options in [{"compression": "zstd"},
+                        {"compression": "lzf", "compression_level": 4},
+                        {"compression_level": 10},
+                        {"chunks": "iteration"},
+                        {"chunks": {"x": (1, 4)}}]:
+            with pytest.raises(ValueError):
+                save_samples_dictionary_to_file(path, x, **options)
+
+
+def test_convert_between_hdf5_and_npy_directory(monkeypatch):
+    from pyjags import io
+
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(3, 40, 2))
+    y = np.ma.masked_array(rng.normal(size=(1, 40, 2)), mask=False)
+    y[0, 33, 1] = np.ma.masked
+    # Copy a few iterations at a time.
+    monkeypatch.setattr(io, "_CONVERT_BLOCK_BYTES", 3 * 2 * 8 * 7)
+    with tempfile.TemporaryDirectory() as td:
+        h5_path = os.path.join(td, "samples.h5")
+        npy_path = os.path.join(td, "samples")
+        io.save_samples_dictionary_to_file(h5_path, {"x": x, "y": y})
+        io.convert_samples_file_to_directory(h5_path, npy_path)
+        loaded = io.load_samples_dictionary_from_directory(npy_path)
+        assert isinstance(loaded["x"], np.memmap)
+        np.testing.assert_equal(loaded["x"], x)
+        assert loaded["y"].mask.sum() == 1 and loaded["y"].mask[0, 33, 1]
+        np.testing.assert_equal(loaded["y"].data[~loaded["y"].mask],
+                                y.data[~y.mask])
+        del loaded
+
+        copy_path = os.path.join(td, "copy.h5")
+        io.convert_samples_directory_to_file(npy_path, copy_path,
+                                             compression="lzf")
+        copy = io.load_samples_dictionary_from_file(copy_path)
+        np.testing.assert_equal(copy["x"], x)
+        np.testing.assert_equal(copy["y"].mask, y.mask)
+
+        io.save_samples_dictionary_to_directory(npy_path, {"x": x})
+        assert set(io.load_samples_dictionary_from_directory(npy_path)) \
+            == {"x"}
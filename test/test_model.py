@@ -9,9 +9,14 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 # GNU General Public License for more details.
 
+import collections.abc
+import gc
 import os.path
 import sys
+import tempfile
 import unittest
+import unittest.mock
+import warnings
 
 import numpy as np
 
@@ -153,6 +158,111 @@ class TestModel(unittest.TestCase):
         names =  set(parameters[0].keys())
         self.assertEqual({'mu', '.RNG.name', '.RNG.state'}, names)
 
+    def test_data_bundle(self):
+        code = '''
+        model {
+            for (i in 1:N) {
+                x[i] ~ dnorm(mu, 1)
+            }
+            mu ~ dnorm(0, 1)
+        }
+        '''
+        data = {'x': np.ma.masked_array([0.5, 0.0, 1.5], [False, True, False]),
+                'N': 3}
+        bundle = pyjags.data_bundle(data)
+        self.assertEqual(['N', 'x'], sorted(bundle))
+        self.assertEqual(pyjags.model.JAGS_NA, bundle['x'][1])
+        self.assertFalse(bundle['x'].flags.writeable)
+        self.assertIsInstance(bundle, collections.abc.Mapping)
+        self.assertEqual(dict(bundle.items()).keys(), set(bundle.keys()))
+        self.assertEqual(2, len(list(bundle.values())))
+        self.assertIsNone(bundle.get('y'))
+
+        init = {'.RNG.name': 'base::Wichmann-Hill', '.RNG.seed': 2}
+        expected = self.model(code, data=data, init=init, chains=2).sample(20)
+        for _ in range(2):
+            m = self.model(code, data=bundle, init=init, chains=2)
+            np.testing.assert_equal(data['x'], m.data['x'])
+            s = m.sample(20)
+            for k, v in expected.items():
+                np.testing.assert_equal(v, s[k])
+
+        with self.assertRaises(ValueError):
+            self.model(code, data=pyjags.data_bundle(dict(data, y=1)))
+
+    def test_data_conversion(self):
+        na = pyjags.model.JAGS_NA
+        x = np.arange(12).reshape((3, 4))
+        mask = x % 5 == 0
+        expected = np.where(mask, na, x)
+        with tempfile.TemporaryDirectory() as tmp:
+            memmap = np.memmap(os.path.join(tmp, 'x.dat'), dtype=np.int32,
+                               mode='w+', shape=(3, 4))
+            memmap[...] = x
+            for data in [x, np.asfortranarray(x), x.astype(np.float32),
+                         memmap, x[:, ::-1][:, ::-1]]:
+                bundle = pyjags.data_bundle(
+                    {'plain': data, 'masked': np.ma.masked_array(data, mask),
+                     'unmasked': np.ma.masked_array(data, False)})
+                np.testing.assert_equal(x, bundle['plain'])
+                np.testing.assert_equal(expected, bundle['masked'])
+                np.testing.assert_equal(x, bundle['unmasked'])
+            del memmap, bundle
+        scalar = pyjags.data_bundle({'y': np.ma.masked_array(1.0, True)})
+        np.testing.assert_equal([na], scalar['y'])
+
+    def test_data_block_with_data_bundle(self):
+        code = '''
+        data {
+            # Generated data is not written into the bundle.
+            for (i in 1:N) {
+                y[i] <- 2 * x[i]
+            }
+        }
+        model {
+            for (i in 1:N) {
+                y[i] ~ dnorm(mu, 1)
+            }
+            mu ~ dnorm(0, 1)
+        }
+        '''
+        bundle = pyjags.data_bundle({'x': [1.0, 2.0], 'N': 2})
+        for _ in range(2):
+            m = self.model(code, data=bundle, chains=2)
+            np.testing.assert_equal([2.0, 4.0], m.data['y'])
+        self.assertNotIn('y', bundle)
+
+    def test_bundle_is_built_only_for_several_consoles(self):
+        code = 'model { x ~ dnorm(mu, 1) mu ~ dnorm(0, 1) }'
+        with unittest.mock.patch('pyjags.model.data_bundle',
+                                 wraps=pyjags.model.data_bundle) as bundle:
+            m = pyjags.Model(code, data={'x': 1.0}, chains=2,
+                             progress_bar=False)
+            self.assertEqual(0, bundle.call_count)
+            self.assertEqual(1.0, m.data['x'])
+            pyjags.Model(code, data={'x': 1.0}, chains=2, threads=2,
+                         chains_per_thread=1, progress_bar=False)
+            self.assertEqual(1, bundle.call_count)
+
+    def test_data_bundle_is_copied_only_for_data_blocks(self):
+        bundle = pyjags.data_bundle({'x': [1.0, 2.0], 'N': 2})
+        model = '''
+        model {
+            for (i in 1:N) {
+                x[i] ~ dnorm(mu, 1)
+            }
+            mu ~ dnorm(0, 1)
+        }
+        '''
+        # Consoles within this process, compiled with default arguments.
+        copies = pyjags.DataBundle._copies
+        pyjags.Model(model, data=bundle, chains=4, threads=4,
+                     chains_per_thread=1, progress_bar=False)
+        self.assertEqual(copies, pyjags.DataBundle._copies)
+        pyjags.Model('data { y <- 2 * N }' + model, data=bundle, chains=4,
+                     threads=4, chains_per_thread=1, progress_bar=False)
+        self.assertEqual(copies + 4, pyjags.DataBundle._copies)
+
     def test_samples_shape(self):
         code = '''
         model {
@@ -176,6 +286,226 @@ class TestModel(unittest.TestCase):
         self.assertEqual(s['x'].shape, (3, 5, iterations, chains))
         self.assertEqual(s['mu'].shape, (3, iterations, chains))
 
+    def test_samples_outlive_model(self):
+        code = '''
+        model {
+            for (i in 1:4) {
+                x[i] ~ dnorm(0, 1)
+            }
+        }
+        '''
+        m = self.model(code, chains=2)
+        s = m.sample(25, vars=['x'])
+        state = m.state
+        del m
+        gc.collect()
+
+        self.assertEqual(s['x'].shape, (4, 25, 2))
+        self.assertTrue(np.all(np.isfinite(s['x'])))
+        s['x'][...] = 0.0
+        self.assertEqual(state[0]['x'].shape, (4,))
+
+    def test_sample_into_output_arrays(self):
+        code = '''
+        model {
+            for (i in 1:3) {
+                x[i] ~ dnorm(mu, 1)
+            }
+            mu ~ dnorm(0, 1)
+        }
+        '''
+        init = {
+            '.RNG.name': 'base::Wichmann-Hill',
+            '.RNG.seed': 5
+        }
+        iterations = 20
+        expected = self.model(code, init=init, chains=4).sample(
+            iterations, vars=['x', 'mu'])
+
+        m = self.model(code, init=init, chains=4)
+        out = {
+            'x': np.zeros((3, iterations, 4), order='F'),
+            # Not in fortran order, written through a temporary array.
+            'mu': np.zeros((1, iterations, 4), order='C'),
+        }
+        s = m.sample(iterations, vars=['x', 'mu'], out=out)
+        self.assertIs(out['x'], s['x'])
+        self.assertIs(out['mu'], s['mu'])
+        np.testing.assert_equal(expected['x'], out['x'])
+        np.testing.assert_equal(expected['mu'], out['mu'])
+
+    def test_sample_into_memmap(self):
+        m = self.model('model { x ~ dnorm(0, 1) }', chains=2)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'x.dat')
+            out = np.memmap(path, dtype=np.double, mode='w+',
+                            shape=(1, 10, 2), order='F')
+            s = m.sample(10, vars=['x'], out={'x': out})
+            out.flush()
+            stored = np.memmap(path, dtype=np.double, mode='r',
+                               shape=(1, 10, 2), order='F')
+            np.testing.assert_equal(s['x'], stored)
+            self.assertTrue(np.all(stored != 0))
+            del out, s, stored
+
+    def test_sample_into_output_arrays_of_invalid_shape(self):
+        m = self.model('model { x ~ dnorm(0, 1) }', chains=2)
+        with self.assertRaises(ValueError):
+            m.sample(10, vars=['x'], out={'x': np.empty((1, 11, 2))})
+        with self.assertRaises(ValueError):
+            m.sample(10, vars=['x'], out={'y': np.empty((1, 10, 2))})
+
+    def test_sample_iter_matches_sample(self):
+        code = '''
+        model {
+            for (i in 1:3) {
+                x[i] ~ dnorm(mu, 1)
+            }
+            mu ~ dnorm(0, 1)
+        }
+        '''
+        init = {
+            '.RNG.name': 'base::Wichmann-Hill',
+            '.RNG.seed': 3
+        }
+        iterations = 50
+        thin = 3
+        expected = self.model(code, init=init, chains=2).sample(
+            iterations, vars=['x', 'mu'], thin=thin)
+
+        m = self.model(code, init=init, chains=2)
+        chunks = list(m.sample_iter(iterations, 7, vars=['x', 'mu'], thin=thin))
+        self.assertEqual(6, len(chunks))
+        for k, v in expected.items():
+            actual = np.concatenate([c[k] for c in chunks], axis=-2)
+            np.testing.assert_equal(v, actual)
+        # Monitors are cleared once iteration is finished.
+        self.assertEqual({}, m.sample(5, vars=[]))
+
+    def test_sample_iter_closed_early(self):
+        m = self.model('model { x ~ dnorm(0, 1) }', chains=2)
+        chunks = m.sample_iter(100, 10, vars=['x'])
+        self.assertEqual((1, 10, 2), next(chunks)['x'].shape)
+        chunks.close()
+        self.assertEqual((1, 4, 2), m.sample(4, vars=['x'])['x'].shape)
+
+    def test_summarize(self):
+        code = '''
+        model {
+            for (i in 1:3) {
+                x[i] ~ dnorm(i, 1)
+            }
+            mu ~ dnorm(0, 1)
+            nu <- 2 * mu + 1
+        }
+        '''
+        init = {
+            '.RNG.name': 'base::Wichmann-Hill',
+            '.RNG.seed': 3
+        }
+        samples = self.model(code, init=init, chains=2).sample(
+            300, vars=['x', 'mu', 'nu'])
+        m = self.model(code, init=init, chains=2)
+        summary = m.summarize(300, vars=['x', 'mu'],
+                              stats=['mean', 'var', 'quantiles', 'ess'],
+                              quantiles=[0, 1], cov=['mu', 'nu'], chunk=70)
+        x = samples['x'].reshape((3, -1))
+        np.testing.assert_allclose(summary['x']['mean'], x.mean(axis=-1))
+        np.testing.assert_allclose(summary['x']['var'], x.var(axis=-1, ddof=1))
+        np.testing.assert_equal(summary['x']['quantiles'],
+                                np.stack([x.min(axis=-1), x.max(axis=-1)], -1))
+        self.assertEqual((1,), summary['mu']['ess'].shape)
+        self.assertEqual(['mu', 'nu'], summary['.cov']['names'])
+        mu = samples['mu'].ravel()
+        np.testing.assert_allclose(summary['.cov']['cov'],
+                                   np.cov([mu, 2 * mu + 1]))
+        with self.assertRaises(ValueError):
+            m.summarize(10, stats=['median'])
+        with self.assertRaises(ValueError):
+            m.summarize(0, vars=['x'], cov=['mu', 'nu'])
+
+    def test_summarize_missing_values(self):
+        code = '''
+        model {
+            x[2] ~ dnorm(mu, 1)
+            mu ~ dnorm(0, 1)
+        }
+        '''
+        m = self.model(code, chains=2)
+        summary = m.summarize(50, vars=['x'], stats=['mean', 'quantiles'],
+                              cov=['x', 'mu'], chunk=20)
+        self.assertTrue(np.isnan(summary['x']['mean'][0]))
+        self.assertTrue(np.isnan(summary['x']['quantiles'][0]).all())
+        self.assertTrue(np.isfinite(summary['x']['mean'][1]))
+        self.assertEqual(['x[1]', 'x[2]', 'mu'], summary['.cov']['names'])
+        cov = summary['.cov']['cov']
+        self.assertTrue(np.isnan(cov[0]).all() and np.isnan(cov[:, 0]).all())
+        self.assertTrue(np.isfinite(cov[1:, 1:]).all())
+        self.assertTrue(np.isnan(summary['.cov']['mean'][0]))
+
+    def test_monitor_ranges(self):
+        code = '''
+        model {
+            for (i in 1:4) {
+                for (j in 1:3) {
+                    theta[i, j] ~ dnorm(10 * i + j, 10000)
+                }
+            }
+        }
+        '''
+        m = self.model(code, chains=2)
+        names = ['theta', 'theta[2:3,3]', 'theta[2:4, 1:2]', 'theta[4,1]']
+        samples = m.sample(20, vars=names, thin={'theta[2:3,3]': 2})
+        self.assertEqual(set(names), set(samples))
+        theta = samples['theta']
+        np.testing.assert_equal(theta[1:3, 2, ::2], samples['theta[2:3,3]'])
+        np.testing.assert_equal(theta[1:4, 0:2], samples['theta[2:4, 1:2]'])
+        np.testing.assert_equal(theta[3:4, 0], samples['theta[4,1]'])
+
+        chunks = list(m.sample_iter(10, 4, vars=['theta[1:2,2]']))
+        self.assertEqual([(2, 4, 2), (2, 4, 2), (2, 2, 2)],
+                         [c['theta[1:2,2]'].shape for c in chunks])
+        for node in ['theta[0:2,1]', 'theta[1:5,1]', 'theta[1]',
+                     'theta[1:2']:
+            with self.assertRaises(ValueError):
+                m.sample(1, vars=[node])
+        # The model is still usable after invalid ranges.
+        self.assertEqual((4, 3, 1, 2), m.sample(1, vars=['theta'])['theta'].shape)
+
+    def test_checkpoint_and_restore(self):
+        code = '''
+        model {
+            for (i in 1:3) {
+                y[i] ~ dnorm(mu, tau)
+            }
+            mu ~ dnorm(0, 1)
+            tau ~ dgamma(1, 1)
+            x[2] ~ dnorm(mu, 1)
+        }
+        '''
+        data = {'y': [0.5, 1.5, 1.0]}
+        m = self.model(code, data=data, chains=2, adapt=100)
+        m.update(50)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'checkpoint.h5')
+            m.checkpoint(path)
+            expected = m.sample(20, vars=['mu', 'tau', 'x'])
+
+            restored = pyjags.Model.restore(path, code, data=data,
+                                            progress_bar=False)
+            self.assertEqual(2, restored.chains)
+            self.assertEqual(50, restored.iteration)
+            self.assertFalse(restored.console.isAdapting())
+            parameters = restored.parameters
+            self.assertTrue(np.ma.is_masked(parameters[0]['x']))
+            actual = restored.sample(20, vars=['mu', 'tau', 'x'])
+            self.assertEqual(70, restored.iteration)
+            for k, v in expected.items():
+                np.testing.assert_equal(v, actual[k])
+
+            with self.assertRaises(TypeError):
+                pyjags.Model.restore(path, code, data=data, chains=3)
+
     def test_missing_input_data(self):
         code = '''
         model {
@@ -223,6 +553,34 @@ class TestModel(unittest.TestCase):
         self.assertFalse(np.ma.is_mask(x1))
         self.assertFalse(np.ma.is_mask(x3))
 
+    def test_missing_values_are_masked_only_where_present(self):
+        code = '''
+        model {
+            x[1] ~ dnorm(0, 10)
+            x[3] ~ dnorm(0, 15)
+            y ~ dnorm(0, 1)
+        }'''
+        m = self.model(code, chains=2)
+        out = {'x': np.zeros((3, 10, 2), order='F')}
+        s = m.sample(10, vars=['x', 'y'], out=out)
+        self.assertIsInstance(s['x'], np.ma.MaskedArray)
+        self.assertIs(out['x'], s['x'].base)
+        self.assertEqual(20, s['x'].mask.sum())
+        self.assertNotIsInstance(s['y'], np.ma.MaskedArray)
+
+        chunks = list(m.sample_iter(10, 5, vars=['x', 'y']))
+        self.assertEqual(10, chunks[0]['x'].mask.sum())
+        self.assertNotIsInstance(chunks[0]['y'], np.ma.MaskedArray)
+
+        state = m.state[0]
+        self.assertTrue(state['x'].mask[1])
+        self.assertNotIsInstance(state['y'], np.ma.MaskedArray)
+
+    def test_compilation_error_throws_exception(self):
+        code = 'model { x ~ dnorm(mu[3], 1) mu[1] ~ dnorm(0, 1) }'
+        with self.assertRaises(pyjags.console.JagsError):
+            self.model(code, chains=4)
+
     def test_unused_variables_throws_exception(self):
         code = 'model { x ~ dbern(0.5) }'
 
@@ -251,5 +609,68 @@ if sys.version_info[0] > 2:
         def model(self, *args, **kwargs):
             return pyjags.Model(*args, threads=3, chains_per_thread=2, **kwargs)
 
+
+    class TestModelWithProcesses(TestModel):
+
+        def model(self, *args, **kwargs):
+            return pyjags.Model(*args, threads=3, backend='process', **kwargs)
+
+
+    class TestModelWithSingleProcess(TestModel):
+
+        def model(self, *args, **kwargs):
+            return pyjags.Model(*args, backend='process', **kwargs)
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'requires Linux')
+class TestModelWithFork(TestModel):
+
+    def model(self, *args, **kwargs):
+        # Threads of models from other tests may still be running.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return pyjags.Model(*args, backend='fork', **kwargs)
+
+    def test_chains_run_in_forked_workers(self):
+        m = self.model('model { x ~ dnorm(0, 1) }', chains=4,
+                       chains_per_thread=2)
+        consoles = m.console.consoles
+        self.assertEqual(2, len(consoles))
+        pids = {c._process.pid for c in consoles}
+        self.assertEqual(2, len(pids))
+        self.assertNotIn(os.getpid(), pids)
+        # Each chain has its own stream of the parallel generator.
+        names = {p['.RNG.name'] for p in m.parameters}
+        self.assertEqual({'lecuyer::RngStream'}, names)
+        s = m.sample(50, vars=['x'])['x']
+        self.assertEqual((1, 50, 4), s.shape)
+        self.assertEqual(4, len({tuple(s[0, :, c]) for c in range(4)}))
+
+    def test_chains_not_multiple_of_chains_per_process(self):
+        with self.assertRaises(ValueError):
+            self.model('model { x ~ dnorm(0, 1) }', chains=3,
+                       chains_per_thread=2)
+
+    def test_forked_workers_exit_without_their_connection(self):
+        m = self.model('model { x ~ dnorm(0, 1) }', chains=4,
+                       chains_per_thread=2)
+        # Later siblings don't keep the connection of the first worker open.
+        first = m.console.consoles[0]
+        first._connection.close()
+        first._process.join(timeout=10)
+        self.assertFalse(first._process.is_alive())
+        # The other worker is still served.
+        self.assertEqual(2, m.console.consoles[1].nchain())
+
+    def test_fork_with_running_threads_warns(self):
+        other = pyjags.Model('model { x ~ dnorm(0, 1) }', chains=2, threads=2,
+                             chains_per_thread=1, progress_bar=False)
+        with self.assertWarns(RuntimeWarning):
+            pyjags.Model('model { x ~ dnorm(0, 1) }', chains=2,
+                         chains_per_thread=1, backend='fork',
+                         progress_bar=False)
+        del other
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+
+def _require_jags():
+    import pyjags
+    try:
+        _ = pyjags.Model
+    except Exception as e:
+        pytest.skip(f"JAGS runtime not available: {e!r}")
+
+
+CODE = """
+model {
+    for (i in 1:length(y)) {
+        y[i] ~ dnorm(mu, 1)
+    }
+    mu ~ dnorm(0, 1)
+}
+"""
+
+
+def _init(seed):
+    return {"mu": 0.5, ".RNG.name": "base::Wichmann-Hill", ".RNG.seed": seed}
+
+
+def test_pooled_models_are_reused():
+    _require_jags()
+    import pyjags
+
+    pool = pyjags.ModelPool()
+    data = {"y": np.array([0.1, 0.4, 0.3])}
+    with pool.model(CODE, data=data, chains=2, progress_bar=False) as m:
+        first = m
+        m.sample(10, vars=["mu"])
+    assert len(pool) == 1 and pool.resident_bytes >= data["y"].nbytes
+
+    expected = pyjags.Model(CODE, data=data, init=_init(3), chains=2,
+                            adapt=0, progress_bar=False).sample(20)
+    with pool.model(CODE, data=dict(data), init=_init(3), chains=2,
+                    progress_bar=False) as m:
+        assert m is first and len(pool) == 0
+        for k, v in m.sample(20).items():
+            np.testing.assert_equal(v, expected[k])
+
+        # Only idle models are reused.
+        with pool.model(CODE, data=data, chains=2, progress_bar=False) as m2:
+            assert m2 is not m
+
+    with pool.model(CODE, data={"y": np.array([0.1, 0.4, 0.2])}, chains=2,
+                    progress_bar=False) as m:
+        assert m is not first
+    with pool.model(CODE, data=data, chains=3, progress_bar=False) as m:
+        assert m is not first
+
+    with pytest.raises(ValueError):
+        pool.release(first)
+    with pytest.raises(ValueError):
+        pool.release(pyjags.Model(CODE, data=data, progress_bar=False))
+
+
+def test_pool_evicts_least_recently_released():
+    _require_jags()
+    import pyjags
+
+    pool = pyjags.ModelPool(max_models=2)
+    models = [pool.checkout(CODE, data={"y": [float(i)]}, chains=1,
+                            progress_bar=False) for i in range(3)]
+    for m in models:
+        pool.release(m)
+    assert len(pool) == 2
+    m = pool.checkout(CODE, data={"y": [0.0]}, chains=1, progress_bar=False)
+    assert m is not models[0]
+    pool.release(m)
+    m = pool.checkout(CODE, data={"y": [2.0]}, chains=1, progress_bar=False)
+    assert m is models[2]
+    pool.release(m)
+
+    pool.max_bytes = 0
+    pool.release(pool.checkout(CODE, data={"y": [2.0]}, chains=1,
+                               progress_bar=False))
+    assert len(pool) == 0 and pool.resident_bytes == 0
+
+
+def test_pool_accepts_data_bundles():
+    _require_jags()
+    import pyjags
+
+    pool = pyjags.ModelPool()
+    bundle = pyjags.data_bundle({"y": np.array([0.1, 0.4, 0.3])})
+    with pool.model(CODE, data=bundle, chains=2, progress_bar=False) as m:
+        first = m
+    assert pool.resident_bytes >= bundle["y"].nbytes
+    with pool.model(CODE, data=bundle, chains=2, progress_bar=False) as m:
+        assert m is first
+    # A bundle is keyed by its values, like the dictionary it was made from.
+    with pool.model(CODE, data={"y": np.array([0.1, 0.4, 0.3])}, chains=2,
+                    progress_bar=False) as m:
+        assert m is first
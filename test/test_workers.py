@@ -0,0 +1,47 @@
+import os
+import threading
+
+import pytest
+
+from pyjags.workers import WorkerPool
+
+
+def test_tasks_of_a_worker_run_in_the_same_thread():
+    pool = WorkerPool(3)
+    names = [pool.submit(i, lambda: threading.current_thread().name)
+             for i in range(9)]
+    names = [f.result() for f in names]
+    assert len(set(names)) == 3
+    assert names[:3] == names[3:6] == names[6:]
+    pool.shutdown()
+
+
+def test_exceptions_are_reported_through_futures():
+    pool = WorkerPool(1)
+    future = pool.submit(0, lambda: 1 // 0)
+    with pytest.raises(ZeroDivisionError):
+        future.result()
+    # Worker survives the failure.
+    assert pool.submit(0, lambda x: x + 1, 1).result() == 2
+    pool.shutdown()
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"),
+                    reason="CPU affinity is not supported")
+def test_workers_pinned_to_cpus():
+    cpu = min(os.sched_getaffinity(0))
+    pool = WorkerPool(2, affinity=True)
+    assert pool.submit(0, os.sched_getaffinity, 0).result() == {cpu}
+    pool.shutdown()
+
+    with pytest.raises(ValueError):
+        WorkerPool(2, affinity=[cpu])
+
+
+def test_model_with_pinned_threads():
+    import pyjags
+    if not hasattr(os, "sched_setaffinity"):
+        pytest.skip("CPU affinity is not supported")
+    m = pyjags.Model("model { x ~ dnorm(0, 1) }", chains=4, threads=2,
+                     adapt=0, progress_bar=False, affinity=True)
+    assert m.sample(10, vars=["x"])["x"].shape == (1, 10, 4)